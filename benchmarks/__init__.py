@@ -0,0 +1 @@
+"""Benchmarks and synthetic BT_backup generator for qbt_migrate"""
@@ -0,0 +1,180 @@
+"""
+Benchmark the hot paths of qbt_migrate on a synthetic BT_backup.
+
+    python -m benchmarks --torrents 5000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.generate import RELEVANT_ROOT, generate_bt_backup
+from qbt_migrate import QBTBatchMove
+from qbt_migrate.methods import backup_folder
+
+
+NEW_ROOT = "/srv/torrents"
+
+
+def discover(bt_backup: Path, work_dir: Path):
+    return sum(
+        1
+        for _ in QBTBatchMove.discover_relevant_fast_resume(
+            bt_backup, RELEVANT_ROOT
+        )
+    )
+
+
+def replace_save(bt_backup: Path, work_dir: Path):
+    fast_resumes = list(
+        QBTBatchMove.discover_relevant_fast_resume(bt_backup, RELEVANT_ROOT)
+    )
+    for fast_resume in fast_resumes:
+        fast_resume.replace_paths(
+            RELEVANT_ROOT, NEW_ROOT, save_file=True, create_backup=False
+        )
+    return len(fast_resumes)
+
+
+def backup(bt_backup: Path, work_dir: Path):
+    backup_folder(bt_backup, work_dir / "backup.zip")
+    return len(list(bt_backup.iterdir()))
+
+
+def run(bt_backup: Path, work_dir: Path):
+    summary = QBTBatchMove(bt_backup).run(
+        RELEVANT_ROOT, NEW_ROOT, create_backup=True, backup_path=work_dir
+    )
+    return summary.processed
+
+
+def run_streaming(bt_backup: Path, work_dir: Path):
+    summary = QBTBatchMove(bt_backup).run(
+        RELEVANT_ROOT,
+        NEW_ROOT,
+        create_backup=True,
+        backup_path=work_dir,
+        streaming=True,
+    )
+    return summary.processed
+
+
+def run_async(bt_backup: Path, work_dir: Path):
+    summary = asyncio.run(
+        QBTBatchMove(bt_backup).run_async(
+            RELEVANT_ROOT, NEW_ROOT, create_backup=True, backup_path=work_dir
+        )
+    )
+    return summary.processed
+
+
+# Scenarios, whether they modify BT_backup
+SCENARIOS = {
+    "discover": (discover, False),
+    "replace_save": (replace_save, True),
+    "backup_folder": (backup, False),
+    "run": (run, True),
+    "run_streaming": (run_streaming, True),
+    "run_async": (run_async, True),
+}
+
+
+def measure(scenario, template: Path, work_dir: Path, trace: bool):
+    function, modifies = SCENARIOS[scenario]
+    bt_backup = template
+    if modifies:
+        bt_backup = work_dir / "BT_backup"
+        shutil.copytree(template, bt_backup)
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    files = function(bt_backup, work_dir)
+    elapsed = time.perf_counter() - start
+    peak = None
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    shutil.rmtree(work_dir)
+    work_dir.mkdir()
+    return files, elapsed, peak
+
+
+def benchmark(scenario, template: Path, work_dir: Path, repeat: int):
+    times = []
+    for _ in range(repeat):
+        files, elapsed, _ = measure(scenario, template, work_dir, False)
+        times.append(elapsed)
+    # Peak memory is traced separately, tracing slows everything down
+    _, _, peak = measure(scenario, template, work_dir, True)
+    size = sum(file.stat().st_size for file in template.iterdir())
+    best = min(times)
+    return {
+        "scenario": scenario,
+        "files": files,
+        "seconds": best,
+        "files_per_second": files / best if best else None,
+        "mib_per_second": size / 2**20 / best if best else None,
+        "peak_memory_mib": peak / 2**20,
+    }
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--torrents", type=int, default=1000)
+    parser.add_argument("--relevant", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "-s",
+        "--scenario",
+        action="append",
+        choices=list(SCENARIOS),
+        help="Scenario to run, can be given more than once. Default is all.",
+    )
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument("--json", help="Also write the results to a file.")
+    args = parser.parse_args(args)
+    logging.basicConfig(format="%(message)s", level=logging.WARNING)
+
+    results = []
+    temp_dir = Path(tempfile.mkdtemp(prefix="qbt_migrate_bench"))
+    try:
+        template = generate_bt_backup(
+            temp_dir / "template", args.torrents, args.relevant, args.seed
+        )
+        work_dir = temp_dir / "work"
+        work_dir.mkdir()
+        for scenario in args.scenario or SCENARIOS:
+            result = benchmark(scenario, template, work_dir, args.repeat)
+            results.append(result)
+            print(
+                f"{scenario:<14} {result['files']:>7} files "
+                f"{result['seconds']:>8.3f}s "
+                f"{result['files_per_second'] or 0:>10.0f} files/s "
+                f"{result['mib_per_second'] or 0:>8.1f} MiB/s "
+                f"{result['peak_memory_mib']:>8.1f} MiB peak"
+            )
+    finally:
+        shutil.rmtree(temp_dir)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(
+                {
+                    "torrents": args.torrents,
+                    "relevant": args.relevant,
+                    "python": sys.version,
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()  # pragma: no cover
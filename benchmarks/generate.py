@@ -0,0 +1,194 @@
+"""Synthesize BT_backup directories for benchmarking."""
+
+import argparse
+import hashlib
+import logging
+import random
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Union
+
+from qbt_migrate.bencoding import bencode
+
+
+logger = logging.getLogger(__name__)
+
+# Root the benchmarks migrate away from
+RELEVANT_ROOT = "/data/torrents"
+# Save path roots of torrents that are not migrated, with weights
+OTHER_ROOTS = (
+    ("/mnt/media/downloads", 5),
+    ("/home/user/Downloads", 3),
+    ("D:\\Torrents", 2),
+)
+CATEGORIES = ("", "movies", "tv", "music", "linux-isos", "books")
+KiB = 1024
+MiB = 1024 * KiB
+GiB = 1024 * MiB
+
+
+def _random_bytes(rng: random.Random, size: int) -> bytes:
+    return rng.getrandbits(size * 8).to_bytes(size, "little") if size else b""
+
+
+def _name(rng: random.Random) -> str:
+    words = ("Ubuntu", "Debian", "Live", "Album", "Season", "Archive", "HD")
+    return ".".join(rng.sample(words, 3)) + f".{rng.randint(1, 9999):04d}"
+
+
+def _torrent_size(rng: random.Random) -> int:
+    # Log-normal sizes, mostly hundreds of MiB to tens of GiB
+    return int(min(max(rng.lognormvariate(21.5, 1.4), 1 * MiB), 200 * GiB))
+
+
+def _piece_length(total_size: int) -> int:
+    # Aim for ~1500 pieces, as most clients do, within 16 KiB to 16 MiB
+    piece_length = 16 * KiB
+    while total_size // piece_length > 1500 and piece_length < 16 * MiB:
+        piece_length *= 2
+    return piece_length
+
+
+def _files(rng: random.Random, name: str, total_size: int) -> List[Tuple]:
+    """File paths (relative to the torrent folder) and sizes."""
+    if rng.random() < 0.4:
+        return [((name,), total_size)]
+    count = min(int(rng.paretovariate(1.2)) * 3, 500)
+    sizes = [rng.random() for _ in range(count)]
+    scale = total_size / sum(sizes)
+    files = []
+    for index, size in enumerate(sizes):
+        folder = f"Disc {index // 20 + 1}" if count > 20 else None
+        path = (folder, f"{index + 1:03d} - {_name(rng)}.flac")
+        files.append((tuple(part for part in path if part), int(size * scale)))
+    return files
+
+
+def make_torrent(
+    rng: random.Random,
+    save_root: str,
+    separator: str = "/",
+) -> Tuple[bytes, bytes]:
+    """
+    Make a matching .fastresume and .torrent.
+    :return: Encoded .fastresume and .torrent
+    :rtype: tuple[bytes, bytes]
+    """
+    name = _name(rng)
+    total_size = _torrent_size(rng)
+    piece_length = _piece_length(total_size)
+    piece_count = -(-total_size // piece_length)
+    files = _files(rng, name, total_size)
+    info = {
+        "name": name,
+        "piece length": piece_length,
+        "pieces": _random_bytes(rng, 20 * piece_count),
+    }
+    if len(files) == 1:
+        info["length"] = total_size
+    else:
+        info["files"] = [
+            {"length": size, "path": list(path)} for path, size in files
+        ]
+    torrent = {
+        "announce": "udp://tracker.example.org:1337/announce",
+        "creation date": 1600000000 + rng.randint(0, 10**8),
+        "info": info,
+    }
+    category = rng.choice(CATEGORIES)
+    save_path = (
+        separator.join((save_root, category)) if category else save_root
+    )
+    resume = {
+        "file-format": "libtorrent resume file",
+        "file-version": 1,
+        "info-hash": hashlib.sha1(bencode.encode(info)).digest(),  # nosec
+        "name": name,
+        "save_path": save_path,
+        "qBt-savePath": save_path.replace("\\", "/"),
+        "qBt-category": category,
+        "qBt-tags": [],
+        "qBt-name": "",
+        "qBt-ratioLimit": -2000,
+        "qBt-seedingTimeLimit": -2,
+        "added_time": 1600000000 + rng.randint(0, 10**8),
+        "completed_time": 1600000000 + rng.randint(0, 10**8),
+        "total_uploaded": rng.randint(0, total_size * 5),
+        "total_downloaded": total_size,
+        # One byte per piece, all downloaded
+        "pieces": b"\x01" * piece_count,
+        "peers": _random_bytes(rng, 6 * rng.randint(0, 50)),
+        "trackers": [["udp://tracker.example.org:1337/announce"]],
+        "file_priority": [1] * len(files),
+    }
+    if rng.random() < 0.3:
+        resume["qBt-downloadPath"] = separator.join((save_root, "incomplete"))
+    if len(files) > 1 and rng.random() < 0.2:
+        # Files moved or renamed within qBittorrent are absolute
+        resume["mapped_files"] = [
+            separator.join((save_path, name, *path)) for path, _ in files
+        ]
+    return bencode.encode(resume), bencode.encode(torrent)
+
+
+def generate_bt_backup(
+    path: Union[str, Path],
+    torrents: int,
+    relevant: float = 0.5,
+    seed: int = 0,
+    roots: Optional[Sequence[Tuple[str, int]]] = None,
+) -> Path:
+    """
+    Generate a BT_backup directory of `torrents` .fastresume files with
+    their .torrent files.
+    :param path: Directory to create
+    :type path: str | Path
+    :param torrents: Number of torrents
+    :type torrents: int
+    :param relevant: Share of torrents saved under `RELEVANT_ROOT`
+    :type relevant: float
+    :param seed: Random seed, the same seed gives the same files
+    :type seed: int
+    :param roots: Weighted save path roots of the other torrents
+    :type roots: Sequence[tuple[str, int]]
+    :return: The BT_backup directory
+    :rtype: Path
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)  # nosec
+    roots = OTHER_ROOTS if roots is None else roots
+    for index in range(torrents):
+        if rng.random() < relevant:
+            root = RELEVANT_ROOT
+        else:
+            (root,) = rng.choices(
+                [root for root, _ in roots], [weight for _, weight in roots]
+            )
+        separator = "\\" if "\\" in root else "/"
+        resume, torrent = make_torrent(rng, root, separator)
+        info_hash = hashlib.sha1(torrent).hexdigest()  # nosec
+        (path / f"{info_hash}.fastresume").write_bytes(resume)
+        (path / f"{info_hash}.torrent").write_bytes(torrent)
+        if index and not index % 1000:
+            logger.info(f"Generated {index} torrents...")
+    return path
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", help="BT_backup directory to create.")
+    parser.add_argument("-n", "--torrents", type=int, default=1000)
+    parser.add_argument(
+        "--relevant",
+        type=float,
+        default=0.5,
+        help=f"Share of torrents saved under {RELEVANT_ROOT}.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(args)
+    logging.basicConfig(format="%(message)s", level=logging.INFO)
+    generate_bt_backup(args.path, args.torrents, args.relevant, args.seed)
+
+
+if __name__ == "__main__":
+    main()  # pragma: no cover
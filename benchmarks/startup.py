@@ -0,0 +1,103 @@
+"""
+Time `qbt_migrate --version`, the startup cost paid by every hook and cron
+invocation, and check that it doesn't import what only a migration needs.
+
+    python -m benchmarks.startup --repeat 20 --max-ms 50
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+
+VERSION = (
+    "import sys; from qbt_migrate.cli import main; "
+    "sys.argv = ['qbt_migrate', '--version']; main()"
+)
+
+# Modules that --version must not import
+HEAVY_MODULES = (
+    "asyncio",
+    "bencodepy",
+    "concurrent.futures",
+    "qbt_migrate.classes",
+    "sqlite3",
+    "zipfile",
+)
+
+
+def run_python(code: str) -> float:
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return time.perf_counter() - start
+
+
+def median_ms(code: str, repeat: int) -> float:
+    return statistics.median(run_python(code) for _ in range(repeat)) * 1000
+
+
+def imported_heavy_modules():
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            f"{VERSION}; print(' '.join(module for module in "
+            f"{HEAVY_MODULES!r} if module in sys.modules))",
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    # The first line is the version
+    return output.splitlines()[-1].split()
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-r", "--repeat", type=int, default=20)
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        help="Fail if --version takes longer than this.",
+    )
+    parser.add_argument("--json", help="Also write the results to a file.")
+    args = parser.parse_args(args)
+
+    # The interpreter's own startup, for reference
+    interpreter = median_ms("pass", args.repeat)
+    version = median_ms(VERSION, args.repeat)
+    result = {
+        "python": sys.version,
+        "interpreter_ms": interpreter,
+        "version_ms": version,
+        "overhead_ms": version - interpreter,
+        "heavy_modules": imported_heavy_modules(),
+    }
+    print(
+        f"python -c pass {interpreter:>8.1f} ms\n"
+        f"--version      {version:>8.1f} ms "
+        f"(+{result['overhead_ms']:.1f} ms)"
+    )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    failed = False
+    if result["heavy_modules"]:
+        print(f"--version imports {', '.join(result['heavy_modules'])}")
+        failed = True
+    if args.max_ms is not None and version > args.max_ms:
+        print(f"--version is slower than {args.max_ms} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())  # pragma: no cover
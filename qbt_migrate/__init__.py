@@ -1,11 +1,55 @@
 """qBt Migrate, change the paths of existing torrents in qBittorrent, as well as convert paths to Windows/Linux/Mac"""
+import importlib
 import logging
 import os
-
-from qbt_migrate.classes import FastResume, QBTBatchMove
-from qbt_migrate.methods import convert_slashes, discover_bt_backup_path
+from typing import TYPE_CHECKING
 
 
 __version__ = "2.3.2" + os.getenv("VERSION_TAG", "")
 
 logging.getLogger(__name__).addHandler(logging.NullHandler())
+
+# Public names by the module they live in. They are imported on first use,
+# so `qbt_migrate --version` and hooks that only need part of the package
+# don't import bencodepy, asyncio, zipfile and the rest up front.
+_EXPORTS = {
+    "FastResume": "qbt_migrate.classes",
+    "FileResult": "qbt_migrate.classes",
+    "QBTBatchMove": "qbt_migrate.classes",
+    "RunStats": "qbt_migrate.classes",
+    "RunSummary": "qbt_migrate.classes",
+    "PathMapping": "qbt_migrate.mapping",
+    "convert_slashes": "qbt_migrate.methods",
+    "discover_bt_backup_path": "qbt_migrate.methods",
+    "MigrationPlan": "qbt_migrate.plan",
+    "Watcher": "qbt_migrate.watch",
+    "WebUI": "qbt_migrate.webui",
+}
+
+__all__ = ["__version__", *_EXPORTS]
+
+if TYPE_CHECKING:  # pragma: no cover
+    from qbt_migrate.classes import (
+        FastResume,
+        FileResult,
+        QBTBatchMove,
+        RunStats,
+        RunSummary,
+    )
+    from qbt_migrate.mapping import PathMapping
+    from qbt_migrate.methods import convert_slashes, discover_bt_backup_path
+    from qbt_migrate.plan import MigrationPlan
+    from qbt_migrate.watch import Watcher
+    from qbt_migrate.webui import WebUI
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,283 @@
+import hashlib
+import json
+import logging
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from qbt_migrate.enums import Compression
+from qbt_migrate.methods import atomic_write, scan_bt_backup, submit_bounded
+
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+BLOB_SUFFIXES = {
+    Compression.STORED: "",
+    Compression.DEFLATE: ".zz",
+    Compression.ZSTD: ".zst",
+}
+
+
+def default_store_path(bt_backup_path: Union[str, Path]) -> Path:
+    """Backup store location next to the BT_backup directory."""
+    return Path(bt_backup_path).parent / "qbt_migrate_backups"
+
+
+def compress(data: bytes, compression: Compression) -> bytes:
+    if compression is Compression.DEFLATE:
+        return zlib.compress(data)
+    if compression is Compression.ZSTD:
+        if zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+        return zstandard.ZstdCompressor().compress(data)
+    return data
+
+
+def decompress(data: bytes, compression: Compression) -> bytes:
+    if compression is Compression.DEFLATE:
+        return zlib.decompress(data)
+    if compression is Compression.ZSTD:
+        if zstandard is None:
+            raise ValueError(
+                "zstd compressed backups require the zstandard package"
+            )
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+class BackupStore(object):
+    """
+    Content-addressed store of BT_backup snapshots. Every backup writes a
+    manifest of file names and content hashes, file contents are stored
+    once per hash as compressed blobs. Files whose size and mtime match
+    the previous manifest aren't read again, so repeat backups only read
+    and store what changed.
+    """
+
+    logger = logging.getLogger(__name__ + ".BackupStore")
+
+    def __init__(self, store_path: Union[str, Path]):
+        self.store_path = Path(store_path)
+        self.blobs_path = self.store_path / "blobs"
+        self.manifests_path = self.store_path / "manifests"
+
+    def manifests(self) -> List[str]:
+        """IDs of the stored snapshots, oldest first."""
+        if not self.manifests_path.is_dir():
+            return []
+        return sorted(path.stem for path in self.manifests_path.glob("*.json"))
+
+    def load_manifest(self, manifest_id: Optional[str] = None) -> Dict:
+        """
+        Load a snapshot manifest.
+        :param manifest_id: Snapshot to load, defaults to the latest
+        :type manifest_id: str
+        :return: Manifest
+        :rtype: dict
+        """
+        if manifest_id is None:
+            manifests = self.manifests()
+            if not manifests:
+                raise FileNotFoundError(
+                    f"No backups in store {self.store_path}"
+                )
+            manifest_id = manifests[-1]
+        manifest_path = self.manifests_path / f"{manifest_id}.json"
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != MANIFEST_VERSION:
+            raise ValueError(
+                f"Unsupported manifest version {manifest.get('version')}"
+            )
+        return manifest
+
+    def _blob_path(self, digest: str, compression: Compression) -> Path:
+        return (
+            self.blobs_path
+            / digest[:2]
+            / f"{digest}{BLOB_SUFFIXES[compression]}"
+        )
+
+    def _find_blob(self, digest: str) -> Optional[Tuple[Path, Compression]]:
+        for compression in Compression:
+            path = self._blob_path(digest, compression)
+            if path.is_file():
+                return path, compression
+        return None
+
+    def backup(
+        self,
+        folder_path: Union[str, Path],
+        entries: Optional[Iterable[os.DirEntry]] = None,
+        include_torrents: bool = True,
+        compression: Compression = Compression.DEFLATE,
+        max_workers: Optional[int] = None,
+    ) -> str:
+        """
+        Add a snapshot of the .fastresume (and .torrent) files of
+        `folder_path` to the store. Blobs are compressed in parallel.
+        :param folder_path: BT_backup folder to back up
+        :type folder_path: str | Path
+        :param entries: Listing from `scan_bt_backup` to reuse
+        :type entries: Iterable[os.DirEntry]
+        :param include_torrents: Include .torrent files
+        :type include_torrents: bool
+        :param compression: Compression of new blobs
+        :type compression: Compression
+        :param max_workers: Number of files to hash and compress at once
+        :type max_workers: int
+        :return: ID of the new snapshot
+        :rtype: str
+        """
+        if compression is Compression.ZSTD and zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+        self.logger.info(
+            f"🗄️ Backing up {folder_path} to {self.store_path} ..."
+        )
+        if entries is None:
+            entries = scan_bt_backup(folder_path)
+        entries = [
+            entry
+            for entry in entries
+            if entry.name.endswith(".fastresume")
+            or (include_torrents and entry.name.endswith(".torrent"))
+        ]
+        try:
+            previous = self.load_manifest()["files"]
+        except FileNotFoundError:
+            previous = {}
+        if max_workers is None:
+            max_workers = min(32, (os.cpu_count() or 1) + 4)
+
+        files = {}
+        new_blobs = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for (entry, *_), future in submit_bounded(
+                executor,
+                self._store_file,
+                (
+                    (entry, previous.get(entry.name), compression)
+                    for entry in entries
+                ),
+                max_workers * 2,
+            ):
+                files[entry.name], stored = future.result()
+                new_blobs += stored
+
+        manifest_id = datetime.now().strftime("%Y%m%d%H%M%S%f")
+        self.manifests_path.mkdir(parents=True, exist_ok=True)
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "source": str(folder_path),
+            "files": files,
+        }
+        atomic_write(
+            self.manifests_path / f"{manifest_id}.json",
+            [json.dumps(manifest, separators=(",", ":")).encode("utf-8")],
+        )
+        self.logger.info(
+            f"✔️ Backup {manifest_id} done, {len(files)} files, "
+            f"{new_blobs} new."
+        )
+        return manifest_id
+
+    def _store_file(
+        self,
+        entry: os.DirEntry,
+        previous: Optional[Dict[str, Any]],
+        compression: Compression,
+    ) -> Tuple[Dict[str, Any], bool]:
+        stat = entry.stat()
+        if (
+            previous is not None
+            and previous["size"] == stat.st_size
+            and previous["mtime_ns"] == stat.st_mtime_ns
+            and self._find_blob(previous["sha256"]) is not None
+        ):
+            return previous, False
+        with open(entry.path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        record = {
+            "sha256": digest,
+            "size": len(data),
+            "mtime_ns": stat.st_mtime_ns,
+        }
+        if self._find_blob(digest) is not None:
+            return record, False
+        self.logger.debug(f"Storing {entry.path} as {digest}...")
+        blob_path = self._blob_path(digest, compression)
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write(blob_path, [compress(data, compression)])
+        return record, True
+
+    def restore(
+        self,
+        target_path: Union[str, Path],
+        manifest_id: Optional[str] = None,
+        max_workers: Optional[int] = None,
+    ) -> int:
+        """
+        Write the files of a snapshot into `target_path`, replacing
+        existing files of the same name. Other files are left alone.
+        :param target_path: Folder to restore into, usually BT_backup
+        :type target_path: str | Path
+        :param manifest_id: Snapshot to restore, defaults to the latest
+        :type manifest_id: str
+        :param max_workers: Number of files to restore at once
+        :type max_workers: int
+        :return: Number of files restored
+        :rtype: int
+        """
+        manifest = self.load_manifest(manifest_id)
+        target_path = Path(target_path)
+        self.logger.info(
+            f"🗄️ Restoring backup {manifest_id or 'latest'} "
+            f"to {target_path} ..."
+        )
+        for name in manifest["files"]:
+            if Path(name).name != name:
+                raise ValueError(f"Invalid file name {name!r} in manifest")
+        target_path.mkdir(parents=True, exist_ok=True)
+        if max_workers is None:
+            max_workers = min(32, (os.cpu_count() or 1) + 4)
+        count = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for _, future in submit_bounded(
+                executor,
+                self._restore_file,
+                (
+                    (target_path / name, record)
+                    for name, record in manifest["files"].items()
+                ),
+                max_workers * 2,
+            ):
+                future.result()
+                count += 1
+        self.logger.info(f"✔️ Restored {count} files!")
+        return count
+
+    def _restore_file(self, file_path: Path, record: Dict[str, Any]):
+        blob = self._find_blob(record["sha256"])
+        if blob is None:
+            raise FileNotFoundError(
+                f"Blob {record['sha256']} of {file_path.name} is missing"
+            )
+        blob_path, compression = blob
+        data = decompress(blob_path.read_bytes(), compression)
+        if hashlib.sha256(data).hexdigest() != record["sha256"]:
+            raise ValueError(f"Blob {blob_path} is corrupt")
+        self.logger.debug(f"Restoring {file_path}...")
+        atomic_write(file_path, [data])
@@ -0,0 +1,148 @@
+import logging
+from typing import Any, Dict, Iterable, List, Tuple, Union
+
+import bencodepy
+from bencodepy.exceptions import BencodeDecodeError
+
+
+logger = logging.getLogger(__name__)
+bencode = bencodepy.Bencode(encoding="utf-8", encoding_fallback="all")
+
+# Keys of a .fastresume that hold paths
+PATH_KEYS = ("mapped_files", "qBt-downloadPath", "qBt-savePath", "save_path")
+
+_DIGITS = b"0123456789"
+
+
+def _skip_string(data: bytes, index: int) -> Tuple[int, int]:
+    """Return the start and end of the string value at `index`."""
+    colon = data.index(b":", index)
+    start = colon + 1
+    end = start + int(data[index:colon])
+    if end > len(data):
+        raise ValueError("string runs past end of data")
+    return start, end
+
+
+def skip_value(data: bytes, index: int) -> int:
+    """
+    Find the end of the bencoded value starting at `index` without
+    building any Python objects for it.
+    :param data: Bencoded data
+    :type data: bytes
+    :param index: Offset of the value
+    :type index: int
+    :return: Offset just past the end of the value
+    :rtype: int
+    """
+    depth = 0
+    while True:
+        token = data[index]
+        if token in _DIGITS:
+            index = _skip_string(data, index)[1]
+        elif token == ord("i"):
+            index = data.index(b"e", index) + 1
+        elif token in (ord("l"), ord("d")):
+            depth += 1
+            index += 1
+        elif token == ord("e") and depth:
+            depth -= 1
+            index += 1
+        else:
+            raise ValueError(f"unexpected token {chr(token)!r} at {index}")
+        if not depth:
+            return index
+
+
+def iter_dict_items(data: bytes, index: int = 0):
+    """
+    Iterate over the items of the bencoded dictionary at `index`.
+    :param data: Bencoded data
+    :type data: bytes
+    :param index: Offset of the dictionary
+    :type index: int
+    :return: Tuples of raw key, value start offset and value end offset
+    :rtype: Iterator[tuple[bytes, int, int]]
+    """
+    if data[index : index + 1] != b"d":
+        raise ValueError("not a bencoded dictionary")
+    index += 1
+    while data[index : index + 1] != b"e":
+        key_start, key_end = _skip_string(data, index)
+        value_end = skip_value(data, key_end)
+        yield data[key_start:key_end], key_end, value_end
+        index = value_end
+    if index + 1 != len(data):
+        raise ValueError("data after end of dictionary")
+
+
+def decode_keys(data: bytes, keys: Iterable[str] = PATH_KEYS) -> Dict:
+    """
+    Decode only `keys` from a bencoded dictionary.
+    The values of all other keys are skipped over by length.
+    :param data: Bencoded dictionary
+    :type data: bytes
+    :param keys: Keys to decode
+    :type keys: Iterable[str]
+    :return: Dictionary of the requested keys that are present
+    :rtype: dict
+    """
+    wanted = {key.encode("utf-8"): key for key in keys}
+    decoded = {}
+    try:
+        for key, start, end in iter_dict_items(data):
+            if key in wanted:
+                decoded[wanted[key]] = bencode.decode(data[start:end])
+    except (IndexError, ValueError) as e:
+        raise BencodeDecodeError(
+            f"not a valid bencoded dictionary: {e}"
+        ) from e
+    return decoded
+
+
+def splice_dict(
+    data: bytes, values: Dict[str, Any]
+) -> List[Union[bytes, memoryview]]:
+    """
+    Replace or insert top-level `values` of a bencoded dictionary, leaving
+    every other byte of `data` untouched. New keys are inserted in sorted
+    key order.
+    :param data: Bencoded dictionary
+    :type data: bytes
+    :param values: New values by key
+    :type values: dict
+    :return: Buffer segments that concatenate to the new dictionary
+    :rtype: list[bytes | memoryview]
+    """
+    pending = sorted(
+        (key.encode("utf-8"), value) for key, value in values.items()
+    )
+    view = memoryview(data)
+    segments = []
+    copied = 0  # Offset up to which `data` has been added to `segments`
+    key_start = 1
+    try:
+        for key, value_start, value_end in iter_dict_items(data):
+            while pending and pending[0][0] < key:
+                new_key, value = pending.pop(0)
+                segments.append(view[copied:key_start])
+                segments.append(
+                    bencode.encode(new_key) + bencode.encode(value)
+                )
+                copied = key_start
+            if pending and pending[0][0] == key:
+                _, value = pending.pop(0)
+                segments.append(view[copied:value_start])
+                segments.append(bencode.encode(value))
+                copied = value_end
+            key_start = value_end
+    except (IndexError, ValueError) as e:
+        raise BencodeDecodeError(
+            f"not a valid bencoded dictionary: {e}"
+        ) from e
+    # Keys sorting after every existing key go before the closing "e"
+    segments.append(view[copied:key_start])
+    for new_key, value in pending:
+        segments.append(bencode.encode(new_key) + bencode.encode(value))
+    segments.append(view[key_start:])
+    return [segment for segment in segments if len(segment)]
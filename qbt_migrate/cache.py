@@ -0,0 +1,132 @@
+import logging
+import os
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+
+logger = logging.getLogger(__name__)
+
+# Path keys kept in the cache, enough to decide relevance
+CACHED_KEYS = ("save_path", "qBt-savePath", "qBt-downloadPath")
+
+
+def default_cache_path(bt_backup_path: Union[str, Path]) -> Path:
+    """Cache file location next to the BT_backup directory."""
+    return Path(bt_backup_path).parent / "qbt_migrate_cache.sqlite"
+
+
+def _stat_key(stat: os.stat_result) -> Tuple[int, int, int]:
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+class MetadataCache(object):
+    """
+    Persistent cache of the path keys of .fastresume files.
+    Entries are keyed by file name and are only valid while the file's
+    inode, mtime and size are unchanged, so only modified files
+    have to be parsed again.
+    """
+
+    logger = logging.getLogger(__name__ + ".MetadataCache")
+
+    def __init__(self, cache_path: Union[str, Path]):
+        self.cache_path = Path(cache_path)
+        self.logger.debug(f"Opening metadata cache {self.cache_path}...")
+        self._connection = sqlite3.connect(str(self.cache_path))
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS fastresume_v1 ("
+            "name TEXT PRIMARY KEY, inode INTEGER, mtime_ns INTEGER, "
+            "size INTEGER, save_path, qbt_save_path, qbt_download_path)"
+        )
+        # The whole table is read once, lookups never hit SQLite
+        self._entries = {
+            row[0]: row[1:]
+            for row in self._connection.execute(
+                "SELECT name, inode, mtime_ns, size, save_path, "
+                "qbt_save_path, qbt_download_path FROM fastresume_v1"
+            )
+        }
+        self._updates = {}
+        self._removed = set()
+        self.hits = 0
+        self.misses = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(
+        self, name: str, stat: os.stat_result
+    ) -> Optional[Dict[str, Optional[str]]]:
+        """
+        Get the cached path keys of a file.
+        :param name: File name within BT_backup
+        :type name: str
+        :param stat: Current stat of the file
+        :type stat: os.stat_result
+        :return: Path keys, or None if not cached or the file has changed
+        :rtype: dict | None
+        """
+        entry = self._entries.get(name)
+        if entry is None or tuple(entry[:3]) != _stat_key(stat):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dict(zip(CACHED_KEYS, entry[3:]))
+
+    def put(
+        self,
+        name: str,
+        stat: os.stat_result,
+        paths: Dict[str, Optional[str]],
+    ):
+        """
+        Cache the path keys of a file.
+        :param name: File name within BT_backup
+        :type name: str
+        :param stat: Stat of the file the paths were read from
+        :type stat: os.stat_result
+        :param paths: Path keys of the file
+        :type paths: dict
+        """
+        entry = (*_stat_key(stat), *(paths.get(key) for key in CACHED_KEYS))
+        self._entries[name] = entry
+        self._updates[name] = entry
+        self._removed.discard(name)
+
+    def prune(self, names: Iterable[str]):
+        """Drop entries of files that are no longer in BT_backup."""
+        removed = set(self._entries).difference(names)
+        for name in removed:
+            del self._entries[name]
+            self._updates.pop(name, None)
+        self._removed.update(removed)
+
+    def commit(self):
+        """Write pending changes to the cache file."""
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO fastresume_v1 VALUES "
+                "(?, ?, ?, ?, ?, ?, ?)",
+                ((name, *entry) for name, entry in self._updates.items()),
+            )
+            self._connection.executemany(
+                "DELETE FROM fastresume_v1 WHERE name = ?",
+                ((name,) for name in self._removed),
+            )
+        self.logger.debug(
+            f"Metadata cache committed, {len(self._updates)} updated, "
+            f"{len(self._removed)} removed."
+        )
+        self._updates.clear()
+        self._removed.clear()
+
+    def close(self):
+        self.commit()
+        self._connection.close()
@@ -1,23 +1,175 @@
+import asyncio
+import hashlib
 import logging
-import re
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
 from datetime import datetime
+from functools import partial
 from pathlib import Path
-from threading import Thread
-from typing import Optional, Union
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 
-import bencodepy
 from bencodepy.exceptions import BencodeDecodeError
 
-from qbt_migrate.enums import TargetOS
+from qbt_migrate.backup_store import BackupStore, default_store_path
+from qbt_migrate.bencoding import (
+    PATH_KEYS,
+    bencode,
+    decode_keys,
+    splice_dict,
+)
+from qbt_migrate.cache import MetadataCache
+from qbt_migrate.enums import (
+    BackupMode,
+    Compression,
+    Durability,
+    TargetOS,
+    Verification,
+)
+from qbt_migrate.journal import Journal, run_arguments
+from qbt_migrate.mapping import PathMapping, as_mapping, transform_paths
 from qbt_migrate.methods import (
+    atomic_write,
     backup_folder,
+    clone_file,
+    contains_any,
     convert_slashes,
     discover_bt_backup_path,
+    scan_bt_backup,
+    snapshot_folder,
+    submit_bounded,
+    sync_directory,
 )
+from qbt_migrate.pipeline import Stage, staged
+from qbt_migrate.plan import MigrationPlan, PlanEntry, PlanMismatchError
+from qbt_migrate.verify import MissingTargetsError, TargetVerifier
 
 
 logger = logging.getLogger(__name__)
-bencode = bencodepy.Bencode(encoding="utf-8", encoding_fallback="all")
+# Errors raised when a .fastresume file cannot be loaded
+LOAD_ERRORS = (BencodeDecodeError, FileNotFoundError, ValueError)
+
+
+@dataclass
+class FileResult:
+    """Outcome of processing a single .fastresume file."""
+
+    file_path: Path
+    error: Optional[BaseException] = None
+    bytes_written: int = 0
+    rewrite_seconds: float = 0.0
+    verify_seconds: float = 0.0
+    write_seconds: float = 0.0
+    # New paths that don't exist, when verified
+    missing: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class RunStats:
+    """Counters and per-phase timings of a run."""
+
+    files_scanned: int = 0
+    files_decoded: int = 0
+    bytes_read: int = 0
+    files_matched: int = 0
+    files_skipped_bad: int = 0
+    files_skipped_done: int = 0
+    files_written: int = 0
+    bytes_written: int = 0
+    errors: int = 0
+    cache_hits: int = 0
+    files_missing_targets: int = 0
+    directories_listed: int = 0
+    # Seconds by phase. `backup`, `discovery` and `total` are wall time,
+    # `read` (async runs), `rewrite`, `verify` and `write` are summed over
+    # all workers.
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    def add_time(self, phase: str, seconds: float):
+        self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, phase: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.perf_counter() - start)
+
+    def timed(self, iterable: Iterable, phase: str):
+        """Time spent producing the items of `iterable`."""
+        iterator = iter(iterable)
+        while True:
+            with self.timer(phase):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def add_result(self, result: FileResult):
+        if result.ok:
+            self.files_written += 1
+            self.bytes_written += result.bytes_written
+        else:
+            self.errors += 1
+        if result.missing:
+            self.files_missing_targets += 1
+        self.add_time("rewrite", result.rewrite_seconds)
+        if result.verify_seconds:
+            self.add_time("verify", result.verify_seconds)
+        self.add_time("write", result.write_seconds)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        total = self.timings.get("total")
+        data["files_per_second"] = (
+            self.files_written / total if total else None
+        )
+        return data
+
+
+@dataclass
+class RunSummary:
+    """Summary of a `QBTBatchMove.run` once all work has been joined."""
+
+    results: List[FileResult] = field(default_factory=list)
+    stats: RunStats = field(default_factory=RunStats)
+
+    @property
+    def processed(self) -> int:
+        return len(self.results)
+
+    @property
+    def succeeded(self) -> int:
+        return sum(1 for result in self.results if result.ok)
+
+    @property
+    def failed(self) -> int:
+        return self.processed - self.succeeded
+
+    @property
+    def errors(self) -> Dict[Path, BaseException]:
+        return {
+            result.file_path: result.error
+            for result in self.results
+            if not result.ok
+        }
+
+    @property
+    def missing(self) -> Dict[Path, List[str]]:
+        """New paths that don't exist, by file, when verified."""
+        return {
+            result.file_path: result.missing
+            for result in self.results
+            if result.missing
+        }
 
 
 class QBTBatchMove(object):
@@ -32,18 +184,31 @@ class QBTBatchMove(object):
 
     def run(
         self,
-        existing_path: str,
-        new_path: str,
+        existing_path: Union[str, PathMapping],
+        new_path: Optional[str],
         regex_path: bool = False,
         target_os: Optional[TargetOS] = None,
         create_backup: bool = True,
         skip_bad_files: bool = False,
-    ):
+        max_workers: Optional[int] = None,
+        use_processes: bool = False,
+        cache_path: Union[str, Path, None] = None,
+        durability: Durability = Durability.NONE,
+        backup_mode: BackupMode = BackupMode.ZIP,
+        backup_path: Union[str, Path, None] = None,
+        compression: Compression = Compression.DEFLATE,
+        streaming: bool = False,
+        journal_path: Union[str, Path, None] = None,
+        resume: bool = False,
+        verification: Verification = Verification.NONE,
+    ) -> RunSummary:
         """
         Perform Batch Processing of path changes.
-        :param existing_path: Existing path to look for
-        :type existing_path: str
-        :param new_path: New Path to replace with
+        :param existing_path: Existing path to look for, or a `PathMapping`
+        of any number of existing paths to new paths. Every file is read and
+        written at most once, however many paths are mapped.
+        :type existing_path: str | PathMapping
+        :param new_path: New Path to replace with, ignored for a mapping
         :type new_path: str
         :param regex_path: Existing and New Paths are regex
         patterns with capture groups
@@ -56,113 +221,1045 @@ class QBTBatchMove(object):
         :param skip_bad_files: Skip .fastresume files that
         cannot be read successfully.
         :type skip_bad_files: bool
+        :param max_workers: Maximum number of files to update concurrently.
+        Defaults to the `ThreadPoolExecutor`/`ProcessPoolExecutor` default.
+        :type max_workers: int
+        :param use_processes: Decode, rewrite and save files in a process
+        pool instead of threads. `discovered_files` is not populated, as the
+        `FastResume` objects only ever exist inside the workers.
+        :type use_processes: bool
+        :param cache_path: SQLite metadata cache to answer relevance from,
+        only files changed since the last run are parsed.
+        See `cache.default_cache_path`.
+        :type cache_path: str | Path
+        :param durability: When written files are flushed to disk.
+        Files are always replaced atomically.
+        :type durability: Durability
+        :param backup_mode: Kind of backup made when `create_backup`
+        :type backup_mode: BackupMode
+        :param backup_path: Folder of the zip archive or snapshot, or the
+        backup store. Defaults to BT_backup for zips and snapshots, and
+        `default_store_path` for stores.
+        :type backup_path: str | Path
+        :param compression: Compression of backup store blobs
+        :type compression: Compression
+        :param streaming: Don't keep the `FastResume` of every relevant file
+        in `discovered_files`. Each file is dropped as soon as it is written
+        and only its `FileResult` is kept, so memory doesn't grow with the
+        number of torrents.
+        :type streaming: bool
+        :param journal_path: Keep a write-ahead journal of updated files,
+        so an interrupted run can be finished with `resume`.
+        Not supported with `use_processes`.
+        See `journal.default_journal_path`.
+        :type journal_path: str | Path
+        :param resume: Continue the run recorded in the journal, files it
+        already updated are skipped without being read
+        :type resume: bool
+        :param verification: Check that the new paths of each file exist
+        before it is written, see `verify.TargetVerifier`. Missing paths are
+        in the summary, and with `Verification.REFUSE` their files fail
+        with `MissingTargetsError` instead of being written.
+        Not supported with `use_processes`.
+        :type verification: Verification
+        :return: Summary of processed files, including per-file errors
+        :rtype: RunSummary
         """
         if not self.bt_backup_path.is_dir():
             raise NotADirectoryError(self.bt_backup_path)
-        if create_backup:
-            backup_filename = (
-                f"fastresume_backup"
-                f'{datetime.now().strftime("%Y%m%d%H%M%S")}.zip'
+        if journal_path is not None and use_processes:
+            raise ValueError("A journal can't be kept with use_processes")
+        if verification is not Verification.NONE and use_processes:
+            raise ValueError("Paths can't be verified with use_processes")
+        verifier = self._verifier(verification)
+        mapping = as_mapping(existing_path, new_path, regex_path)
+        start = time.perf_counter()
+        stats = RunStats()
+        journal = self._open_journal(
+            journal_path, resume, mapping, target_os, durability
+        )
+        try:
+            # One directory listing is shared by the backup and discovery
+            entries = scan_bt_backup(self.bt_backup_path)
+            if create_backup:
+                with stats.timer("backup"):
+                    self._create_backup(
+                        entries,
+                        backup_mode,
+                        backup_path,
+                        compression,
+                        max_workers,
+                    )
+            entries = self._skip_journaled(entries, journal, stats)
+
+            self.logger.info(
+                f"🕵️ Searching for .fastresume files with path "
+                f"{', '.join(mapping.existing_paths)} ..."
             )
-            backup_folder(
-                self.bt_backup_path, self.bt_backup_path / backup_filename
+            cache = MetadataCache(cache_path) if cache_path else None
+            try:
+                summary = self._run(
+                    entries,
+                    mapping,
+                    target_os,
+                    skip_bad_files,
+                    max_workers,
+                    use_processes,
+                    cache,
+                    durability,
+                    stats,
+                    streaming,
+                    journal,
+                    verifier,
+                )
+            finally:
+                if cache is not None:
+                    stats.cache_hits = cache.hits
+                    cache.close()
+        finally:
+            if journal is not None:
+                journal.close()
+        self._finish_batch(summary, durability, start, verifier)
+        return summary
+
+    @staticmethod
+    def _verifier(verification: Verification) -> Optional[TargetVerifier]:
+        if verification is Verification.NONE:
+            return None
+        return TargetVerifier(refuse=verification is Verification.REFUSE)
+
+    def _open_journal(
+        self,
+        journal_path: Union[str, Path, None],
+        resume: bool,
+        mapping: PathMapping,
+        target_os: Optional[TargetOS],
+        durability: Durability,
+    ) -> Optional[Journal]:
+        if journal_path is None:
+            if resume:
+                raise ValueError("Resuming a run needs its journal_path")
+            return None
+        journal = Journal(
+            journal_path,
+            run_arguments(self.bt_backup_path, mapping, target_os),
+            resume=resume,
+            sync=durability is Durability.FILE,
+        )
+        if resume:
+            self.logger.info(
+                f"📓 Resuming run from {journal_path}, "
+                f"{len(journal.completed)} files already updated."
             )
+        return journal
 
-        self.logger.info(
-            f"🕵️ Searching for .fastresume files with path {existing_path} ..."
+    @staticmethod
+    def _skip_journaled(
+        entries: List[os.DirEntry],
+        journal: Optional[Journal],
+        stats: RunStats,
+    ) -> List[os.DirEntry]:
+        """Drop the files a resumed journal has already updated."""
+        if journal is None or not journal.completed:
+            return entries
+        remaining = [
+            entry for entry in entries if entry.name not in journal.completed
+        ]
+        stats.files_skipped_done = len(entries) - len(remaining)
+        return remaining
+
+    async def run_async(
+        self,
+        existing_path: Union[str, PathMapping],
+        new_path: Optional[str],
+        regex_path: bool = False,
+        target_os: Optional[TargetOS] = None,
+        create_backup: bool = True,
+        skip_bad_files: bool = False,
+        max_workers: Optional[int] = None,
+        cache_path: Union[str, Path, None] = None,
+        durability: Durability = Durability.NONE,
+        backup_mode: BackupMode = BackupMode.ZIP,
+        backup_path: Union[str, Path, None] = None,
+        compression: Compression = Compression.DEFLATE,
+        queue_size: Optional[int] = None,
+        batch_size: int = 16,
+        streaming: bool = False,
+        journal_path: Union[str, Path, None] = None,
+        resume: bool = False,
+        verification: Verification = Verification.NONE,
+    ) -> RunSummary:
+        """
+        Asyncio variant of `run` that never blocks the event loop.
+        Reading, rewriting and writing files are separate stages connected
+        by bounded queues (see `pipeline.staged`), blocking work runs in a
+        thread pool, so file I/O and path rewrites overlap while memory
+        stays flat. Arguments are the same as for `run`.
+        :param queue_size: Maximum number of batches waiting between two
+        stages, defaults to twice `max_workers`
+        :type queue_size: int
+        :param batch_size: Files handed to a stage at once
+        :type batch_size: int
+        :return: Summary of processed files, including per-file errors
+        :rtype: RunSummary
+        """
+        loop = asyncio.get_running_loop()
+        mapping = as_mapping(existing_path, new_path, regex_path)
+        if max_workers is None:
+            max_workers = min(32, (os.cpu_count() or 1) + 4)
+        if queue_size is None:
+            queue_size = max_workers * 2
+        verifier = self._verifier(verification)
+        start = time.perf_counter()
+        summary = RunSummary()
+        stats = summary.stats
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        # SQLite connections can only be used by the thread that opened them
+        cache_executor = ThreadPoolExecutor(max_workers=1)
+        cache = None
+        journal = None
+        try:
+            if not await loop.run_in_executor(
+                executor, self.bt_backup_path.is_dir
+            ):
+                raise NotADirectoryError(self.bt_backup_path)
+            journal = await loop.run_in_executor(
+                executor,
+                self._open_journal,
+                journal_path,
+                resume,
+                mapping,
+                target_os,
+                durability,
+            )
+            entries = await loop.run_in_executor(
+                executor, scan_bt_backup, self.bt_backup_path
+            )
+            if create_backup:
+                with stats.timer("backup"):
+                    await loop.run_in_executor(
+                        executor,
+                        partial(
+                            self._create_backup,
+                            entries,
+                            backup_mode,
+                            backup_path,
+                            compression,
+                            max_workers,
+                        ),
+                    )
+            entries = self._skip_journaled(entries, journal, stats)
+            self.logger.info(
+                f"🕵️ Searching for .fastresume files with path "
+                f"{', '.join(mapping.existing_paths)} ..."
+            )
+            if cache_path:
+                cache = await loop.run_in_executor(
+                    cache_executor, MetadataCache, cache_path
+                )
+            files = await loop.run_in_executor(
+                cache_executor,
+                lambda: list(
+                    self._cache_filter(
+                        self._scanned(
+                            self.iter_fast_resume_files(
+                                self.bt_backup_path, entries
+                            ),
+                            stats,
+                        ),
+                        mapping,
+                        cache,
+                    )
+                ),
+            )
+            stages = [
+                Stage(
+                    "read",
+                    partial(self._read_candidate, mapping, cache is None),
+                    max_workers,
+                ),
+                Stage(
+                    "match",
+                    partial(
+                        self._match_candidate,
+                        mapping,
+                        cache,
+                        stats,
+                        not skip_bad_files,
+                        streaming,
+                    ),
+                    inline=True,
+                ),
+                Stage(
+                    "rewrite",
+                    partial(self._rewrite, mapping, target_os),
+                    max_workers,
+                ),
+            ]
+            if verifier is not None:
+                stages.append(
+                    Stage(
+                        "verify",
+                        partial(self._verify, verifier),
+                        max_workers,
+                    )
+                )
+            stages.append(
+                Stage(
+                    "write",
+                    partial(self._write, durability, journal=journal),
+                    max_workers,
+                )
+            )
+            async for result in staged(
+                files, stages, executor, queue_size, batch_size
+            ):
+                summary.results.append(result)
+        finally:
+            if cache is not None:
+                stats.cache_hits = cache.hits
+                await loop.run_in_executor(cache_executor, cache.close)
+            # Files already being written when a stage fails are finished
+            # before returning, queued work was cancelled with the pipeline
+            await loop.run_in_executor(None, executor.shutdown)
+            await loop.run_in_executor(None, cache_executor.shutdown)
+            if journal is not None:
+                await loop.run_in_executor(None, journal.close)
+        await loop.run_in_executor(
+            None, self._finish_batch, summary, durability, start, verifier
         )
-        count = 0
-        for fast_resume in self.discover_relevant_fast_resume(
-            self.bt_backup_path, existing_path, regex_path, not skip_bad_files
-        ):
-            count += 1
-            # Fire and forget
+        return summary
+
+    @staticmethod
+    def _read_candidate(
+        mapping: PathMapping, prefilter: bool, file: os.DirEntry
+    ) -> Tuple[
+        os.DirEntry, Optional["FastResume"], Optional[Exception], float
+    ]:
+        """
+        Pipeline stage, loads a file unless the prefilter rules it out.
+        Load errors are returned for `_match_candidate` to handle.
+        """
+        start = time.perf_counter()
+        try:
+            fast_resume = FastResume.load_candidate(
+                file, mapping, prefilter=prefilter
+            )
+        except LOAD_ERRORS as e:
+            return file, None, e, time.perf_counter() - start
+        return file, fast_resume, None, time.perf_counter() - start
+
+    def _match_candidate(
+        self,
+        mapping: PathMapping,
+        cache: Optional[MetadataCache],
+        stats: RunStats,
+        raise_on_error: bool,
+        streaming: bool,
+        candidate: Tuple,
+    ) -> Optional["FastResume"]:
+        """
+        Inline pipeline stage, keeps relevant files and does the
+        bookkeeping that isn't thread-safe: stats, the cache and,
+        unless `streaming`, `discovered_files`.
+        """
+        file, fast_resume, error, seconds = candidate
+        stats.add_time("read", seconds)
+        if error is not None:
+            self._handle_load_error(file.path, error, raise_on_error)
+            stats.files_skipped_bad += 1
+            return None
+        if fast_resume is None:
+            return None
+        stats.files_decoded += 1
+        stats.bytes_read += fast_resume.raw_size
+        if cache is not None:
+            cache.put(file.name, file.stat(), fast_resume.path_values())
+        if not fast_resume.is_relevant(mapping):
+            logger.debug(f"FastResume {file.path} is not relevant")
+            return None
+        stats.files_matched += 1
+        if not streaming:
             self.discovered_files.add(fast_resume)
-            Thread(
-                target=fast_resume.replace_paths,
-                args=[
-                    existing_path,
-                    new_path,
-                    regex_path,
-                    target_os,
-                    True,
-                    False,
-                ],
-            ).start()
+        return fast_resume
+
+    def plan(
+        self,
+        existing_path: Union[str, PathMapping],
+        new_path: Optional[str],
+        regex_path: bool = False,
+        target_os: Optional[TargetOS] = None,
+        skip_bad_files: bool = False,
+        cache_path: Union[str, Path, None] = None,
+        verification: Verification = Verification.NONE,
+    ) -> MigrationPlan:
+        """
+        Work out the path changes of a run without writing anything.
+        Arguments are the same as for `run`. Files whose new paths don't
+        exist are reported, and left out of the plan with
+        `Verification.REFUSE`.
+        :return: Plan that can be saved and later applied with `apply_plan`
+        :rtype: MigrationPlan
+        """
+        if not self.bt_backup_path.is_dir():
+            raise NotADirectoryError(self.bt_backup_path)
+        mapping = as_mapping(existing_path, new_path, regex_path)
+        self.logger.info(
+            f"🕵️ Planning changes for .fastresume files with path "
+            f"{', '.join(mapping.existing_paths)} ..."
+        )
+        plan = MigrationPlan(str(self.bt_backup_path))
+        verifier = self._verifier(verification)
+        cache = MetadataCache(cache_path) if cache_path else None
+        try:
+            for fast_resume in self.discover_relevant_fast_resume(
+                self.bt_backup_path,
+                mapping,
+                raise_on_error=not skip_bad_files,
+                cache=cache,
+            ):
+                try:
+                    entry = self._plan_entry(fast_resume, mapping, target_os)
+                except Exception as e:
+                    logger.error(
+                        f"🛑 Unable to plan {fast_resume.file_path}: {e}"
+                    )
+                    continue
+                if entry is None:
+                    continue
+                missing = []
+                if verifier is not None:
+                    missing = verifier.missing(fast_resume)
+                if missing:
+                    logger.warning(
+                        f"⚠️ {fast_resume.file_path}: "
+                        f"{', '.join(missing)} does not exist"
+                        f"{', not planned' if verifier.refuse else ''}"
+                    )
+                    if verifier.refuse:
+                        continue
+                plan.entries.append(entry)
+        finally:
+            if cache is not None:
+                cache.close()
+        count = len(plan)
+        logger.info(
+            f"📝 Planned changes to {count} fastresume "
+            f"file{'s' if count != 1 else ''}."
+        )
+        return plan
+
+    @staticmethod
+    def _plan_entry(
+        fast_resume: "FastResume",
+        mapping: PathMapping,
+        target_os: Optional[TargetOS],
+    ) -> Optional[PlanEntry]:
+        old = {key: fast_resume.get(key) for key in PATH_KEYS}
+        fast_resume.apply_mapping(mapping, target_os, False, False)
+        new = {
+            key: value
+            for key, value in fast_resume.changes().items()
+            if value != old[key]
+        }
+        if not new:
+            return None
+        return PlanEntry(
+            file_name=fast_resume.file_path.name,
+            sha256=fast_resume.content_hash(),
+            old={key: old[key] for key in new},
+            new=new,
+        )
+
+    def apply_plan(
+        self,
+        plan: MigrationPlan,
+        create_backup: bool = True,
+        max_workers: Optional[int] = None,
+        durability: Durability = Durability.NONE,
+        backup_mode: BackupMode = BackupMode.ZIP,
+        backup_path: Union[str, Path, None] = None,
+        compression: Compression = Compression.DEFLATE,
+    ) -> RunSummary:
+        """
+        Apply a plan made by `plan` without searching BT_backup again.
+        Files whose content changed since the plan was made are not
+        touched and fail with `PlanMismatchError`.
+        :param plan: Migration plan to apply
+        :type plan: MigrationPlan
+        :param create_backup: Create a backup archive of the
+        BT_backup directory?
+        :type create_backup: bool
+        :param max_workers: Maximum number of files to update concurrently.
+        :type max_workers: int
+        :param durability: When written files are flushed to disk.
+        :type durability: Durability
+        :param backup_mode: Kind of backup made when `create_backup`
+        :type backup_mode: BackupMode
+        :param backup_path: Folder of the zip archive or snapshot, or the
+        backup store
+        :type backup_path: str | Path
+        :param compression: Compression of backup store blobs
+        :type compression: Compression
+        :return: Summary of processed files, including per-file errors
+        :rtype: RunSummary
+        """
+        if not self.bt_backup_path.is_dir():
+            raise NotADirectoryError(self.bt_backup_path)
+        start = time.perf_counter()
+        stats = RunStats(files_matched=len(plan))
+        if create_backup:
+            with stats.timer("backup"):
+                self._create_backup(
+                    scan_bt_backup(self.bt_backup_path),
+                    backup_mode,
+                    backup_path,
+                    compression,
+                    max_workers,
+                )
+        if max_workers is None:
+            max_workers = min(32, (os.cpu_count() or 1) + 4)
+        self.logger.info(
+            f"📝 Applying migration plan from {plan.created} "
+            f"to {len(plan)} fastresume files..."
+        )
+        summary = RunSummary(stats=stats)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for _, future in submit_bounded(
+                executor,
+                self._apply_entry,
+                ((entry, durability) for entry in plan.entries),
+                max_workers * 2,
+            ):
+                summary.results.append(future.result())
+        self._finish_batch(summary, durability, start)
+        return summary
+
+    def _apply_entry(
+        self, entry: PlanEntry, durability: Durability = Durability.NONE
+    ) -> FileResult:
+        file_path = self.bt_backup_path / entry.file_name
+        try:
+            start = time.perf_counter()
+            fast_resume = FastResume(file_path, lazy=True)
+            if fast_resume.content_hash() != entry.sha256:
+                raise PlanMismatchError(
+                    f"{file_path} has changed since the plan was made"
+                )
+            fast_resume.set_values(entry.new)
+            rewritten = time.perf_counter()
+            bytes_written = fast_resume.save(durability=durability)
+        except Exception as e:
+            self.logger.debug(f"Failed to update {file_path}: {e}")
+            return FileResult(file_path, e)
+        return FileResult(
+            file_path,
+            bytes_written=bytes_written,
+            rewrite_seconds=rewritten - start,
+            write_seconds=time.perf_counter() - rewritten,
+        )
+
+    def _create_backup(
+        self,
+        entries: List[os.DirEntry],
+        backup_mode: BackupMode = BackupMode.ZIP,
+        backup_path: Union[str, Path, None] = None,
+        compression: Compression = Compression.DEFLATE,
+        max_workers: Optional[int] = None,
+    ):
+        if backup_mode is BackupMode.STORE:
+            if backup_path is None:
+                backup_path = default_store_path(self.bt_backup_path)
+            BackupStore(backup_path).backup(
+                self.bt_backup_path,
+                entries,
+                compression=compression,
+                max_workers=max_workers,
+            )
+            return
+        if backup_path is None:
+            backup_path = self.bt_backup_path
+        else:
+            Path(backup_path).mkdir(parents=True, exist_ok=True)
+        backup_name = (
+            f'fastresume_backup{datetime.now().strftime("%Y%m%d%H%M%S")}'
+        )
+        if backup_mode is BackupMode.SNAPSHOT:
+            snapshot_folder(
+                self.bt_backup_path,
+                Path(backup_path) / backup_name,
+                entries=entries,
+            )
+            return
+        backup_folder(
+            self.bt_backup_path,
+            Path(backup_path) / f"{backup_name}.zip",
+            entries=entries,
+        )
+
+    def _finish_batch(
+        self,
+        summary: RunSummary,
+        durability: Durability,
+        start: float,
+        verifier: Optional[TargetVerifier] = None,
+    ):
+        if durability is Durability.BATCH and summary.succeeded:
+            with summary.stats.timer("write"):
+                sync_directory(
+                    self.bt_backup_path,
+                    (
+                        result.file_path
+                        for result in summary.results
+                        if result.ok and result.bytes_written
+                    ),
+                )
+        for result in summary.results:
+            summary.stats.add_result(result)
+        if verifier is not None:
+            summary.stats.directories_listed = verifier.listed
+        summary.stats.timings["total"] = time.perf_counter() - start
+        self._log_summary(summary)
+
+    @staticmethod
+    def _log_summary(summary: RunSummary):
+        count = summary.processed
         logger.info(
             f"{'✔️' if count else '⚠️'} "
             f"Processed {count} relevant fastresume "
             f"file{'s' if count > 1 else ''}!"
         )
+        for file_path, error in summary.errors.items():
+            logger.error(f"🛑 Failed to update {file_path}: {error}")
+        for result in summary.results:
+            if result.ok and result.missing:
+                logger.warning(
+                    f"⚠️ {result.file_path} was updated, but "
+                    f"{', '.join(result.missing)} does not exist"
+                )
+
+    def _run(
+        self,
+        entries: List[os.DirEntry],
+        mapping: PathMapping,
+        target_os: Optional[TargetOS],
+        skip_bad_files: bool,
+        max_workers: Optional[int],
+        use_processes: bool,
+        cache: Optional[MetadataCache],
+        durability: Durability = Durability.NONE,
+        stats: Optional[RunStats] = None,
+        streaming: bool = False,
+        journal: Optional[Journal] = None,
+        verifier: Optional[TargetVerifier] = None,
+    ) -> RunSummary:
+        if use_processes:
+            return self._run_processes(
+                entries,
+                mapping,
+                target_os,
+                skip_bad_files,
+                max_workers,
+                cache,
+                durability,
+                stats,
+            )
+        return self._run_threads(
+            entries,
+            mapping,
+            target_os,
+            skip_bad_files,
+            max_workers,
+            cache,
+            durability,
+            stats,
+            streaming,
+            journal,
+            verifier,
+        )
+
+    def _run_threads(
+        self,
+        entries: List[os.DirEntry],
+        mapping: PathMapping,
+        target_os: Optional[TargetOS],
+        skip_bad_files: bool,
+        max_workers: Optional[int],
+        cache: Optional[MetadataCache] = None,
+        durability: Durability = Durability.NONE,
+        stats: Optional[RunStats] = None,
+        streaming: bool = False,
+        journal: Optional[Journal] = None,
+        verifier: Optional[TargetVerifier] = None,
+    ) -> RunSummary:
+        if max_workers is None:
+            # Same default as `ThreadPoolExecutor`
+            max_workers = min(32, (os.cpu_count() or 1) + 4)
+
+        if stats is None:
+            stats = RunStats()
+        discovered = self.discover_relevant_fast_resume(
+            self.bt_backup_path,
+            mapping,
+            raise_on_error=not skip_bad_files,
+            entries=entries,
+            cache=cache,
+            stats=stats,
+        )
+
+        def jobs():
+            for fast_resume in stats.timed(discovered, "discovery"):
+                if not streaming:
+                    self.discovered_files.add(fast_resume)
+                yield (
+                    fast_resume,
+                    mapping,
+                    target_os,
+                    durability,
+                    journal,
+                    verifier,
+                )
+
+        summary = RunSummary(stats=stats)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for _, future in submit_bounded(
+                executor, self._replace_paths, jobs(), max_workers * 2
+            ):
+                summary.results.append(future.result())
+        return summary
+
+    def _run_processes(
+        self,
+        entries: List[os.DirEntry],
+        mapping: PathMapping,
+        target_os: Optional[TargetOS],
+        skip_bad_files: bool,
+        max_workers: Optional[int],
+        cache: Optional[MetadataCache] = None,
+        durability: Durability = Durability.NONE,
+        stats: Optional[RunStats] = None,
+    ) -> RunSummary:
+        if max_workers is None:
+            # Same default as `ProcessPoolExecutor`
+            max_workers = os.cpu_count() or 1
+        if stats is None:
+            stats = RunStats()
+        files = self._cache_filter(
+            self._scanned(
+                self.iter_fast_resume_files(self.bt_backup_path, entries),
+                stats,
+            ),
+            mapping,
+            cache,
+        )
+        pending = {}
+
+        def jobs():
+            # Only the path crosses the process boundary, `DirEntry` can't
+            for file in stats.timed(files, "discovery"):
+                pending[file.path] = file
+                yield (
+                    file.path,
+                    mapping,
+                    target_os,
+                    cache is None,
+                    durability,
+                )
+
+        summary = RunSummary(stats=stats)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for args, future in submit_bounded(
+                executor, _migrate_fast_resume, jobs(), max_workers * 2
+            ):
+                file = pending.pop(args[0])
+                try:
+                    paths, result, bytes_read = future.result()
+                except LOAD_ERRORS as e:
+                    self._handle_load_error(file.path, e, not skip_bad_files)
+                    stats.files_skipped_bad += 1
+                    continue
+                if bytes_read:
+                    stats.files_decoded += 1
+                    stats.bytes_read += bytes_read
+                if cache is not None and result is None:
+                    cache.put(file.name, file.stat(), paths)
+                if result is not None:
+                    stats.files_matched += 1
+                    summary.results.append(result)
+        return summary
+
+    @classmethod
+    def _replace_paths(
+        cls,
+        fast_resume: "FastResume",
+        mapping: PathMapping,
+        target_os: Optional[TargetOS] = None,
+        durability: Durability = Durability.NONE,
+        journal: Optional[Journal] = None,
+        verifier: Optional[TargetVerifier] = None,
+    ) -> FileResult:
+        rewritten = cls._rewrite(mapping, target_os, fast_resume)
+        if verifier is not None:
+            rewritten = cls._verify(verifier, rewritten)
+        return cls._write(durability, rewritten, journal)
+
+    @classmethod
+    def _rewrite(
+        cls,
+        mapping: PathMapping,
+        target_os: Optional[TargetOS],
+        fast_resume: "FastResume",
+    ) -> Tuple["FastResume", FileResult]:
+        start = time.perf_counter()
+        try:
+            fast_resume.apply_mapping(mapping, target_os, False, False)
+        except Exception as e:
+            cls.logger.debug(f"Failed to update {fast_resume.file_path}: {e}")
+            return fast_resume, FileResult(fast_resume.file_path, e)
+        return fast_resume, FileResult(
+            fast_resume.file_path, rewrite_seconds=time.perf_counter() - start
+        )
+
+    @classmethod
+    def _verify(
+        cls,
+        verifier: TargetVerifier,
+        rewritten: Tuple["FastResume", FileResult],
+    ) -> Tuple["FastResume", FileResult]:
+        fast_resume, result = rewritten
+        if not result.ok:
+            return rewritten
+        start = time.perf_counter()
+        result.missing = verifier.missing(fast_resume)
+        result.verify_seconds = time.perf_counter() - start
+        if result.missing and verifier.refuse:
+            cls.logger.debug(
+                f"Not updating {fast_resume.file_path}, "
+                f"{', '.join(result.missing)} does not exist"
+            )
+            result.error = MissingTargetsError(result.missing)
+        return rewritten
+
+    @classmethod
+    def _write(
+        cls,
+        durability: Durability,
+        rewritten: Tuple["FastResume", FileResult],
+        journal: Optional[Journal] = None,
+    ) -> FileResult:
+        fast_resume, result = rewritten
+        if not result.ok:
+            return result
+        start = time.perf_counter()
+        name = fast_resume.file_path.name
+        try:
+            if journal is not None:
+                journal.intent(name, fast_resume.content_hash())
+            result.bytes_written = fast_resume.save(durability=durability)
+            if journal is not None:
+                journal.done(name)
+        except Exception as e:
+            cls.logger.debug(f"Failed to update {fast_resume.file_path}: {e}")
+            result.error = e
+            return result
+        result.write_seconds = time.perf_counter() - start
+        return result
+
+    @classmethod
+    def _handle_load_error(
+        cls, file: Union[str, Path], error: Exception, raise_on_error: bool
+    ):
+        if raise_on_error:
+            cls.logger.critical(
+                f"🛑 Unable to parse {file}. Stopping Discovery!"
+            )
+            raise error
+        cls.logger.warning(f"⚠️ Unable to parse {file}. Skipping!\n\n{error}")
+
+    @staticmethod
+    def iter_fast_resume_files(
+        bt_backup_path: Union[str, Path],
+        entries: Optional[Iterable[os.DirEntry]] = None,
+    ):
+        """
+        Iterate the .fastresume files at the top level of BT_backup.
+        :param bt_backup_path: Path to BT_backup folder
+        :type bt_backup_path: str | Path
+        :param entries: Listing from `scan_bt_backup` to reuse
+        :type entries: Iterable[os.DirEntry]
+        :return: Directory entries of .fastresume files
+        :rtype: Iterator[os.DirEntry]
+        """
+        if entries is None:
+            entries = scan_bt_backup(bt_backup_path)
+        for entry in entries:
+            if entry.name.endswith(".fastresume"):
+                yield entry
 
     @classmethod
     def discover_relevant_fast_resume(
         cls,
         bt_backup_path: Union[str, Path],
-        existing_path: str,
+        existing_path: Union[str, PathMapping],
         regex_path: bool = False,
         raise_on_error: bool = True,
+        max_workers: Optional[int] = None,
+        use_processes: bool = False,
+        entries: Optional[Iterable[os.DirEntry]] = None,
+        cache: Optional[MetadataCache] = None,
+        stats: Optional[RunStats] = None,
     ):
         """
         Find .fastresume files that contain the existing path.
         :param bt_backup_path: Path to BT_backup folder
         :type bt_backup_path: str | Path
-        :param existing_path: The existing path to look for
-        :type existing_path: str
+        :param existing_path: The existing path to look for, or a
+        `PathMapping` to match all of its existing paths at once
+        :type existing_path: str | PathMapping
         :param regex_path: Existing Path is a regex pattern with capture groups
         :type: bool
         :param raise_on_error: Raise if error parsing .fastresume files
         :type raise_on_error: bool
+        :param max_workers: Number of worker processes when `use_processes`
+        :type max_workers: int
+        :param use_processes: Decode and match files in a process pool.
+        Only relevant files are decoded again in this process.
+        :type use_processes: bool
+        :param entries: Listing from `scan_bt_backup` to reuse
+        :type entries: Iterable[os.DirEntry]
+        :param cache: Metadata cache to answer relevance from. Files that
+        are not cached, or changed since, are parsed and cached.
+        :type cache: MetadataCache
+        :param stats: Counters to update as files are scanned and decoded
+        :type stats: RunStats
         :return: List of FastResume Objects
         :rtype: list[FastResume]
         """
-        bt_backup_path = Path(bt_backup_path)
-        for file in bt_backup_path.iterdir():
-            if file.is_dir():
+        if stats is None:
+            stats = RunStats()
+        mapping = as_mapping(existing_path, regex_path=regex_path)
+        files = cls._cache_filter(
+            cls._scanned(
+                cls.iter_fast_resume_files(bt_backup_path, entries), stats
+            ),
+            mapping,
+            cache,
+        )
+        if use_processes:
+            yield from cls._discover_processes(
+                files,
+                mapping,
+                raise_on_error,
+                max_workers,
+                cache,
+                stats,
+            )
+            return
+        for file in files:
+            try:
+                # The prefilter can't be used when filling the cache,
+                # the paths of every file are needed
+                fast_resume = FastResume.load_candidate(
+                    file, mapping, prefilter=cache is None
+                )
+                if cache is not None:
+                    paths = fast_resume.path_values()
+                    cache.put(file.name, file.stat(), paths)
+            except LOAD_ERRORS as e:
+                cls._handle_load_error(file.path, e, raise_on_error)
+                stats.files_skipped_bad += 1
                 continue
-            if file.name.endswith(".fastresume"):
+            if fast_resume is None:
+                continue
+            stats.files_decoded += 1
+            stats.bytes_read += fast_resume.raw_size
+            if fast_resume.is_relevant(mapping):
+                stats.files_matched += 1
+                yield fast_resume
+            else:
+                logger.debug(
+                    f"FastResume {file.path} is not relevant, "
+                    f"Save Path: {fast_resume.save_path}, "
+                    f"qBt-savePath: {fast_resume.qbt_save_path}"
+                )
+        return
+
+    @classmethod
+    def _discover_processes(
+        cls,
+        files: Iterable[os.DirEntry],
+        mapping: PathMapping,
+        raise_on_error: bool,
+        max_workers: Optional[int],
+        cache: Optional[MetadataCache] = None,
+        stats: Optional[RunStats] = None,
+    ):
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        if stats is None:
+            stats = RunStats()
+        pending = {}
+
+        def jobs():
+            for file in files:
+                pending[file.path] = file
+                yield file.path, mapping, cache is None
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for args, future in submit_bounded(
+                executor, _match_fast_resume, jobs(), max_workers * 2
+            ):
+                file = pending.pop(args[0])
                 try:
-                    fast_resume = FastResume(bt_backup_path / file)
-                except (
-                    BencodeDecodeError,
-                    FileNotFoundError,
-                    ValueError,
-                ) as e:
-                    if raise_on_error:
-                        cls.logger.critical(
-                            f"🛑 Unable to parse {file}. Stopping Discovery!"
-                        )
-                        raise e
-                    cls.logger.warning(
-                        f"⚠️ Unable to parse {file}. Skipping!\n\n{e}"
-                    )
+                    paths, relevant, bytes_read = future.result()
+                except LOAD_ERRORS as e:
+                    cls._handle_load_error(file.path, e, raise_on_error)
+                    stats.files_skipped_bad += 1
                     continue
-                if (
-                    fast_resume.save_path is not None
-                    and existing_path in fast_resume.save_path
-                ) or (
-                    fast_resume.qbt_save_path is not None
-                    and existing_path in fast_resume.qbt_save_path
-                ):
-                    yield fast_resume
-                elif regex_path and (
-                    (
-                        fast_resume.save_path is not None
-                        and re.search(existing_path, fast_resume.save_path)
-                    )
-                    or (
-                        fast_resume.qbt_save_path is not None
-                        and re.search(existing_path, fast_resume.qbt_save_path)
-                    )
-                ):
-                    yield fast_resume
+                if bytes_read:
+                    stats.files_decoded += 1
+                    stats.bytes_read += bytes_read
+                if cache is not None:
+                    cache.put(file.name, file.stat(), paths)
+                if relevant:
+                    stats.files_matched += 1
+                    yield FastResume(file, lazy=True)
                 else:
-                    logger.debug(
-                        f"FastResume {file} is not relevant, "
-                        f"Save Path: {fast_resume.save_path}, "
-                        f"qBt-savePath: {fast_resume.qbt_save_path}"
-                    )
-        return
+                    logger.debug(f"FastResume {file.path} is not relevant")
+
+    @staticmethod
+    def _scanned(files: Iterable[os.DirEntry], stats: RunStats):
+        for file in files:
+            stats.files_scanned += 1
+            yield file
+
+    @staticmethod
+    def _cache_filter(
+        files: Iterable[os.DirEntry],
+        mapping: PathMapping,
+        cache: Optional[MetadataCache],
+    ):
+        """
+        Drop the files the cache knows are not relevant, then prune
+        files no longer in BT_backup from the cache.
+        """
+        if cache is None:
+            yield from files
+            return
+        names = []
+        for file in files:
+            names.append(file.name)
+            try:
+                cached = cache.get(file.name, file.stat())
+            except OSError:
+                cached = None  # Loading the file will report the error
+            if cached is not None and not FastResume.paths_relevant(
+                cached, mapping
+            ):
+                logger.debug(f"FastResume {file.path} cached as not relevant")
+                continue
+            yield file
+        cache.prune(names)
 
     @classmethod
     def backup_folder(
@@ -193,26 +1290,125 @@ class QBTBatchMove(object):
         )
 
 
-class FastResume(object):
-    logger = logging.getLogger(__name__ + ".FastResume")
+def _match_fast_resume(
+    file_path: str, mapping: PathMapping, prefilter: bool
+) -> Tuple[Optional[Dict[str, Optional[str]]], bool, int]:
+    """
+    Process pool worker, decodes a .fastresume and checks relevance.
+    Returns the path keys of the file (None if ruled out by the prefilter),
+    whether it is relevant and the number of bytes decoded.
+    """
+    fast_resume = FastResume.load_candidate(
+        file_path, mapping, prefilter=prefilter
+    )
+    if fast_resume is None:
+        return None, False, 0
+    relevant = fast_resume.is_relevant(mapping)
+    return fast_resume.path_values(), relevant, fast_resume.raw_size
+
+
+def _migrate_fast_resume(
+    file_path: str,
+    mapping: PathMapping,
+    target_os: Optional[TargetOS],
+    prefilter: bool,
+    durability: Durability = Durability.NONE,
+) -> Tuple[Optional[Dict[str, Optional[str]]], Optional[FileResult], int]:
+    """
+    Process pool worker, discovers, rewrites and saves a .fastresume
+    entirely in-process. Returns the original path keys of the file
+    (None if ruled out by the prefilter), the result, which is `None`
+    when the file is not relevant, and the number of bytes decoded.
+    Load errors are raised so the caller can decide whether to skip.
+    """
+    fast_resume = FastResume.load_candidate(
+        file_path, mapping, prefilter=prefilter
+    )
+    if fast_resume is None:
+        return None, None, 0
+    paths = fast_resume.path_values()
+    bytes_read = fast_resume.raw_size
+    if not fast_resume.is_relevant(mapping):
+        return paths, None, bytes_read
+    return (
+        paths,
+        QBTBatchMove._replace_paths(
+            fast_resume, mapping, target_os, durability
+        ),
+        bytes_read,
+    )
+
 
-    def __init__(self, file_path: Union[str, Path]):
+def _same_file(stat: os.stat_result, other: os.stat_result) -> bool:
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size) == (
+        other.st_ino,
+        other.st_mtime_ns,
+        other.st_size,
+    )
+
+
+class ResumeData(object):
+    """
+    Resume data of a torrent and the rewriting of its paths, in memory.
+    Shared by .fastresume files (`FastResume`) and torrents.db rows
+    (`torrents_db.ResumeRow`), which each write the changes their own way.
+    """
+
+    logger = logging.getLogger(__name__ + ".ResumeData")
+    # No per-instance __dict__, a run can hold many thousands of these
+    __slots__ = (
+        "_file_path",
+        "_raw",
+        "_data",
+        "_projected",
+        "_changed_keys",
+    )
+
+    def __init__(
+        self, file_path: Union[str, Path], raw: bytes, lazy: bool = False
+    ):
+        """
+        :param file_path: Where the resume data is from, in logs and results
+        :type file_path: str | Path
+        :param raw: Bencoded resume data
+        :type raw: bytes
+        :param lazy: Only decode the path keys, skipping over everything
+        else. The remaining keys are decoded when needed.
+        :type lazy: bool
+        """
         self._file_path = Path(file_path)
-        if not self.file_path.is_file():
-            raise FileNotFoundError(self.file_path)
-        self.logger.debug(f"Loading Fast Resume: {self.file_path}")
-        self._data = bencode.read(self.file_path)
-        self.logger.debug(f"Fast Resume ({self.file_path}) Init Complete.")
+        self._raw = raw
+        if lazy:
+            self._data = decode_keys(self._raw, PATH_KEYS)
+        else:
+            self._data = bencode.decode(self._raw)
+        self._projected = lazy
+        # Keys changed since load, these are spliced into `_raw` on save
+        self._changed_keys = set()
 
     @property
     def file_path(self) -> Path:
         return self._file_path
 
     @property
-    def backup_filename(self) -> Path:
-        return Path(
-            f'{self.file_path}.{datetime.now().strftime("%Y%m%d%H%M%S")}.bkup'
-        )
+    def raw_size(self) -> int:
+        """Size of the resume data as loaded or last saved."""
+        return len(self._raw)
+
+    @property
+    def projected(self) -> bool:
+        """Only the path keys have been decoded so far."""
+        return self._projected
+
+    def decode_all(self):
+        """Decode the keys skipped by a lazy load, keeping any changes."""
+        if not self._projected:
+            return
+        self.logger.debug(f"Decoding all keys of {self.file_path}...")
+        data = bencode.decode(self._raw)
+        data.update(self._data)
+        self._data = data
+        self._projected = False
 
     @property
     def save_path(self) -> Optional[str]:
@@ -234,97 +1430,365 @@ class FastResume(object):
         if "mapped_files" in self._data:
             return self._data["mapped_files"]
 
-    def set_save_path(
+    def get(self, key: str):
+        """
+        Current value of a key, None if not present. Keys skipped by a
+        lazy load are decoded on first use, see `decode_all`.
+        """
+        if self._projected and key not in PATH_KEYS:
+            self.decode_all()
+        return self._data.get(key)
+
+    def path_values(self) -> Dict[str, Optional[str]]:
+        """Values of the save path keys."""
+        return {
+            "save_path": self.save_path,
+            "qBt-savePath": self.qbt_save_path,
+            "qBt-downloadPath": self.qbt_download_path,
+        }
+
+    def is_relevant(
+        self,
+        existing_path: Union[str, PathMapping],
+        regex_path: bool = False,
+    ):
+        """
+        Check if `save_path` or `qBt-savePath` contain the existing path.
+        :param existing_path: The existing path to look for, or a
+        `PathMapping` to check all of its existing paths
+        :type existing_path: str | PathMapping
+        :param regex_path: Existing Path is a regex pattern
+        :type regex_path: bool
+        :rtype: bool
+        """
+        return self.paths_relevant(
+            self.path_values(), existing_path, regex_path
+        )
+
+    @staticmethod
+    def paths_relevant(
+        paths: Dict[str, Optional[str]],
+        existing_path: Union[str, PathMapping],
+        regex_path: bool = False,
+    ) -> bool:
+        """
+        Check if the `save_path` or `qBt-savePath` of `paths`
+        (see `path_values`) contain the existing path.
+        """
+        mapping = as_mapping(existing_path, regex_path=regex_path)
+        return any(
+            mapping.matches(path)
+            for path in (paths.get("save_path"), paths.get("qBt-savePath"))
+            if path is not None
+        )
+
+    def set_path(
         self,
         path: str,
         key: str = "save_path",
         target_os: Optional[TargetOS] = None,
-        save_file: bool = True,
-        create_backup: bool = True,
     ):
+        """Set a save path key, converting slashes for `target_os`."""
         if key not in ["save_path", "qBt-savePath", "qBt-downloadPath"]:
             raise KeyError(
                 "When setting a save path, "
                 "key must be `save_path` or `qBt-savePath`. "
                 f"Received {key}"
             )
-        if create_backup:
-            self.save(self.backup_filename)
         if target_os is not None:
             path = convert_slashes(path, target_os)
         self.logger.debug(
             f"Setting {key}... Old: {self._data.get(key, None)},"
             f" New: {path}, Target OS: {target_os}"
         )
-        self._data[key] = path
-        if save_file:
-            self.save()
+        self._set(key, path)
 
-    def set_save_paths(
+    def set_paths(
         self,
         path: str,
         qbt_path: Optional[str] = None,
         qbt_download_path: Optional[str] = None,
         target_os: Optional[TargetOS] = None,
-        save_file: bool = True,
-        create_backup: bool = True,
+        mapping: Optional[PathMapping] = None,
     ):
+        """
+        Set the save paths, converting slashes for `target_os`.
+        `qbt_path` defaults to `path`, and `qbt_download_path` to the new
+        `qbt_path` if there is a download path.
+        :param mapping: Also map `mapped_files`, in the same pass as their
+        slashes are converted
+        :type mapping: PathMapping
+        """
         self.logger.debug(f"Set Save Paths in {self.file_path}...")
         self.logger.debug(f"path: {path}")
         self.logger.debug(f"qbt_path: {qbt_path}")
         self.logger.debug(f"qbt_download_path: {qbt_download_path}")
         self.logger.debug(f"target_os: {target_os}")
-        self.logger.debug(f"save_file: {save_file}")
-        self.logger.debug(f"create_backup: {create_backup}")
-        if create_backup:
-            self.save(self.backup_filename)
         if not path.strip():
             raise ValueError("Cannot set empty paths!")
-        self.set_save_path(
-            path,
-            key="save_path",
-            target_os=target_os,
-            save_file=False,
-            create_backup=False,
-        )
+        self.set_path(path, "save_path", target_os)
         qbt_path = path if qbt_path is None else qbt_path
         if qbt_path:
-            self.set_save_path(
-                qbt_path,
-                key="qBt-savePath",
-                target_os=target_os,
-                save_file=False,
-                create_backup=False,
-            )
+            self.set_path(qbt_path, "qBt-savePath", target_os)
         if qbt_download_path:
-            self.set_save_path(
-                qbt_download_path,
-                key="qBt-downloadPath",
-                target_os=target_os,
-                save_file=False,
-                create_backup=False,
-            )
+            self.set_path(qbt_download_path, "qBt-downloadPath", target_os)
         elif self.qbt_download_path:
-            self.set_save_path(
-                self.qbt_save_path,
-                key="qBt-downloadPath",
-                target_os=target_os,
-                save_file=False,
-                create_backup=False,
+            self.set_path(self.qbt_save_path, "qBt-downloadPath", target_os)
+        if self.mapped_files:
+            self.logger.debug("Transforming mapped_files...")
+            mapped_files = transform_paths(
+                self.mapped_files, mapping, target_os
             )
-        if self.mapped_files is not None and target_os is not None:
-            self.logger.debug("Converting Slashes for mapped_files...")
-            self._data["mapped_files"] = [
-                convert_slashes(path, target_os) for path in self.mapped_files
-            ]
+            if mapped_files is not None:
+                self._set("mapped_files", mapped_files)
+
+    def map_paths(
+        self, mapping: PathMapping, target_os: Optional[TargetOS] = None
+    ):
+        """
+        Replace the existing paths of every rule of `mapping` in one pass.
+        :param mapping: Existing paths to new paths
+        :type mapping: PathMapping
+        :param target_os: If targeting a different OS than the source
+        :type target_os: TargetOS
+        """
+        # Regex rules skip empty values, literal rules only missing ones
+        present = bool if mapping.regex else (lambda value: value is not None)
+        new_save_path = (
+            mapping.sub(self.save_path) if present(self.save_path) else None
+        )
+        new_qbt_save_path = (
+            mapping.sub(self.qbt_save_path, posix=True)
+            if present(self.qbt_save_path)
+            else None
+        )
+        new_qbt_download_path = (
+            mapping.sub(self.qbt_download_path, posix=True)
+            if present(self.qbt_download_path)
+            else None
+        )
+        if not self.save_path:
+            new_save_path = new_qbt_save_path
+        self.logger.debug(
+            f"Mapping: {mapping}, Replaced Save Path: {new_save_path}"
+        )
+        self.set_paths(
+            path=str(new_save_path),
+            qbt_path=new_qbt_save_path,
+            qbt_download_path=new_qbt_download_path,
+            target_os=target_os,
+            mapping=mapping,
+        )
+        self.logger.debug(f"Paths of {self.file_path} Replaced!")
+
+    def _set(self, key: str, value):
+        self._data[key] = value
+        self._changed_keys.add(key)
+
+    def set_values(self, values: Dict[str, Any]):
+        """
+        Set path keys as they are, without any replacing or slash conversion.
+        :param values: New values by key, keys must be in `PATH_KEYS`
+        :type values: dict
+        """
+        for key in values:
+            if key not in PATH_KEYS:
+                raise KeyError(f"{key} is not a path key")
+        for key, value in values.items():
+            self._set(key, value)
+
+    def changes(self) -> Dict[str, Any]:
+        """Values of the keys changed since the file was loaded or saved."""
+        return {key: self._data[key] for key in self._changed_keys}
+
+    def content_hash(self) -> str:
+        """SHA-256 of the file content as loaded or last saved."""
+        return hashlib.sha256(self._raw).hexdigest()
+
+    def encode_segments(self) -> List[Union[bytes, memoryview]]:
+        """
+        Encode the resume data by splicing the changed path values into
+        the bytes read at load time. Every other byte is left untouched.
+        :return: Buffer segments that concatenate to the encoded file
+        :rtype: list[bytes | memoryview]
+        """
+        return splice_dict(self._raw, self.changes())
+
+    def encode(self) -> bytes:
+        return b"".join(self.encode_segments())
+
+
+class FastResume(ResumeData):
+    logger = logging.getLogger(__name__ + ".FastResume")
+    __slots__ = ("_entry", "_raw_stat")
+
+    def __init__(
+        self,
+        file_path: Union[str, Path, os.DirEntry],
+        lazy: bool = False,
+    ):
+        """
+        :param file_path: Path to the .fastresume file. A `DirEntry` from
+        `os.scandir` saves the stat calls already made by the listing.
+        :type file_path: str | Path | os.DirEntry
+        :param lazy: Only decode the path keys, skipping over everything
+        else. The remaining keys are decoded when needed.
+        :type lazy: bool
+        """
+        path = Path(file_path)
+        self._entry = file_path if isinstance(file_path, os.DirEntry) else None
+        if self._entry is not None:
+            is_file = self._entry.is_file()
+        else:
+            is_file = path.is_file()
+        if not is_file:
+            raise FileNotFoundError(path)
+        self.logger.debug(f"Loading Fast Resume: {path}")
+        with open(path, "rb") as f:
+            # Tells `backup` whether the file on disk is still `_raw`
+            self._raw_stat = os.fstat(f.fileno())
+            raw = f.read()
+        super().__init__(path, raw, lazy)
+        self.logger.debug(f"Fast Resume ({self.file_path}) Init Complete.")
+
+    @classmethod
+    def load_candidate(
+        cls,
+        file_path: Union[str, Path, os.DirEntry],
+        existing_path: Union[str, PathMapping],
+        regex_path: bool = False,
+        lazy: bool = True,
+        prefilter: bool = True,
+    ) -> Optional["FastResume"]:
+        """
+        Load a .fastresume only if its raw bytes could contain the
+        existing path, skipping the bencode decode of irrelevant files.
+        :param file_path: Path to the .fastresume file
+        :type file_path: str | Path | os.DirEntry
+        :param existing_path: The existing path to look for,
+        or a `PathMapping`
+        :type existing_path: str | PathMapping
+        :param regex_path: Existing Path is a regex pattern
+        :type regex_path: bool
+        :param lazy: Only decode the path keys up front
+        :type lazy: bool
+        :param prefilter: Scan the raw bytes before decoding
+        :type prefilter: bool
+        :return: FastResume, or None if the file cannot be relevant
+        :rtype: FastResume | None
+        """
+        mapping = as_mapping(existing_path, regex_path=regex_path)
+        needles = mapping.needles() if prefilter else None
+        if needles is not None and not contains_any(file_path, needles):
+            cls.logger.debug(
+                f"{file_path} does not contain "
+                f"{', '.join(mapping.existing_paths)}, skipping."
+            )
+            return None
+        return cls(file_path, lazy=lazy)
+
+    def stat(self) -> os.stat_result:
+        """Stat of the file, cached from the directory listing if possible."""
+        if self._entry is not None:
+            return self._entry.stat()
+        return self.file_path.stat()
+
+    def backup(self, file_name: Union[str, Path, None] = None) -> Path:
+        """
+        Back up the file as it was loaded, byte for byte. While the file
+        on disk is unchanged it is cloned with a reflink or in-kernel copy
+        (see `methods.clone_file`), otherwise the loaded bytes are written.
+        :param file_name: Backup file, defaults to `backup_filename`
+        :type file_name: str | Path
+        :return: Path of the backup
+        :rtype: Path
+        """
+        file_name = Path(
+            self.backup_filename if file_name is None else file_name
+        )
+        self.logger.debug(f"Backing up {self.file_path} to {file_name}...")
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            stat = None
+        if stat is not None and _same_file(stat, self._raw_stat):
+            clone_file(self.file_path, file_name)
+        else:
+            with open(file_name, "wb") as f:
+                f.write(self._raw)
+        return file_name
+
+    @property
+    def backup_filename(self) -> Path:
+        return Path(
+            f'{self.file_path}.{datetime.now().strftime("%Y%m%d%H%M%S")}.bkup'
+        )
+
+    def set_save_path(
+        self,
+        path: str,
+        key: str = "save_path",
+        target_os: Optional[TargetOS] = None,
+        save_file: bool = True,
+        create_backup: bool = True,
+        durability: Durability = Durability.NONE,
+    ):
+        """See `set_path`, backing up and saving the file."""
+        self.set_path(path, key, target_os)
+        if create_backup:
+            # Backs up the loaded bytes, which are left as they are
+            self.backup()
         if save_file:
-            self.save()
+            self.save(durability=durability)
 
-    def save(self, file_name: Union[str, Path, None] = None):
+    def set_save_paths(
+        self,
+        path: str,
+        qbt_path: Optional[str] = None,
+        qbt_download_path: Optional[str] = None,
+        target_os: Optional[TargetOS] = None,
+        save_file: bool = True,
+        create_backup: bool = True,
+        durability: Durability = Durability.NONE,
+        mapping: Optional[PathMapping] = None,
+    ):
+        """See `set_paths`, backing up and saving the file."""
+        self.logger.debug(f"save_file: {save_file}")
+        self.logger.debug(f"create_backup: {create_backup}")
+        self.set_paths(path, qbt_path, qbt_download_path, target_os, mapping)
+        if create_backup:
+            self.backup()
+        if save_file:
+            self.save(durability=durability)
+
+    def save(
+        self,
+        file_name: Union[str, Path, None] = None,
+        durability: Durability = Durability.NONE,
+    ) -> int:
+        """
+        Write the resume data. The file is replaced atomically, a crash
+        leaves either the old or the new content, never a truncated file.
+        :param file_name: File to write, defaults to `file_path`
+        :type file_name: str | Path
+        :param durability: `Durability.FILE` fsyncs the file before it
+        replaces the old one. `Durability.BATCH` is left to the caller to
+        sync once all files are written, see `methods.sync_directory`.
+        :type durability: Durability
+        :return: Number of bytes written
+        :rtype: int
+        """
         if file_name is None:
             file_name = self.file_path
         self.logger.debug(f"Saving File {file_name}...")
-        bencode.write(self._data, file_name)
+        segments = self.encode_segments()
+        atomic_write(file_name, segments, fsync=durability is Durability.FILE)
+        size = sum(len(segment) for segment in segments)
+        if Path(file_name) == self.file_path:
+            self._raw = b"".join(segments)
+            self._raw_stat = os.stat(self.file_path)
+            self._changed_keys.clear()
+        return size
 
     def replace_paths(
         self,
@@ -334,6 +1798,7 @@ class FastResume(object):
         target_os: Optional[TargetOS] = None,
         save_file: bool = True,
         create_backup: bool = True,
+        durability: Durability = Durability.NONE,
     ):
         self.logger.debug(f"Replacing Paths in FastResume {self.file_path}...")
         self.logger.debug(f"Existing Path: {existing_path}")
@@ -342,64 +1807,33 @@ class FastResume(object):
         self.logger.debug(f"Target OS: {target_os}")
         self.logger.debug(f"Save File: {save_file}")
         self.logger.debug(f"Create Backup: {create_backup}")
-        if regex_path:
-            new_save_path = None
-            new_qbt_save_path = None
-            new_qbt_download_path = None
-            pattern = re.compile(existing_path)
-            if self.save_path:
-                new_save_path = pattern.sub(new_path, self.save_path)
-            if self.qbt_save_path:
-                new_qbt_save_path = pattern.sub(new_path, self.qbt_save_path)
-                if not self.save_path:
-                    new_save_path = new_qbt_save_path
-            if self.qbt_download_path:
-                new_qbt_download_path = pattern.sub(
-                    new_path, self.qbt_download_path
-                )
-            if self.mapped_files:
-                self._data["mapped_files"] = [
-                    pattern.sub(new_path, path) for path in self.mapped_files
-                ]
-        else:
-            new_save_path = (
-                self.save_path.replace(existing_path, new_path)
-                if self.save_path is not None
-                else None
-            )
-            new_qbt_save_path = (
-                self.qbt_save_path.replace(
-                    convert_slashes(existing_path, TargetOS.POSIX),
-                    convert_slashes(new_path, TargetOS.POSIX),
-                )
-                if self.qbt_save_path is not None
-                else None
-            )
-            new_qbt_download_path = (
-                self.qbt_download_path.replace(
-                    convert_slashes(existing_path, TargetOS.POSIX),
-                    convert_slashes(new_path, TargetOS.POSIX),
-                )
-                if self.qbt_download_path is not None
-                else None
-            )
-            if not self.save_path:
-                new_save_path = new_qbt_save_path
-            if self.mapped_files:
-                self._data["mapped_files"] = [
-                    path.replace(existing_path, new_path)
-                    for path in self.mapped_files
-                ]
-        self.logger.debug(
-            f"Existing Save Path: {existing_path}, New Save Path: {new_path}, "
-            f"Replaced Save Path: {new_save_path}"
-        )
-        self.set_save_paths(
-            path=str(new_save_path),
-            qbt_path=new_qbt_save_path,
-            qbt_download_path=new_qbt_download_path,
-            target_os=target_os,
-            save_file=save_file,
-            create_backup=create_backup,
+        self.apply_mapping(
+            PathMapping.from_paths(existing_path, new_path, regex_path),
+            target_os,
+            save_file,
+            create_backup,
+            durability,
         )
-        self.logger.debug(f"FastResume ({self.file_path}) Paths Replaced!")
+
+    def apply_mapping(
+        self,
+        mapping: PathMapping,
+        target_os: Optional[TargetOS] = None,
+        save_file: bool = True,
+        create_backup: bool = True,
+        durability: Durability = Durability.NONE,
+    ):
+        """
+        See `map_paths`, backing up and saving the file.
+        :param save_file: Save the file once the paths are replaced
+        :type save_file: bool
+        :param create_backup: Back up the file before changing it
+        :type create_backup: bool
+        :param durability: When the saved file is flushed to disk
+        :type durability: Durability
+        """
+        self.map_paths(mapping, target_os)
+        if create_backup:
+            self.backup()
+        if save_file:
+            self.save(durability=durability)
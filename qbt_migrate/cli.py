@@ -1,14 +1,99 @@
 import argparse
+import importlib
+import json
 import logging
+import os
 import sys
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-from qbt_migrate import QBTBatchMove, __version__, discover_bt_backup_path
-from qbt_migrate.enums import TargetOS
+from qbt_migrate import __version__
+from qbt_migrate.enums import (
+    BackupMode,
+    Compression,
+    Durability,
+    TargetOS,
+    Verification,
+)
+
+
+if TYPE_CHECKING:  # pragma: no cover
+    from qbt_migrate.backup_store import BackupStore, default_store_path
+    from qbt_migrate.cache import default_cache_path
+    from qbt_migrate.classes import QBTBatchMove
+    from qbt_migrate.fleet import FleetJob, run_fleet
+    from qbt_migrate.journal import (
+        JournalError,
+        default_journal_path,
+        read_run,
+    )
+    from qbt_migrate.mapping import (
+        PathMapping,
+        detect_target_os,
+        read_rules,
+    )
+    from qbt_migrate.methods import discover_bt_backup_path
+    from qbt_migrate.plan import MigrationPlan
+    from qbt_migrate.torrents_db import TorrentsDB, default_torrents_db_path
+    from qbt_migrate.watch import Watcher
+    from qbt_migrate.webui import WebUI, WebUIError
 
 
 logger = logging.getLogger(__name__)
 
+# Imported by `main` once the arguments are handled, so --help and
+# --version return without importing the rest of the package
+_LAZY_IMPORTS = {
+    "BackupStore": "qbt_migrate.backup_store",
+    "default_store_path": "qbt_migrate.backup_store",
+    "default_cache_path": "qbt_migrate.cache",
+    "QBTBatchMove": "qbt_migrate.classes",
+    "FleetJob": "qbt_migrate.fleet",
+    "run_fleet": "qbt_migrate.fleet",
+    "JournalError": "qbt_migrate.journal",
+    "default_journal_path": "qbt_migrate.journal",
+    "read_run": "qbt_migrate.journal",
+    "PathMapping": "qbt_migrate.mapping",
+    "detect_target_os": "qbt_migrate.mapping",
+    "read_rules": "qbt_migrate.mapping",
+    "discover_bt_backup_path": "qbt_migrate.methods",
+    "MigrationPlan": "qbt_migrate.plan",
+    "TorrentsDB": "qbt_migrate.torrents_db",
+    "default_torrents_db_path": "qbt_migrate.torrents_db",
+    "Watcher": "qbt_migrate.watch",
+    "WebUI": "qbt_migrate.webui",
+    "WebUIError": "qbt_migrate.webui",
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_IMPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def _import_lazy():
+    """Import the names in `_LAZY_IMPORTS` that aren't set already."""
+    for name in _LAZY_IMPORTS:
+        if name not in globals():
+            __getattr__(name)
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
+def positive_float(value: str) -> float:
+    number = float(value)
+    if not number > 0:
+        raise argparse.ArgumentTypeError(f"must be above 0, got {value}")
+    return number
+
 
 def parse_args(args=None):
     parser = argparse.ArgumentParser()
@@ -20,6 +105,22 @@ def parse_args(args=None):
         "--new-path",
         help="New root path to replace existing root path with.",
     )
+    parser.add_argument(
+        "-m",
+        "--map",
+        help="Map an existing path to a new path, can be given more than "
+        "once. All paths are replaced in a single pass, where several "
+        "existing paths match at the same place the longest wins.",
+        nargs=2,
+        action="append",
+        metavar=("EXISTING_PATH", "NEW_PATH"),
+        dest="mappings",
+    )
+    parser.add_argument(
+        "--map-file",
+        help="File of existing and new paths to map, one pair per line "
+        "separated by a tab. Lines starting with # are ignored.",
+    )
     parser.add_argument(
         "-r",
         "--regex",
@@ -39,8 +140,38 @@ def parse_args(args=None):
     parser.add_argument(
         "-b",
         "--bt-backup-path",
-        help="BT_backup Path Override. "
-        f"Default is {discover_bt_backup_path()}",
+        help="BT_backup Path Override. Default is "
+        "%%LOCALAPPDATA%%/qBittorrent/BT_backup on Windows, "
+        "/config/qBittorrent/BT_backup in the linuxserver.io Docker image, "
+        "and ~/.local/share/data/qBittorrent/BT_backup on Linux/Mac.",
+    )
+    parser.add_argument(
+        "--torrents-db",
+        help="Migrate qBittorrent's SQLite resume data storage instead of "
+        "the .fastresume files in BT_backup, in a single transaction. "
+        "Default is torrents.db next to BT_backup.",
+        nargs="?",
+        const="auto",
+        metavar="TORRENTS_DB",
+    )
+    parser.add_argument(
+        "--webui",
+        help="Migrate a running qBittorrent through its WebUI API at this "
+        "address, such as http://localhost:8080, instead of BT_backup. "
+        "qBittorrent moves the torrents itself. --jobs sets the number of "
+        "concurrent requests.",
+        metavar="URL",
+    )
+    parser.add_argument(
+        "--webui-username",
+        help="WebUI username. Default is no login, for instances that "
+        "bypass authentication for this host.",
+    )
+    parser.add_argument(
+        "--webui-password",
+        help="WebUI password. Default is the QBT_WEBUI_PASSWORD environment "
+        "variable.",
+        default=os.environ.get("QBT_WEBUI_PASSWORD"),
     )
     parser.add_argument(
         "-s",
@@ -50,6 +181,158 @@ def parse_args(args=None):
         action="store_true",
         default=False,
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="Maximum number of .fastresume files to update concurrently. "
+        "Default is based on the number of CPUs.",
+        type=positive_int,
+        default=None,
+    )
+    parser.add_argument(
+        "-p",
+        "--processes",
+        help="Decode and rewrite .fastresume files in a process pool "
+        "to use all CPU cores. --jobs sets the number of processes.",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "-c",
+        "--cache",
+        help="Cache .fastresume path metadata in an SQLite file next to "
+        "BT_backup, so later runs only parse files that changed.",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--cache-path",
+        help="Metadata cache file location. Implies --cache.",
+    )
+    parser.add_argument(
+        "--durability",
+        help="When updated .fastresume files are flushed to disk. "
+        "none leaves it to the OS, file fsyncs every file as it is written, "
+        "batch fsyncs the written files and BT_backup once all are written. "
+        "Files are always replaced atomically. "
+        "Default is none.",
+        choices=[durability.value for durability in Durability],
+        default=Durability.NONE.value,
+    )
+    parser.add_argument(
+        "--verify",
+        help="Check that the new save paths, and renamed files under them, "
+        "exist before updating each .fastresume file. report lists the "
+        "missing ones, refuse also leaves their files untouched. "
+        "Paths are checked as seen from this machine. Default is none.",
+        choices=[verification.value for verification in Verification],
+        default=Verification.NONE.value,
+    )
+    parser.add_argument(
+        "--backup-mode",
+        help="zip archives BT_backup, store adds a snapshot to an "
+        "incremental backup store that only stores changed files, "
+        "snapshot hardlinks (or clones) the files into a new folder "
+        "without copying data. Default is zip.",
+        choices=[mode.value for mode in BackupMode],
+        default=BackupMode.ZIP.value,
+    )
+    parser.add_argument(
+        "--backup-path",
+        help="Folder for the zip archive, snapshot or the backup store. "
+        "Default is BT_backup for zip archives and snapshots, and "
+        "qbt_migrate_backups next to BT_backup for the store.",
+    )
+    parser.add_argument(
+        "--compression",
+        help="Compression of files added to the backup store. "
+        "zstd requires the zstandard package. Default is deflate.",
+        choices=[compression.value for compression in Compression],
+        default=Compression.DEFLATE.value,
+    )
+    parser.add_argument(
+        "--restore",
+        help="Restore a snapshot from the backup store into BT_backup "
+        "and exit. Default is the latest snapshot.",
+        nargs="?",
+        const="latest",
+        metavar="SNAPSHOT",
+    )
+    parser.add_argument(
+        "--journal",
+        help="Keep a write-ahead journal of updated .fastresume files, "
+        "so an interrupted run can be finished with --resume. "
+        "The journal of an interrupted run is never started over. "
+        "Default is qbt_migrate.journal next to BT_backup.",
+        nargs="?",
+        const="auto",
+    )
+    parser.add_argument(
+        "--resume",
+        help="Finish the run recorded in the journal, skipping files it "
+        "already updated. Paths, regex and target OS are taken from the "
+        "journal unless given. No new backup is made. Implies --journal.",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--stats",
+        help="Write run statistics, counters and per-phase timings, "
+        "as JSON to a file, or to stdout if no file is given.",
+        nargs="?",
+        const="-",
+        metavar="FILE",
+    )
+    parser.add_argument(
+        "-d",
+        "--dry-run",
+        help="Show the changes that would be made without writing anything.",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--plan-out",
+        help="Write the planned changes to a plan file, "
+        "to be applied later with --apply-plan. Implies --dry-run.",
+    )
+    parser.add_argument(
+        "--apply-plan",
+        help="Apply a plan file written by --plan-out. "
+        "Files changed since the plan was made are not touched.",
+    )
+    parser.add_argument(
+        "--job-file",
+        help="Migrate every BT_backup listed in a TOML or JSON job file, "
+        "several at once, and exit. --jobs overrides the job's max_workers, "
+        "--stats writes the consolidated report.",
+    )
+
+    parser.add_argument(
+        "-w",
+        "--watch",
+        help="Keep running after the migration, and migrate .fastresume "
+        "files as qBittorrent creates or modifies them, until interrupted. "
+        "Files the migration didn't update are backed up next to them once, "
+        "before they are first updated, unless resuming.",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--debounce",
+        help="Seconds a file must go unmodified before --watch migrates it. "
+        "Default is 2.",
+        type=positive_float,
+        default=2.0,
+        metavar="SECONDS",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        help="Rescan BT_backup every so many seconds for --watch instead of "
+        "using inotify, for network filesystems. Default is inotify where "
+        "available, rescanning every 5 seconds otherwise.",
+        type=positive_float,
+        metavar="SECONDS",
+    )
 
     parser.add_argument(
         "-l",
@@ -88,17 +371,59 @@ def main():  # noqa: C901
         logger.info(f"{__version__}")
         logger.debug("Exiting")
         return
-    qbm = QBTBatchMove()
-    if args.bt_backup_path is not None:
-        qbm.bt_backup_path = Path(args.bt_backup_path.strip())
+    _import_lazy()
+    if args.restore is not None:
+        return restore(args)
+    if args.apply_plan is not None:
+        return apply_plan(args)
+    if args.job_file is not None:
+        return run_job_file(args)
+    if args.webui is not None:
+        if args.journal is not None or args.resume:
+            logger.error("🛑 Journals are not supported with --webui")
+            return 1
+        # Torrents are migrated through the WebUI, BT_backup isn't used
+        qbm = None
+    elif args.torrents_db is not None and (
+        args.journal is not None or args.resume
+    ):
+        # Its migration is a single transaction, there is nothing to resume
+        logger.error("🛑 Journals are not supported for torrents.db")
+        return 1
+    elif args.torrents_db not in (None, "auto"):
+        # The database is given, BT_backup isn't used
+        qbm = None
+    elif args.bt_backup_path is not None:
+        qbm = QBTBatchMove(Path(args.bt_backup_path.strip()))
     else:
+        # Only look for the default BT_backup when it is needed
+        qbm = QBTBatchMove()
         bt_backup_path = input(f"BT_backup Path {qbm.bt_backup_path}: ")
         if bt_backup_path.strip():
             qbm.bt_backup_path = Path(bt_backup_path.strip())
-    if args.existing_path is None:
-        args.existing_path = input("Existing Path: ")
-    if args.new_path is None:
-        args.new_path = input("New Path: ")
+    journal_path = args.journal
+    if journal_path == "auto" or (journal_path is None and args.resume):
+        journal_path = default_journal_path(qbm.bt_backup_path)
+    rules = [tuple(rule) for rule in args.mappings or []]
+    if args.map_file is not None:
+        rules += read_rules(args.map_file)
+    if args.resume:
+        try:
+            run = read_run(journal_path)
+        except (OSError, JournalError) as e:
+            logger.error(f"🛑 Unable to resume from {journal_path}: {e}")
+            return 1
+        resume_run(args, run, rules)
+    if (
+        not rules
+        or args.existing_path is not None
+        or args.new_path is not None
+    ):
+        if args.existing_path is None:
+            args.existing_path = input("Existing Path: ")
+        if args.new_path is None:
+            args.new_path = input("New Path: ")
+        rules.insert(0, (args.existing_path, args.new_path))
 
     # Get Valid Regex Input
     if args.regex is None:
@@ -144,34 +469,282 @@ def main():  # noqa: C901
 
     # Handle Target OS Auto-Detect if not specified
     if not args.target_os:
-        if "/" in args.existing_path and "\\" in args.new_path:
-            logger.info(
-                "Auto detected target OS change. "
-                "Will convert slashes to Windows."
-            )
-            args.target_os = TargetOS.WINDOWS
-        elif "\\" in args.existing_path and "/" in args.new_path:
-            logger.info(
-                "Auto detected target OS change. "
-                "Will convert slashes to Linux/Mac."
-            )
-            args.target_os = TargetOS.POSIX
-        else:
-            args.target_os = None
+        args.target_os = detect_target_os(rules)
+
+    if len(rules) == 1:
+        existing_path, new_path = rules[0]
+    else:
+        existing_path, new_path = PathMapping(rules, args.regex), None
+
+    cache_path = args.cache_path
+    if cache_path is None and args.cache and qbm is not None:
+        cache_path = default_cache_path(qbm.bt_backup_path)
 
     logger.debug(
-        f"Existing Path: {args.existing_path}, New Path: {args.new_path}, "
+        f"Existing Path: {existing_path}, New Path: {new_path}, "
         f"Target OS: {args.target_os}, Skip Bad Files: {args.skip_bad_files}"
     )
-    qbm.run(
-        args.existing_path,
-        args.new_path,
+    if args.webui is not None:
+        return migrate_webui(args, existing_path, new_path)
+    if args.torrents_db is not None:
+        return migrate_torrents_db(args, qbm, existing_path, new_path)
+    if journal_path is not None and args.processes:
+        logger.error("🛑 Journals are not supported with --processes")
+        return 1
+    verification = Verification(args.verify)
+    if verification is not Verification.NONE and args.processes:
+        logger.error("🛑 --verify is not supported with --processes")
+        return 1
+    if args.watch and (args.dry_run or args.plan_out is not None):
+        logger.error("🛑 --watch can't be combined with a dry run")
+        return 1
+    if args.dry_run or args.plan_out is not None:
+        plan = qbm.plan(
+            existing_path,
+            new_path,
+            args.regex,
+            args.target_os,
+            args.skip_bad_files,
+            cache_path=cache_path,
+            verification=verification,
+        )
+        if args.plan_out is not None:
+            plan.dump(args.plan_out)
+            logger.info(f"📝 Plan written to {args.plan_out}")
+        else:
+            for entry in plan.entries:
+                for key, value in entry.new.items():
+                    if key != "mapped_files":
+                        logger.info(
+                            f"{entry.file_name} {key}: "
+                            f"{entry.old[key]} -> {value}"
+                        )
+        return
+    watcher = None
+    if args.watch:
+        watcher = Watcher(
+            qbm.bt_backup_path,
+            existing_path,
+            new_path,
+            args.regex,
+            args.target_os,
+            # As for the run, resumed runs are covered by the first backup
+            create_backup=not args.resume,
+            max_workers=args.jobs,
+            durability=Durability(args.durability),
+            verification=verification,
+            debounce=args.debounce,
+            poll_interval=args.poll_interval,
+        )
+        # Files written during the run are picked up by the watch
+        watcher.start()
+    try:
+        summary = qbm.run(
+            existing_path,
+            new_path,
+            args.regex,
+            args.target_os,
+            # The backup of the interrupted run has the original files
+            not args.resume,
+            args.skip_bad_files,
+            max_workers=args.jobs,
+            use_processes=args.processes,
+            cache_path=cache_path,
+            durability=Durability(args.durability),
+            streaming=True,
+            journal_path=journal_path,
+            resume=args.resume,
+            verification=verification,
+            **backup_options(args),
+        )
+    except JournalError as e:
+        # Written by a run with other paths or options, corrupt, or left by
+        # an interrupted run that wasn't resumed
+        logger.error(f"🛑 Unable to use the journal {journal_path}: {e}")
+        if watcher is not None:
+            watcher.close()
+        return 1
+    code = exit_code(summary, args.stats)
+    if watcher is not None:
+        watcher.written(summary)
+        return watch(watcher) or code
+    return code
+
+
+def watch(watcher):
+    try:
+        watcher.watch()
+    except KeyboardInterrupt:
+        logger.info("👋 Stopped watching.")
+    summary = watcher.summary
+    logger.info(
+        f"{'✔️' if summary.processed else '⚠️'} Updated {summary.succeeded} "
+        f"fastresume file{'s' if summary.succeeded != 1 else ''} "
+        f"while watching."
+    )
+    return exit_code(summary)
+
+
+def resume_run(args, run, rules):
+    """
+    Take the options of the journaled run that aren't given, and its
+    paths unless any are.
+    """
+    if not rules and args.existing_path is None and args.new_path is None:
+        rules.extend(tuple(rule) for rule in run["rules"])
+    if args.regex is None:
+        args.regex = run["regex"]
+    if args.target_os is None:
+        args.target_os = (
+            TargetOS[run["target_os"]].value[0] if run["target_os"] else ""
+        )
+
+
+def migrate_torrents_db(args, qbm, existing_path, new_path):
+    if args.dry_run or args.plan_out is not None:
+        logger.error("🛑 Dry runs and plans are not supported for torrents.db")
+        return 1
+    if args.watch:
+        logger.error("🛑 --watch is not supported for torrents.db")
+        return 1
+    if args.verify != Verification.NONE.value:
+        logger.error("🛑 --verify is not supported for torrents.db")
+        return 1
+    # Options of .fastresume runs that have no meaning for the database,
+    # refused rather than silently ignored
+    unsupported = [
+        option
+        for option, used in (
+            ("--processes", args.processes),
+            ("--cache", args.cache or args.cache_path is not None),
+            ("--durability", args.durability != Durability.NONE.value),
+            ("--backup-mode", args.backup_mode != BackupMode.ZIP.value),
+            ("--backup-path", args.backup_path is not None),
+            ("--compression", args.compression != Compression.DEFLATE.value),
+        )
+        if used
+    ]
+    if unsupported:
+        logger.error(
+            f"🛑 {', '.join(unsupported)} "
+            f"{'is' if len(unsupported) == 1 else 'are'} "
+            f"not supported for torrents.db"
+        )
+        return 1
+    db_path = args.torrents_db
+    if db_path == "auto":
+        db_path = default_torrents_db_path(qbm.bt_backup_path)
+    summary = TorrentsDB(db_path).migrate(
+        existing_path,
+        new_path,
         args.regex,
         args.target_os,
-        True,
-        args.skip_bad_files,
+        skip_bad_files=args.skip_bad_files,
+    )
+    return exit_code(summary, args.stats)
+
+
+def migrate_webui(args, existing_path, new_path):
+    if args.dry_run or args.plan_out is not None:
+        logger.error("🛑 Dry runs and plans are not supported with --webui")
+        return 1
+    if args.torrents_db is not None or args.watch:
+        logger.error(
+            "🛑 --torrents-db and --watch are not supported with --webui"
+        )
+        return 1
+    if args.verify != Verification.NONE.value:
+        # qBittorrent creates missing save paths itself
+        logger.error("🛑 --verify is not supported with --webui")
+        return 1
+    try:
+        with WebUI(
+            args.webui,
+            args.webui_username,
+            args.webui_password,
+            max_workers=args.jobs or 4,
+        ) as webui:
+            summary = webui.migrate(
+                existing_path, new_path, args.regex, args.target_os
+            )
+    except (OSError, WebUIError) as e:
+        logger.error(f"🛑 Unable to migrate through {args.webui}: {e}")
+        return 1
+    return exit_code(summary, args.stats)
+
+
+def apply_plan(args):
+    plan = MigrationPlan.load(args.apply_plan)
+    bt_backup_path = args.bt_backup_path
+    if bt_backup_path is None:
+        bt_backup_path = plan.bt_backup_path
+    qbm = QBTBatchMove(bt_backup_path.strip())
+    summary = qbm.apply_plan(
+        plan,
+        max_workers=args.jobs,
+        durability=Durability(args.durability),
+        **backup_options(args),
     )
+    return exit_code(summary, args.stats)
+
+
+def run_job_file(args):
+    job = FleetJob.load(args.job_file)
+    if args.jobs is not None:
+        job.max_workers = args.jobs
+    report = run_fleet(job)
+    if args.stats is not None:
+        write_json(report.to_dict(), args.stats)
+    if report.failed:
+        return 1
+
+
+def restore(args):
+    if args.bt_backup_path is not None:
+        bt_backup_path = Path(args.bt_backup_path.strip())
+    else:
+        bt_backup_path = discover_bt_backup_path()
+    store_path = args.backup_path
+    if store_path is None:
+        store_path = default_store_path(bt_backup_path)
+    BackupStore(store_path).restore(
+        bt_backup_path,
+        None if args.restore == "latest" else args.restore,
+        max_workers=args.jobs,
+    )
+
+
+def backup_options(args):
+    return {
+        "backup_mode": BackupMode(args.backup_mode),
+        "backup_path": args.backup_path,
+        "compression": Compression(args.compression),
+    }
+
+
+def write_json(data, file_path):
+    data = json.dumps(data, indent=2)
+    if file_path == "-":
+        print(data)
+        return
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(data)
+
+
+def write_stats(summary, stats_path):
+    write_json(summary.stats.to_dict(), stats_path)
+
+
+def exit_code(summary, stats_path=None):
+    if stats_path is not None:
+        write_stats(summary, stats_path)
+    if summary.failed:
+        logger.error(
+            f"🛑 {summary.failed} of {summary.processed} "
+            f"fastresume files failed to update!"
+        )
+        return 1
 
 
 if __name__ == "__main__":
-    main()  # pragma: no cover
+    sys.exit(main())  # pragma: no cover
@@ -4,3 +4,27 @@ from enum import Enum
 class TargetOS(Enum):
     WINDOWS = ["windows"]
     POSIX = ["linux", "mac", "unix"]
+
+
+class Durability(Enum):
+    NONE = "none"  # Leave flushing to the OS
+    FILE = "file"  # fsync every file as it is written
+    BATCH = "batch"  # Sync once at the end of a run
+
+
+class BackupMode(Enum):
+    ZIP = "zip"  # Zip archive of BT_backup, in BT_backup
+    STORE = "store"  # Incremental, deduplicated backup store
+    SNAPSHOT = "snapshot"  # Folder of hardlinks or clones, in BT_backup
+
+
+class Compression(Enum):
+    STORED = "stored"
+    DEFLATE = "deflate"
+    ZSTD = "zstd"  # Requires the zstandard package
+
+
+class Verification(Enum):
+    NONE = "none"  # Don't check the new paths
+    REPORT = "report"  # Report torrents whose new paths don't exist
+    REFUSE = "refuse"  # Don't update torrents whose new paths don't exist
@@ -0,0 +1,401 @@
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from qbt_migrate.cache import default_cache_path
+from qbt_migrate.classes import QBTBatchMove, RunStats, RunSummary
+from qbt_migrate.enums import (
+    BackupMode,
+    Compression,
+    Durability,
+    TargetOS,
+    Verification,
+)
+from qbt_migrate.journal import default_journal_path
+from qbt_migrate.mapping import PathMapping, detect_target_os, read_rules
+from qbt_migrate.torrents_db import TorrentsDB, default_torrents_db_path
+
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+
+logger = logging.getLogger(__name__)
+
+# Keys of an instance in a job file, `defaults` may set any but the first
+INSTANCE_KEYS = {
+    "bt_backup_path",
+    "name",
+    "existing_path",
+    "new_path",
+    "mappings",
+    "map_file",
+    "regex",
+    "target_os",
+    "skip_bad_files",
+    "create_backup",
+    "backup_mode",
+    "backup_path",
+    "compression",
+    "durability",
+    "verify",
+    "cache",
+    "journal",
+    "torrents_db",
+}
+
+# Paths an instance writes to, that no two instances may share
+_OWN_PATHS = {
+    "bt_backup_path": "BT_backup path",
+    "backup_path": "backup_path",
+    "cache_path": "cache",
+    "journal_path": "journal",
+    "torrents_db": "torrents_db",
+}
+
+
+def _target_os(value: Optional[str]) -> Optional[TargetOS]:
+    if not value:
+        return None
+    for target_os in TargetOS:
+        if value.lower() in target_os.value:
+            return target_os
+    raise ValueError(f"Unknown target OS {value}, use Windows, Linux or Mac")
+
+
+def _optional_path(
+    value: Union[bool, str, None], bt_backup_path: Path, default
+) -> Optional[Path]:
+    """`true` for the default location next to BT_backup, or a path."""
+    if value is None or value is False:
+        return None
+    if value is True:
+        return default(bt_backup_path)
+    return Path(value)
+
+
+def _folder_name(name: str) -> str:
+    """An instance name, which may be a path, as a single folder name."""
+    return re.sub(r"[^\w.-]+", "_", name).strip("._") or "instance"
+
+
+def _positive_int(value: Any, name: str) -> Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise ValueError(f"{name} must be a positive integer, not {value!r}")
+    return value
+
+
+@dataclass
+class Instance:
+    """A BT_backup directory of a fleet job and how to migrate it."""
+
+    name: str
+    bt_backup_path: Path
+    rules: List[Tuple[str, str]]
+    regex: bool = False
+    target_os: Optional[TargetOS] = None
+    skip_bad_files: bool = False
+    create_backup: bool = True
+    backup_mode: BackupMode = BackupMode.ZIP
+    backup_path: Optional[Path] = None
+    compression: Compression = Compression.DEFLATE
+    durability: Durability = Durability.NONE
+    verification: Verification = Verification.NONE
+    cache_path: Optional[Path] = None
+    journal_path: Optional[Path] = None
+    torrents_db: Optional[Path] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Instance":
+        unknown = set(data) - INSTANCE_KEYS
+        if unknown:
+            raise ValueError(f"Unknown instance keys {', '.join(unknown)}")
+        if not data.get("bt_backup_path"):
+            raise ValueError("Every instance needs a bt_backup_path")
+        bt_backup_path = Path(data["bt_backup_path"])
+        name = data.get("name") or str(bt_backup_path)
+        rules = [tuple(rule) for rule in data.get("mappings", [])]
+        if data.get("map_file"):
+            rules += read_rules(data["map_file"])
+        if data.get("existing_path") is not None:
+            rules.insert(0, (data["existing_path"], data.get("new_path", "")))
+        if not rules or any(len(rule) != 2 for rule in rules):
+            raise ValueError(
+                f"{name}: needs existing_path and new_path, or mappings of "
+                f"existing and new path pairs"
+            )
+        target_os = _target_os(data.get("target_os")) or detect_target_os(
+            rules
+        )
+        if isinstance(data.get("backup_path"), bool):
+            raise ValueError(f"{name}: backup_path must be a path")
+        instance = cls(
+            name=name,
+            bt_backup_path=bt_backup_path,
+            rules=rules,
+            regex=bool(data.get("regex", False)),
+            target_os=target_os,
+            skip_bad_files=bool(data.get("skip_bad_files", False)),
+            create_backup=bool(data.get("create_backup", True)),
+            backup_mode=BackupMode(data.get("backup_mode", "zip")),
+            backup_path=_optional_path(
+                data.get("backup_path"), bt_backup_path, None
+            ),
+            compression=Compression(data.get("compression", "deflate")),
+            durability=Durability(data.get("durability", "none")),
+            verification=Verification(data.get("verify", "none")),
+            cache_path=_optional_path(
+                data.get("cache"), bt_backup_path, default_cache_path
+            ),
+            journal_path=_optional_path(
+                data.get("journal"), bt_backup_path, default_journal_path
+            ),
+            torrents_db=_optional_path(
+                data.get("torrents_db"),
+                bt_backup_path,
+                default_torrents_db_path,
+            ),
+        )
+        if instance.torrents_db is not None and instance.journal_path:
+            raise ValueError(f"{name}: journals are not used for torrents.db")
+        if (
+            instance.torrents_db is not None
+            and instance.verification is not Verification.NONE
+        ):
+            raise ValueError(f"{name}: torrents.db paths can't be verified")
+        return instance
+
+    @property
+    def mapping(self) -> PathMapping:
+        return PathMapping(self.rules, self.regex)
+
+
+@dataclass
+class FleetJob:
+    """
+    Many BT_backup directories, such as those of every qBittorrent container
+    on a host, migrated in one go.
+    `max_workers` is a budget shared by all instances: each of the
+    `max_instances` instances migrated at once gets an equal share of it,
+    so the host never has more than `max_workers` file operations in
+    flight, however many instances there are.
+    """
+
+    instances: List[Instance]
+    max_workers: Optional[int] = None
+    max_instances: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FleetJob":
+        defaults = data.get("defaults", {})
+        if "bt_backup_path" in defaults:
+            raise ValueError("defaults can't set a bt_backup_path")
+        instances = []
+        for number, instance_data in enumerate(data.get("instances", []), 1):
+            try:
+                instance = Instance.from_dict({**defaults, **instance_data})
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"Instance {number}: {e}") from e
+            if (
+                instance.backup_path is not None
+                and "backup_path" not in instance_data
+            ):
+                # Instances backed up at the same time would otherwise get
+                # the same backup names
+                instance.backup_path /= _folder_name(instance.name)
+            instances.append(instance)
+        if not instances:
+            raise ValueError("A fleet job needs at least one instance")
+        for attribute, label in _OWN_PATHS.items():
+            paths = [
+                getattr(instance, attribute)
+                for instance in instances
+                if getattr(instance, attribute) is not None
+            ]
+            if len(set(paths)) != len(paths):
+                raise ValueError(f"A {label} is listed more than once")
+        return cls(
+            instances=instances,
+            max_workers=_positive_int(data.get("max_workers"), "max_workers"),
+            max_instances=_positive_int(
+                data.get("max_instances"), "max_instances"
+            ),
+        )
+
+    @classmethod
+    def load(cls, file_path: Union[str, Path]) -> "FleetJob":
+        """
+        Load a job file, TOML if it ends in .toml, JSON otherwise.
+        Reading TOML on Python < 3.11 requires the tomli package.
+        """
+        file_path = Path(file_path)
+        logger.debug(f"Loading fleet job {file_path}...")
+        if file_path.suffix.lower() == ".toml":
+            if tomllib is None:
+                raise ValueError("TOML job files require the tomli package")
+            with open(file_path, "rb") as f:
+                return cls.from_dict(tomllib.load(f))
+        with open(file_path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    def budget(self) -> Tuple[int, int]:
+        """Instances migrated at once, and the workers of each of them."""
+        max_workers = self.max_workers or min(32, (os.cpu_count() or 1) + 4)
+        max_instances = min(
+            self.max_instances or max_workers, len(self.instances)
+        )
+        max_instances = max(1, min(max_instances, max_workers))
+        return max_instances, max(1, max_workers // max_instances)
+
+
+@dataclass
+class InstanceReport:
+    name: str
+    bt_backup_path: Path
+    summary: Optional[RunSummary] = None
+    error: Optional[BaseException] = None
+    seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and not self.summary.failed
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "name": self.name,
+            "bt_backup_path": str(self.bt_backup_path),
+            "ok": self.ok,
+            "seconds": self.seconds,
+            "error": None if self.error is None else str(self.error),
+        }
+        if self.summary is not None:
+            data["processed"] = self.summary.processed
+            data["failed"] = self.summary.failed
+            data["file_errors"] = {
+                str(file_path): str(error)
+                for file_path, error in self.summary.errors.items()
+            }
+            data["stats"] = self.summary.stats.to_dict()
+        return data
+
+
+@dataclass
+class FleetReport:
+    """Consolidated report of a fleet job."""
+
+    instances: List[InstanceReport] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def failed(self) -> List[InstanceReport]:
+        return [report for report in self.instances if not report.ok]
+
+    def totals(self) -> Dict[str, int]:
+        """Counters of `RunStats` summed over every instance."""
+        totals = {
+            counter.name: 0
+            for counter in fields(RunStats)
+            if counter.type is int
+        }
+        for report in self.instances:
+            if report.summary is None:
+                continue
+            for counter in totals:
+                totals[counter] += getattr(report.summary.stats, counter)
+        return totals
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "instances": len(self.instances),
+            "succeeded": len(self.instances) - len(self.failed),
+            "failed": len(self.failed),
+            "seconds": self.seconds,
+            "totals": self.totals(),
+            "results": [report.to_dict() for report in self.instances],
+        }
+
+
+def _migrate_instance(instance: Instance, max_workers: int) -> RunSummary:
+    if instance.torrents_db is not None:
+        return TorrentsDB(instance.torrents_db).migrate(
+            instance.mapping,
+            None,
+            target_os=instance.target_os,
+            create_backup=instance.create_backup,
+            skip_bad_files=instance.skip_bad_files,
+        )
+    return QBTBatchMove(instance.bt_backup_path).run(
+        instance.mapping,
+        None,
+        target_os=instance.target_os,
+        create_backup=instance.create_backup,
+        skip_bad_files=instance.skip_bad_files,
+        max_workers=max_workers,
+        cache_path=instance.cache_path,
+        durability=instance.durability,
+        backup_mode=instance.backup_mode,
+        backup_path=instance.backup_path,
+        compression=instance.compression,
+        streaming=True,
+        journal_path=instance.journal_path,
+        verification=instance.verification,
+    )
+
+
+def _run_instance(instance: Instance, max_workers: int) -> InstanceReport:
+    logger.info(f"🚚 Migrating {instance.name} ({instance.bt_backup_path})")
+    report = InstanceReport(instance.name, instance.bt_backup_path)
+    start = time.perf_counter()
+    try:
+        report.summary = _migrate_instance(instance, max_workers)
+    except Exception as e:
+        # One broken instance doesn't stop the rest of the fleet
+        logger.error(f"🛑 Failed to migrate {instance.name}: {e}")
+        report.error = e
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def run_fleet(job: FleetJob) -> FleetReport:
+    """
+    Migrate every instance of a fleet job, `FleetJob.budget` at a time.
+    Failures are reported per instance rather than raised.
+    :param job: Fleet job
+    :type job: FleetJob
+    :return: Reports of every instance, in job order
+    :rtype: FleetReport
+    """
+    max_instances, max_workers = job.budget()
+    logger.info(
+        f"🚢 Migrating {len(job.instances)} instances, {max_instances} at "
+        f"a time with {max_workers} workers each..."
+    )
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_instances) as executor:
+        reports = list(
+            executor.map(
+                lambda instance: _run_instance(instance, max_workers),
+                job.instances,
+            )
+        )
+    report = FleetReport(reports, time.perf_counter() - start)
+    for failed in report.failed:
+        logger.error(f"🛑 {failed.name} did not migrate cleanly")
+    logger.info(
+        f"{'✔️' if not report.failed else '⚠️'} Migrated "
+        f"{len(reports) - len(report.failed)} of {len(reports)} instances!"
+    )
+    return report
@@ -0,0 +1,226 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Set, Tuple, Union
+
+from qbt_migrate.enums import TargetOS
+from qbt_migrate.mapping import PathMapping
+
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_VERSION = 1
+
+
+class JournalError(ValueError):
+    """A journal can't be read."""
+
+
+class JournalMismatchError(JournalError):
+    """A journal was written by a run with different paths or options."""
+
+
+def default_journal_path(bt_backup_path: Union[str, Path]) -> Path:
+    """Journal file location next to the BT_backup directory."""
+    return Path(bt_backup_path).parent / "qbt_migrate.journal"
+
+
+def run_arguments(
+    bt_backup_path: Union[str, Path],
+    mapping: PathMapping,
+    target_os: Optional[TargetOS],
+) -> Dict[str, Any]:
+    """Arguments of a run, as recorded in the header of its journal."""
+    return {
+        "bt_backup_path": str(bt_backup_path),
+        "rules": [list(rule) for rule in mapping.rules],
+        "regex": mapping.regex,
+        "target_os": None if target_os is None else target_os.name,
+    }
+
+
+def read_run(journal_path: Union[str, Path]) -> Dict[str, Any]:
+    """Read the run arguments recorded in a journal, see `run_arguments`."""
+    with open(journal_path, "r", encoding="utf-8") as f:
+        line = f.readline()
+    try:
+        header = json.loads(line)
+        version = header.get("version")
+    except (ValueError, AttributeError) as e:
+        raise JournalError(f"{journal_path} is not a journal") from e
+    if version != JOURNAL_VERSION:
+        raise JournalError(f"Unsupported journal version {version}")
+    return header["run"]
+
+
+class Journal(object):
+    """
+    Write-ahead journal of a run, one JSON record per line.
+    The SHA-256 of a .fastresume file is appended before the file is
+    replaced, and its name once the new file is in place. Files are
+    replaced atomically, so after an interruption every file with a record
+    is either untouched, still with the recorded hash, or fully rewritten.
+    A resumed run skips the rewritten files rather than map them twice.
+    """
+
+    logger = logging.getLogger(__name__ + ".Journal")
+
+    def __init__(
+        self,
+        journal_path: Union[str, Path],
+        run: Dict[str, Any],
+        resume: bool = False,
+        sync: bool = False,
+    ):
+        """
+        :param journal_path: Journal file
+        :type journal_path: str | Path
+        :param run: Arguments of the run, see `run_arguments`
+        :type run: dict
+        :param resume: Continue an existing journal written with the same
+        `run`, rather than start a new one
+        :type resume: bool
+        :param sync: fsync every record, for runs that fsync every file
+        :type sync: bool
+        """
+        self.journal_path = Path(journal_path)
+        self.run = run
+        self.sync = sync
+        # Names of files already rewritten
+        self.completed = set()
+        self._lock = threading.Lock()
+        if not resume:
+            self._check_finished()
+            self.logger.debug(f"Starting journal {self.journal_path}...")
+            self._file = open(self.journal_path, "w", encoding="utf-8")
+            self._append(
+                {
+                    "version": JOURNAL_VERSION,
+                    "created": datetime.now().isoformat(timespec="seconds"),
+                    "run": run,
+                }
+            )
+            return
+        self.logger.debug(f"Resuming journal {self.journal_path}...")
+        pending = self._load()
+        self._file = open(self.journal_path, "a", encoding="utf-8")
+        self._recover(pending)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _load(self) -> Dict[str, str]:
+        """Read the records of the journal, return the unfinished ones."""
+        if read_run(self.journal_path) != self.run:
+            raise JournalMismatchError(
+                f"{self.journal_path} was written by a run with different "
+                f"arguments"
+            )
+        with open(self.journal_path, "rb") as f:
+            data = f.read()
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            # The last record was torn by the interruption. Either its file
+            # was not replaced yet, or `_recover` finds it was.
+            self.logger.debug(f"Dropping torn record {data[complete:]!r}")
+            os.truncate(self.journal_path, complete)
+        pending, self.completed = self._read_records(data[:complete])
+        return pending
+
+    def _check_finished(self):
+        """
+        Refuse to start over a journal with files that were being written
+        when its run was interrupted, it is the only record of whether they
+        were replaced.
+        """
+        try:
+            with open(self.journal_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        if not data:
+            return
+        read_run(self.journal_path)
+        pending, _ = self._read_records(data[: data.rfind(b"\n") + 1])
+        if pending:
+            raise JournalError(
+                f"{self.journal_path} is the journal of an interrupted run "
+                f"with {len(pending)} files being updated, resume the run "
+                f"or remove the journal"
+            )
+
+    def _read_records(self, data: bytes) -> Tuple[Dict[str, str], Set[str]]:
+        """
+        Read complete records, return the files that have no done record
+        yet, with their recorded hash, and the names of those that do.
+        """
+        pending = {}
+        completed = set()
+        lines = data.splitlines()
+        for number, line in enumerate(lines[1:], 2):
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise JournalError(
+                    f"{self.journal_path} line {number} is corrupt"
+                ) from e
+            if "done" in record:
+                pending.pop(record["done"], None)
+                completed.add(record["done"])
+            else:
+                pending[record["intent"]] = record["sha256"]
+        return pending, completed
+
+    def _recover(self, pending: Dict[str, str]):
+        """
+        Work out whether files that were being written when the run was
+        interrupted were replaced. Files whose content is no longer what it
+        was are recorded as done.
+        """
+        bt_backup_path = Path(self.run["bt_backup_path"])
+        for name, sha256 in pending.items():
+            try:
+                with open(bt_backup_path / name, "rb") as f:
+                    current = hashlib.sha256(f.read()).hexdigest()
+            except FileNotFoundError:
+                current = None
+            if current != sha256:
+                self.logger.debug(f"{name} was replaced before interruption")
+                self.done(name)
+
+    def _append(self, record: Dict[str, Any]):
+        with self._lock:
+            self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+            # Reaches the OS right away, so it survives the process dying
+            self._file.flush()
+            if self.sync:
+                os.fsync(self._file.fileno())
+
+    def intent(self, name: str, sha256: str):
+        """
+        Record that a file is about to be replaced.
+        :param name: File name within BT_backup
+        :type name: str
+        :param sha256: SHA-256 of the current content of the file
+        :type sha256: str
+        """
+        self._append({"intent": name, "sha256": sha256})
+
+    def done(self, name: str):
+        """Record that a file has been replaced."""
+        self._append({"done": name})
+        self.completed.add(name)
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
@@ -0,0 +1,274 @@
+import logging
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from qbt_migrate.enums import TargetOS
+from qbt_migrate.methods import convert_slashes, prefilter_needles
+
+
+logger = logging.getLogger(__name__)
+
+# Joins paths for bulk transforms, it can't appear in a path on any OS
+_SEPARATOR = "\0"
+
+
+def _combined_pattern(
+    rules: Iterable[Tuple[str, str]],
+) -> Tuple["re.Pattern", Dict[str, str]]:
+    """
+    One alternation of every existing path, longest first, so that where
+    several existing paths match at the same position the longest wins.
+    """
+    lookup = {}
+    for existing_path, new_path in rules:
+        if lookup.setdefault(existing_path, new_path) != new_path:
+            raise ValueError(
+                f"Conflicting mappings for {existing_path}: "
+                f"{lookup[existing_path]} and {new_path}"
+            )
+    pattern = re.compile(
+        "|".join(
+            re.escape(existing_path)
+            for existing_path in sorted(lookup, key=len, reverse=True)
+        )
+    )
+    return pattern, lookup
+
+
+class PathMapping(object):
+    """
+    Rules mapping existing paths to new paths, applied to every path in a
+    single pass no matter how many rules there are.
+
+    Literal rules are matched at once by a combined pattern. Every
+    occurrence of an existing path is replaced, left to right, where more
+    than one existing path matches at the same position the longest wins.
+    Replaced text is not matched again, so rules never chain.
+
+    Regex rules are tried in order and only the first rule whose pattern
+    matches a path is applied to it.
+    """
+
+    def __init__(self, rules: Iterable[Tuple[str, str]], regex: bool = False):
+        """
+        :param rules: Pairs of existing path and the new path to replace
+        it with
+        :type rules: Iterable[tuple[str, str]]
+        :param regex: Existing and New paths are regex patterns
+        :type regex: bool
+        """
+        self.rules = [(str(old), str(new)) for old, new in rules]
+        if not self.rules:
+            raise ValueError("A path mapping needs at least one rule")
+        self.regex = regex
+        if regex:
+            self._patterns = [
+                (re.compile(existing_path), new_path)
+                for existing_path, new_path in self.rules
+            ]
+            return
+        self._pattern, self._lookup = _combined_pattern(self.rules)
+        # qBt-savePath and qBt-downloadPath always use forward slashes
+        self._posix_pattern, self._posix_lookup = _combined_pattern(
+            (
+                convert_slashes(existing_path, TargetOS.POSIX),
+                convert_slashes(new_path, TargetOS.POSIX),
+            )
+            for existing_path, new_path in self.rules
+        )
+
+    @classmethod
+    def from_paths(
+        cls, existing_path: str, new_path: str, regex_path: bool = False
+    ) -> "PathMapping":
+        """Mapping of a single existing path."""
+        return cls([(existing_path, new_path)], regex_path)
+
+    @classmethod
+    def load(
+        cls, file_path: Union[str, Path], regex: bool = False
+    ) -> "PathMapping":
+        """
+        Load rules from a mapping file. Every line is an existing path and
+        the new path, separated by a tab. Empty lines and lines starting
+        with `#` are ignored.
+        :param file_path: Mapping file
+        :type file_path: str | Path
+        :param regex: Existing and New paths are regex patterns
+        :type regex: bool
+        :rtype: PathMapping
+        """
+        return cls(read_rules(file_path), regex)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def __str__(self) -> str:
+        return ", ".join(
+            f"{existing_path} -> {new_path}"
+            for existing_path, new_path in self.rules
+        )
+
+    def __repr__(self) -> str:
+        return f"PathMapping({self.rules!r}, regex={self.regex})"
+
+    @property
+    def existing_paths(self) -> List[str]:
+        return [existing_path for existing_path, _ in self.rules]
+
+    def sub(self, path: str, posix: bool = False) -> str:
+        """
+        Replace the existing paths in `path`.
+        :param path: Path to map
+        :type path: str
+        :param posix: `path` uses forward slashes, match the existing paths
+        with their slashes converted too. Ignored for regex rules.
+        :type posix: bool
+        :return: Mapped path, `path` itself if no rule matches
+        :rtype: str
+        """
+        if self.regex:
+            for pattern, new_path in self._patterns:
+                if pattern.search(path):
+                    return pattern.sub(new_path, path)
+            return path
+        pattern, lookup = (
+            (self._posix_pattern, self._posix_lookup)
+            if posix
+            else (self._pattern, self._lookup)
+        )
+        if len(lookup) == 1:
+            ((existing_path, new_path),) = lookup.items()
+            return path.replace(existing_path, new_path)
+        return pattern.sub(lambda match: lookup[match.group()], path)
+
+    def matches(self, path: str) -> bool:
+        """Check if any rule matches `path`."""
+        if not self.regex:
+            return self._pattern.search(path) is not None
+        return any(
+            existing_path in path or pattern.search(path)
+            for (existing_path, _), (pattern, _) in zip(
+                self.rules, self._patterns
+            )
+        )
+
+    def needles(self) -> Optional[Tuple[bytes, ...]]:
+        """
+        Byte strings of which at least one must appear in the raw contents
+        of a .fastresume file for any rule to match it, see
+        `methods.prefilter_needles`. `None` if no prefilter can be derived.
+        """
+        needles = set()
+        for existing_path in self.existing_paths:
+            rule_needles = prefilter_needles(existing_path, self.regex)
+            if rule_needles is None:
+                return None
+            needles.update(rule_needles)
+        return tuple(needles)
+
+
+def as_mapping(
+    existing_path: Union[str, PathMapping],
+    new_path: Optional[str] = None,
+    regex_path: bool = False,
+) -> PathMapping:
+    """
+    `existing_path` if it is a `PathMapping` already, otherwise the
+    mapping of `existing_path` to `new_path`.
+    """
+    if isinstance(existing_path, PathMapping):
+        return existing_path
+    return PathMapping.from_paths(
+        existing_path, "" if new_path is None else new_path, regex_path
+    )
+
+
+def transform_paths(
+    paths: List[str],
+    mapping: Optional[PathMapping] = None,
+    target_os: Optional[TargetOS] = None,
+) -> Optional[List[str]]:
+    """
+    Map and convert the slashes of a whole list of paths, such as the
+    `mapped_files` of a torrent with thousands of files, at once.
+    Literal rules and the slash conversion each run once over all the
+    paths joined together, rather than once per path. Regex rules can
+    anchor to the start or end of a path, so they are still applied path
+    by path.
+    :param paths: Paths to transform
+    :type paths: list[str]
+    :param mapping: Rules to apply, if any
+    :type mapping: PathMapping
+    :param target_os: Convert slashes for this OS, if given
+    :type target_os: TargetOS
+    :return: Transformed paths, or `None` if no path changes
+    :rtype: list[str] | None
+    """
+    if not paths or (mapping is None and target_os is None):
+        return None
+    changed = False
+    if mapping is not None and not _joinable(mapping):
+        mapped = [mapping.sub(path) for path in paths]
+        changed = mapped != paths
+        paths, mapping = mapped, None
+    # Fails on entries that aren't text, as `sub` would
+    joined = _SEPARATOR.join(paths)
+    transformed = joined
+    if mapping is not None:
+        transformed = mapping.sub(transformed)
+    if target_os is TargetOS.WINDOWS:
+        transformed = transformed.replace("/", "\\")
+    elif target_os is not None:
+        transformed = transformed.replace("\\", "/")
+    if transformed == joined:
+        return paths if changed else None
+    return transformed.split(_SEPARATOR)
+
+
+def _joinable(mapping: PathMapping) -> bool:
+    """Whether `mapping` can be applied to paths joined together."""
+    return not mapping.regex and not any(
+        _SEPARATOR in existing_path or _SEPARATOR in new_path
+        for existing_path, new_path in mapping.rules
+    )
+
+
+def detect_target_os(
+    rules: Iterable[Tuple[str, str]],
+) -> Optional[TargetOS]:
+    """Target OS implied by the slashes of the first rule that changes them."""
+    for existing_path, new_path in rules:
+        if "/" in existing_path and "\\" in new_path:
+            logger.info(
+                "Auto detected target OS change. "
+                "Will convert slashes to Windows."
+            )
+            return TargetOS.WINDOWS
+        if "\\" in existing_path and "/" in new_path:
+            logger.info(
+                "Auto detected target OS change. "
+                "Will convert slashes to Linux/Mac."
+            )
+            return TargetOS.POSIX
+    return None
+
+
+def read_rules(file_path: Union[str, Path]) -> List[Tuple[str, str]]:
+    """Read the rules of a tab separated mapping file."""
+    rules = []
+    with open(file_path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.rstrip("\r\n")
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            parts = line.split("\t")
+            if len(parts) != 2:
+                raise ValueError(
+                    f"{file_path} line {number}: expected an existing path "
+                    f"and a new path separated by a tab"
+                )
+            rules.append((parts[0], parts[1]))
+    logger.debug(f"Read {len(rules)} path mapping rules from {file_path}")
+    return rules
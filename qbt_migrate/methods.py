@@ -1,31 +1,225 @@
 import logging
+import mmap
 import os
+import re
+import shutil
+import stat
 import sys
+import tempfile
 import zipfile
+from concurrent.futures import FIRST_COMPLETED, Executor, as_completed, wait
 from pathlib import Path
-from typing import Union
+from typing import Callable, Iterable, List, Optional, Tuple, Union
 
 from qbt_migrate.enums import TargetOS
 
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
 logger = logging.getLogger(__name__)
+BT_BACKUP_SUFFIXES = (".fastresume", ".torrent")
+# ioctl to share the extents of a file, Btrfs/XFS/bcachefs reflinks
+FICLONE = 0x40049409
+
+
+def scan_bt_backup(folder_path: Union[str, Path]) -> List[os.DirEntry]:
+    """
+    List the .fastresume and .torrent files at the top level of BT_backup
+    in a single `os.scandir` pass. The entries carry their file type (and
+    stat, once fetched), so the backup and discovery phases can share the
+    listing without going back to the filesystem.
+    """
+    with os.scandir(folder_path) as it:
+        return [
+            entry
+            for entry in it
+            if entry.name.endswith(BT_BACKUP_SUFFIXES) and entry.is_file()
+        ]
 
 
 def backup_folder(
     folder_path: Union[str, Path],
     archive_path: Union[str, Path],
     include_torrents: bool = True,
+    entries: Optional[Iterable[os.DirEntry]] = None,
 ):
     logger.info(f"🗄️ Creating Archive {archive_path} ...")
-    folder_path = Path(folder_path)
+    if entries is None:
+        entries = scan_bt_backup(folder_path)
     archive_path = Path(archive_path)
     with zipfile.ZipFile(archive_path, "w") as archive:
-        for file in folder_path.iterdir():
+        for file in entries:
             if file.name.endswith(".fastresume") or (
                 include_torrents and file.name.endswith(".torrent")
             ):
-                logger.debug(f"Archiving {file} into {archive_path}...")
-                archive.write(file)
+                logger.debug(f"Archiving {file.path} into {archive_path}...")
+                archive.write(file.path)
+    logger.info("✔️ Done!")
+
+
+def _keep_owner(fd: int, temp_path: str, original: os.stat_result):
+    """
+    Give the temporary file the owner of the file it replaces, so running
+    as root, such as in Docker, doesn't leave files qBittorrent can't
+    update. Left to the filesystem where changing owners isn't allowed.
+    """
+    current = os.fstat(fd)
+    if not hasattr(os, "chown") or (current.st_uid, current.st_gid) == (
+        original.st_uid,
+        original.st_gid,
+    ):
+        return
+    try:
+        os.chown(temp_path, original.st_uid, original.st_gid)
+    except PermissionError:
+        logger.debug(
+            f"Unable to keep the owner of {temp_path}, "
+            f"{original.st_uid}:{original.st_gid}"
+        )
+
+
+def atomic_write(
+    file_path: Union[str, Path],
+    segments: Iterable[Union[bytes, memoryview]],
+    fsync: bool = False,
+):
+    """
+    Write a file through a temporary file in the same directory that is
+    then renamed over it, so the file is never left partially written.
+    :param file_path: File to write
+    :type file_path: str | Path
+    :param segments: Buffers to write, in order
+    :type segments: Iterable[bytes | memoryview]
+    :param fsync: fsync the file before renaming it into place
+    :type fsync: bool
+    """
+    file_path = Path(file_path)
+    fd, temp_path = tempfile.mkstemp(
+        prefix=f".{file_path.name}.", suffix=".tmp", dir=file_path.parent
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            try:
+                # Keep the permissions and owner of the file being replaced
+                original = os.stat(file_path)
+            except FileNotFoundError:
+                pass
+            else:
+                os.chmod(temp_path, stat.S_IMODE(original.st_mode))
+                _keep_owner(f.fileno(), temp_path, original)
+            f.writelines(segments)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def clone_file(src_path: Union[str, Path], dst_path: Union[str, Path]) -> str:
+    """
+    Copy a file as cheaply as the filesystem allows. A reflink is tried
+    first, then an in-kernel `os.copy_file_range`, then a regular copy.
+    :param src_path: File to copy
+    :type src_path: str | Path
+    :param dst_path: Copy to create, replaced if it exists
+    :type dst_path: str | Path
+    :return: Method used, `reflink`, `copy_file_range` or `copy`
+    :rtype: str
+    """
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                return "reflink"
+            except OSError:
+                pass
+        if hasattr(os, "copy_file_range"):
+            remaining = os.fstat(src.fileno()).st_size
+            try:
+                while remaining > 0:
+                    copied = os.copy_file_range(
+                        src.fileno(), dst.fileno(), remaining
+                    )
+                    if not copied:
+                        break
+                    remaining -= copied
+                else:
+                    return "copy_file_range"
+            except OSError:
+                pass  # Not supported across these filesystems
+            src.seek(0)
+            dst.seek(0)
+            dst.truncate()
+        shutil.copyfileobj(src, dst)
+        return "copy"
+
+
+def sync_directory(
+    folder_path: Union[str, Path], file_paths: Iterable[Union[str, Path]]
+):
+    """
+    Flush the files written to a directory to disk, one fsync each once
+    they are all written, then fsync the directory so the renames of
+    `atomic_write` are durable. Only these files are flushed, not every
+    filesystem of the host as `os.sync` would.
+    :param folder_path: Directory the files were written to
+    :type folder_path: str | Path
+    :param file_paths: Files written
+    :type file_paths: Iterable[str | Path]
+    """
+    logger.debug(f"Syncing {folder_path} to disk...")
+    for file_path in file_paths:
+        # Windows only flushes handles open for writing
+        fd = os.open(file_path, os.O_RDWR if os.name == "nt" else os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    if os.name == "nt":
+        return  # Directories can't be opened, renames are left to NTFS
+    fd = os.open(folder_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def snapshot_folder(
+    folder_path: Union[str, Path],
+    snapshot_path: Union[str, Path],
+    include_torrents: bool = True,
+    entries: Optional[Iterable[os.DirEntry]] = None,
+):
+    """
+    Snapshot BT_backup into a new folder without copying any data where
+    possible. Files are hardlinked, which is safe as .fastresume files
+    are only ever replaced by `atomic_write`, never modified in place.
+    Files that can't be linked (e.g. another filesystem) are cloned with
+    `clone_file`.
+    """
+    logger.info(f"🗄️ Creating Snapshot {snapshot_path} ...")
+    if entries is None:
+        entries = scan_bt_backup(folder_path)
+    snapshot_path = Path(snapshot_path)
+    snapshot_path.mkdir(parents=True)
+    for file in entries:
+        if not (
+            file.name.endswith(".fastresume")
+            or (include_torrents and file.name.endswith(".torrent"))
+        ):
+            continue
+        target = snapshot_path / file.name
+        try:
+            os.link(file.path, target)
+        except OSError:
+            logger.debug(f"Cannot link {file.path}, cloning instead...")
+            clone_file(file.path, target)
     logger.info("✔️ Done!")
 
 
@@ -59,3 +253,134 @@ def discover_bt_backup_path():
 
     logger.debug("Linux/Mac System")
     return Path(os.getenv("HOME"), ".local/share/data/qBittorrent/BT_backup")
+
+
+def submit_bounded(
+    executor: Executor,
+    fn: Callable,
+    jobs: Iterable[tuple],
+    max_pending: int,
+):
+    """
+    Submit `fn(*args)` to `executor` for every args tuple in `jobs`, keeping
+    at most `max_pending` futures in flight.
+    Yields `(args, future)` pairs as the futures complete.
+    """
+    pending = {}
+    for args in jobs:
+        pending[executor.submit(fn, *args)] = args
+        if len(pending) >= max_pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future
+    for future in as_completed(pending):
+        yield pending[future], future
+
+
+# A `{m,n}` repetition, any other `{` is matched literally
+_REPETITION = re.compile(r"\{\d*(?:,\d*)?\}")
+# Length of the escapes that stand for a character by its code
+_CODE_ESCAPES = {"x": 2, "u": 4, "U": 8}
+
+
+def _escape_end(pattern: str, index: int) -> int:
+    """Index after the escape starting at `index`, its code included."""
+    escaped = pattern[index + 1 : index + 2]
+    end = index + 2
+    if escaped in _CODE_ESCAPES:
+        return end + _CODE_ESCAPES[escaped]
+    if escaped == "N" and pattern[end : end + 1] == "{":
+        closing = pattern.find("}", end)
+        return len(pattern) if closing == -1 else closing + 1
+    if escaped.isdigit():
+        # Octal escapes and group references, up to 3 digits
+        while end < min(index + 4, len(pattern)) and pattern[end].isdigit():
+            end += 1
+    return end
+
+
+def _regex_token(pattern: str, index: int) -> Tuple[Optional[str], int]:
+    """
+    Read the regex token starting at `index`.
+    Returns the literal character it matches (or `None` if it is not a
+    literal) and the index of the next token.
+    """
+    char = pattern[index]
+    if char == "\\":
+        escaped = pattern[index + 1 : index + 2]
+        literal = escaped if escaped and not escaped.isalnum() else None
+        return literal, _escape_end(pattern, index)
+    if char == "[":
+        # Skip the whole character class
+        index += 1
+        if pattern[index : index + 1] == "^":
+            index += 1
+        if pattern[index : index + 1] == "]":
+            index += 1
+        while index < len(pattern) and pattern[index] != "]":
+            index += 2 if pattern[index] == "\\" else 1
+        return None, index + 1
+    if char == "{":
+        repetition = _REPETITION.match(pattern, index)
+        return None, repetition.end() if repetition else index + 1
+    if char in ".^$*+?}()":
+        return None, index + 1
+    return char, index + 1
+
+
+def regex_literal(pattern: str) -> str:
+    """
+    Find the longest literal substring that every match of
+    the regex `pattern` must contain.
+    Returns an empty string if no such literal can be determined.
+    """
+    if "|" in pattern or "(?" in pattern:
+        # Alternations and inline flags (e.g. case-insensitivity)
+        # make any literal optional
+        return ""
+    runs = []
+    run = ""
+    depth = 0
+    index = 0
+    while index < len(pattern):
+        # Anything inside a group may be optional, only trust the top level
+        depth += {"(": 1, ")": -1}.get(pattern[index], 0)
+        literal, index = _regex_token(pattern, index)
+        quantifier = pattern[index : index + 1]
+        optional = quantifier != "" and quantifier in "?*{"
+        if literal is not None and depth == 0 and not optional:
+            run += literal
+            if quantifier != "+":
+                continue
+        runs.append(run)
+        run = ""
+    runs.append(run)
+    return max(runs, key=len)
+
+
+def prefilter_needles(
+    existing_path: str, regex_path: bool = False
+) -> Optional[Tuple[bytes, ...]]:
+    """
+    Byte strings of which at least one must appear in the raw contents of
+    a .fastresume file for it to be relevant to `existing_path`.
+    Returns `None` if no prefilter can be derived.
+    """
+    needles = {existing_path}
+    if regex_path:
+        needles.add(regex_literal(existing_path))
+    if "" in needles:
+        return None
+    return tuple(needle.encode("utf-8") for needle in needles)
+
+
+def contains_any(file_path: Union[str, Path], needles: Iterable[bytes]):
+    """
+    Scan the raw bytes of a file for any of `needles` without reading
+    the whole file into memory.
+    """
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return False
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return any(mapped.find(needle) != -1 for needle in needles)
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+from concurrent.futures import Executor
+from itertools import islice
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+class Stage(NamedTuple):
+    """
+    A step of a `staged` pipeline.
+    `function` is called with each item and returns the item for the next
+    stage, or `None` to drop it. Unless `inline`, it runs in the executor,
+    `workers` items at a time. Inline stages run on the event loop and must
+    not block, they suit bookkeeping that isn't thread-safe.
+    """
+
+    name: str
+    function: Callable[[Any], Any]
+    workers: int = 1
+    inline: bool = False
+
+
+def _apply(function: Callable[[Any], Any], batch: List) -> List:
+    return [result for result in map(function, batch) if result is not None]
+
+
+async def _work(
+    stage: Stage,
+    inbox: asyncio.Queue,
+    outbox: asyncio.Queue,
+    executor: Optional[Executor],
+):
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = await inbox.get()
+        if batch is _DONE:
+            return
+        if stage.inline:
+            results = _apply(stage.function, batch)
+        else:
+            results = await loop.run_in_executor(
+                executor, _apply, stage.function, batch
+            )
+        if results:
+            await outbox.put(results)
+
+
+async def _run_stage(
+    stage: Stage,
+    inbox: asyncio.Queue,
+    outbox: asyncio.Queue,
+    consumers: int,
+    executor: Optional[Executor],
+):
+    await asyncio.gather(
+        *(
+            _work(stage, inbox, outbox, executor)
+            for _ in range(max(1, stage.workers))
+        )
+    )
+    logger.debug(f"Stage {stage.name} done.")
+    for _ in range(consumers):
+        await outbox.put(_DONE)
+
+
+async def _feed(
+    items: Iterable, outbox: asyncio.Queue, consumers: int, batch_size: int
+):
+    items = iter(items)
+    while batch := list(islice(items, batch_size)):
+        await outbox.put(batch)
+    for _ in range(consumers):
+        await outbox.put(_DONE)
+
+
+async def staged(
+    items: Iterable,
+    stages: Sequence[Stage],
+    executor: Optional[Executor] = None,
+    queue_size: int = 1,
+    batch_size: int = 1,
+) -> AsyncIterator:
+    """
+    Pass `items` through `stages`, connected by bounded queues.
+    Every stage works concurrently with the others, a stage whose output
+    queue is full waits for the next stage to catch up, so no more than
+    `queue_size` batches are ever waiting between two stages.
+    An exception raised by a stage cancels the whole pipeline and is
+    raised from the iteration.
+    :param items: Input of the first stage
+    :type items: Iterable
+    :param stages: Stages in order
+    :type stages: Sequence[Stage]
+    :param executor: Executor of the stages that aren't inline,
+    defaults to the event loop's default executor
+    :type executor: concurrent.futures.Executor
+    :param queue_size: Maximum number of batches waiting between two stages
+    :type queue_size: int
+    :param batch_size: Items handed to a stage at once. Larger batches
+    save hops between the event loop and the executor.
+    :type batch_size: int
+    :return: Output of the last stage, in completion order
+    :rtype: AsyncIterator
+    """
+    queues = [
+        asyncio.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)
+    ]
+    consumers = [max(1, stage.workers) for stage in stages] + [1]
+    tasks = [
+        asyncio.ensure_future(
+            _feed(items, queues[0], consumers[0], max(1, batch_size))
+        )
+    ]
+    for index, stage in enumerate(stages):
+        tasks.append(
+            asyncio.ensure_future(
+                _run_stage(
+                    stage,
+                    queues[index],
+                    queues[index + 1],
+                    consumers[index + 1],
+                    executor,
+                )
+            )
+        )
+    output = queues[-1]
+    get = None
+    try:
+        while True:
+            get = asyncio.ensure_future(output.get())
+            while not get.done():
+                await asyncio.wait(
+                    [get, *(task for task in tasks if not task.done())],
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in tasks:
+                    if task.done() and task.exception() is not None:
+                        raise task.exception()
+            batch = get.result()
+            if batch is _DONE:
+                return
+            for item in batch:
+                yield item
+    finally:
+        if get is not None:
+            get.cancel()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
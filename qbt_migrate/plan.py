@@ -0,0 +1,105 @@
+import json
+import logging
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Union
+
+
+logger = logging.getLogger(__name__)
+
+PLAN_VERSION = 1
+
+
+class PlanMismatchError(ValueError):
+    """A .fastresume file changed since the migration plan was made."""
+
+
+def _encode_value(value: Any) -> Any:
+    # Paths that are not valid UTF-8 are decoded to bytes by bencode
+    if isinstance(value, bytes):
+        return {"hex": value.hex()}
+    if isinstance(value, list):
+        return [_encode_value(item) for item in value]
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        return bytes.fromhex(value["hex"])
+    if isinstance(value, list):
+        return [_decode_value(item) for item in value]
+    return value
+
+
+@dataclass
+class PlanEntry:
+    """Planned path changes of a single .fastresume file."""
+
+    file_name: str
+    sha256: str
+    old: Dict[str, Any]
+    new: Dict[str, Any]
+
+
+@dataclass
+class MigrationPlan:
+    """
+    Path changes worked out by `QBTBatchMove.plan`, to be applied later
+    with `QBTBatchMove.apply_plan` without scanning BT_backup again.
+    """
+
+    bt_backup_path: str
+    entries: List[PlanEntry] = field(default_factory=list)
+    created: str = field(
+        default_factory=lambda: datetime.now().isoformat(timespec="seconds")
+    )
+
+    def __len__(self):
+        return len(self.entries)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["version"] = PLAN_VERSION
+        for entry in data["entries"]:
+            for values in (entry["old"], entry["new"]):
+                for key, value in values.items():
+                    values[key] = _encode_value(value)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MigrationPlan":
+        if data.get("version") != PLAN_VERSION:
+            raise ValueError(
+                f"Unsupported migration plan version {data.get('version')}"
+            )
+        return cls(
+            bt_backup_path=data["bt_backup_path"],
+            created=data["created"],
+            entries=[
+                PlanEntry(
+                    file_name=entry["file_name"],
+                    sha256=entry["sha256"],
+                    old={
+                        key: _decode_value(value)
+                        for key, value in entry["old"].items()
+                    },
+                    new={
+                        key: _decode_value(value)
+                        for key, value in entry["new"].items()
+                    },
+                )
+                for entry in data["entries"]
+            ],
+        )
+
+    def dump(self, file_path: Union[str, Path]):
+        logger.debug(f"Writing migration plan to {file_path}...")
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, file_path: Union[str, Path]) -> "MigrationPlan":
+        logger.debug(f"Loading migration plan {file_path}...")
+        with open(file_path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
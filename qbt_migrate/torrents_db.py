@@ -0,0 +1,359 @@
+import logging
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from qbt_migrate.bencoding import splice_dict
+from qbt_migrate.classes import (
+    LOAD_ERRORS,
+    FileResult,
+    QBTBatchMove,
+    ResumeData,
+    RunStats,
+    RunSummary,
+)
+from qbt_migrate.enums import TargetOS
+from qbt_migrate.mapping import PathMapping, as_mapping
+
+
+logger = logging.getLogger(__name__)
+
+# Columns that hold the values of the qBt-* keys of .fastresume files
+PATH_COLUMNS = {
+    "qBt-savePath": "target_save_path",
+    "qBt-downloadPath": "download_path",
+}
+
+
+def default_torrents_db_path(bt_backup_path: Union[str, Path]) -> Path:
+    """torrents.db location, next to the BT_backup directory."""
+    return Path(bt_backup_path).parent / "torrents.db"
+
+
+class ResumeRow(ResumeData):
+    """
+    Resume data of a torrent in torrents.db. The `target_save_path` and
+    `download_path` columns are exposed as `qBt-savePath` and
+    `qBt-downloadPath`, like in a .fastresume file, so paths are replaced
+    the same way. Rows are written by `TorrentsDB`, not one by one.
+    """
+
+    logger = logging.getLogger(__name__ + ".ResumeRow")
+    __slots__ = ("row_id", "_columns")
+
+    def __init__(
+        self,
+        file_path: Union[str, Path],
+        resume_data: bytes,
+        columns: Dict[str, Optional[str]],
+        row_id: Optional[int] = None,
+        lazy: bool = True,
+    ):
+        """
+        :param file_path: Name of the row in logs and results
+        :type file_path: str | Path
+        :param resume_data: The `resume_data` blob
+        :type resume_data: bytes
+        :param columns: Values of the path columns, by the key they stand for
+        :type columns: dict
+        :param row_id: `id` of the row
+        :type row_id: int
+        :param lazy: Only decode the path keys of the blob
+        :type lazy: bool
+        """
+        super().__init__(file_path, bytes(resume_data), lazy)
+        self.row_id = row_id
+        self._columns = tuple(columns)
+        for key, value in columns.items():
+            if value is not None:
+                self._data[key] = value
+
+    def column_values(self) -> Dict[str, Optional[str]]:
+        """Current values of the path columns, by the key they stand for."""
+        return {key: self._data.get(key) for key in self._columns}
+
+    def encode_segments(self) -> List[Union[bytes, memoryview]]:
+        return splice_dict(
+            self._raw,
+            {
+                key: value
+                for key, value in self.changes().items()
+                if key not in self._columns
+            },
+        )
+
+
+class TorrentsDB(object):
+    """
+    qBittorrent's SQLite resume data storage, torrents.db, used instead of
+    .fastresume files in BT_backup when qBittorrent is set to keep resume
+    data in a database.
+    """
+
+    logger = logging.getLogger(__name__ + ".TorrentsDB")
+
+    def __init__(self, db_path: Union[str, Path], timeout: float = 5.0):
+        """
+        :param db_path: Path to torrents.db
+        :type db_path: str | Path
+        :param timeout: Seconds to wait for a lock on the database
+        :type timeout: float
+        """
+        self.db_path = Path(db_path)
+        self.timeout = timeout
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self.db_path.is_file():
+            raise FileNotFoundError(self.db_path)
+        # Transactions are managed explicitly
+        return sqlite3.connect(
+            str(self.db_path), timeout=self.timeout, isolation_level=None
+        )
+
+    @staticmethod
+    def _path_columns(connection: sqlite3.Connection) -> Dict[str, str]:
+        """Path columns of this database version, by key."""
+        names = {
+            row[1] for row in connection.execute("PRAGMA table_info(torrents)")
+        }
+        if "resume_data" not in names:
+            raise ValueError("Not a qBittorrent torrents.db")
+        return {
+            key: column
+            for key, column in PATH_COLUMNS.items()
+            if column in names
+        }
+
+    def backup(self, backup_path: Union[str, Path, None] = None) -> Path:
+        """
+        Copy the database with SQLite's online backup, consistent even if
+        something else has it open.
+        :param backup_path: Backup file, defaults to
+        `torrents.db.<timestamp>.bkup` next to the database
+        :type backup_path: str | Path
+        :return: Path of the backup
+        :rtype: Path
+        """
+        if backup_path is None:
+            backup_path = self.db_path.with_name(
+                f"{self.db_path.name}."
+                f"{datetime.now().strftime('%Y%m%d%H%M%S')}.bkup"
+            )
+        backup_path = Path(backup_path)
+        self.logger.info(f"🗄️ Backing up {self.db_path} to {backup_path} ...")
+        source = self._connect()
+        try:
+            target = sqlite3.connect(str(backup_path))
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+        finally:
+            source.close()
+        return backup_path
+
+    def _pages(
+        self,
+        connection: sqlite3.Connection,
+        columns: Dict[str, str],
+        mapping: Optional[PathMapping],
+        page_size: int,
+    ) -> Iterator[List[Tuple]]:
+        """
+        Rows that could be relevant to `mapping`, `page_size` at a time.
+        Rows are filtered in SQL by the same needles as the raw-byte
+        prefilter of .fastresume files, see `PathMapping.needles`.
+        """
+        needles = mapping.needles() if mapping is not None else None
+        conditions = []
+        parameters = []
+        for needle in needles or ():
+            conditions.append("instr(resume_data, ?) > 0")
+            parameters.append(needle)
+            if "qBt-savePath" in columns:
+                conditions.append(
+                    "instr(CAST(target_save_path AS BLOB), ?) > 0"
+                )
+                parameters.append(needle)
+        where = f"AND ({' OR '.join(conditions)})" if conditions else ""
+        # Column names come from PATH_COLUMNS, not from input
+        query = (
+            f"SELECT id, torrent_id, resume_data"  # nosec
+            f"{''.join(f', {column}' for column in columns.values())} "
+            f"FROM torrents WHERE id > ? {where} ORDER BY id LIMIT ?"
+        )
+        last_id = -1
+        while True:
+            page = connection.execute(
+                query, (last_id, *parameters, page_size)
+            ).fetchall()
+            if not page:
+                return
+            yield page
+            last_id = page[-1][0]
+
+    def _row_path(self, torrent_id: Union[bytes, str]) -> Path:
+        """Stands in for the file path of a row in logs and results."""
+        if isinstance(torrent_id, bytes):
+            torrent_id = torrent_id.decode("ascii", "replace")
+        return self.db_path / str(torrent_id)
+
+    def _row(self, columns: Dict[str, str], values: Tuple) -> ResumeRow:
+        row_id, torrent_id, resume_data, *column_values = values
+        return ResumeRow(
+            self._row_path(torrent_id),
+            resume_data,
+            dict(zip(columns, column_values)),
+            row_id,
+        )
+
+    def rows(
+        self,
+        existing_path: Union[str, PathMapping, None] = None,
+        regex_path: bool = False,
+        page_size: int = 1000,
+    ) -> Iterator[ResumeRow]:
+        """
+        Read the resume data of the torrents in the database.
+        :param existing_path: Only rows relevant to this path, or
+        `PathMapping`. Defaults to all rows.
+        :type existing_path: str | PathMapping
+        :param regex_path: Existing Path is a regex pattern
+        :type regex_path: bool
+        :param page_size: Rows read at once
+        :type page_size: int
+        :return: Rows, lazily decoded
+        :rtype: Iterator[ResumeRow]
+        """
+        mapping = None
+        if existing_path is not None:
+            mapping = as_mapping(existing_path, regex_path=regex_path)
+        connection = self._connect()
+        try:
+            columns = self._path_columns(connection)
+            for page in self._pages(connection, columns, mapping, page_size):
+                for values in page:
+                    row = self._row(columns, values)
+                    if mapping is None or row.is_relevant(mapping):
+                        yield row
+        finally:
+            connection.close()
+
+    def migrate(
+        self,
+        existing_path: Union[str, PathMapping],
+        new_path: Optional[str],
+        regex_path: bool = False,
+        target_os: Optional[TargetOS] = None,
+        create_backup: bool = True,
+        skip_bad_files: bool = False,
+        page_size: int = 1000,
+    ) -> RunSummary:
+        """
+        Replace paths in every relevant row in a single transaction.
+        Either all updates are committed or, if the run fails, none are.
+        Rows that fail to update are reported in the summary and left
+        as they were. Arguments are the same as for `QBTBatchMove.run`.
+        :param page_size: Rows read, and written with one `executemany`,
+        at once
+        :type page_size: int
+        :return: Summary of processed rows, including per-row errors
+        :rtype: RunSummary
+        """
+        mapping = as_mapping(existing_path, new_path, regex_path)
+        start = time.perf_counter()
+        summary = RunSummary()
+        stats = summary.stats
+        if create_backup:
+            with stats.timer("backup"):
+                self.backup()
+        self.logger.info(
+            f"🕵️ Searching {self.db_path} for torrents with path "
+            f"{', '.join(mapping.existing_paths)} ..."
+        )
+        connection = self._connect()
+        try:
+            columns = self._path_columns(connection)
+            update = (
+                f"UPDATE torrents SET resume_data = ?"  # nosec
+                f"{''.join(f', {column} = ?' for column in columns.values())}"
+                f" WHERE id = ?"
+            )
+            # Take the write lock up front, fails fast if qBittorrent is
+            # running, and makes the whole migration one transaction
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                (stats.files_scanned,) = connection.execute(
+                    "SELECT COUNT(*) FROM torrents"
+                ).fetchone()
+                pages = self._pages(connection, columns, mapping, page_size)
+                for page in stats.timed(pages, "discovery"):
+                    updates = self._migrate_page(
+                        columns,
+                        page,
+                        mapping,
+                        target_os,
+                        not skip_bad_files,
+                        summary,
+                    )
+                    with stats.timer("write"):
+                        connection.executemany(update, updates)
+                with stats.timer("write"):
+                    connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        finally:
+            connection.close()
+        for result in summary.results:
+            stats.add_result(result)
+        stats.timings["total"] = time.perf_counter() - start
+        QBTBatchMove._log_summary(summary)
+        return summary
+
+    def _migrate_page(
+        self,
+        columns: Dict[str, str],
+        page: List[Tuple],
+        mapping: PathMapping,
+        target_os: Optional[TargetOS],
+        raise_on_error: bool,
+        summary: RunSummary,
+    ) -> List[Tuple]:
+        stats: RunStats = summary.stats
+        updates = []
+        for values in page:
+            try:
+                row = self._row(columns, values)
+            except LOAD_ERRORS as e:
+                QBTBatchMove._handle_load_error(
+                    self._row_path(values[1]), e, raise_on_error
+                )
+                stats.files_skipped_bad += 1
+                continue
+            stats.files_decoded += 1
+            stats.bytes_read += row.raw_size
+            if not row.is_relevant(mapping):
+                continue
+            stats.files_matched += 1
+            start = time.perf_counter()
+            try:
+                row.map_paths(mapping, target_os)
+                resume_data = row.encode()
+            except Exception as e:
+                self.logger.debug(f"Failed to update {row.file_path}: {e}")
+                summary.results.append(FileResult(row.file_path, e))
+                continue
+            updates.append(
+                (resume_data, *row.column_values().values(), row.row_id)
+            )
+            summary.results.append(
+                FileResult(
+                    row.file_path,
+                    bytes_written=len(resume_data),
+                    rewrite_seconds=time.perf_counter() - start,
+                )
+            )
+        return updates
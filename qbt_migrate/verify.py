@@ -0,0 +1,108 @@
+import logging
+import os
+import threading
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Dict, FrozenSet, List, Optional
+
+
+if TYPE_CHECKING:  # pragma: no cover
+    from qbt_migrate.classes import FastResume
+
+
+logger = logging.getLogger(__name__)
+
+
+class MissingTargetsError(FileNotFoundError):
+    """The new paths of a torrent don't exist."""
+
+    def __init__(self, missing: List[str]):
+        super().__init__(f"Missing {', '.join(missing)}")
+        self.missing = missing
+
+
+class TargetVerifier(object):
+    """
+    Checks that the new save paths of migrated torrents, and the files of
+    `mapped_files` under them, exist, before qBittorrent is left to
+    recheck torrents that point at nothing.
+    Paths are checked against directory listings rather than a stat each:
+    every distinct directory is listed once with `os.scandir` and cached,
+    so torrents sharing a save path share its listing. It is safe to use
+    from many threads at once, a directory being listed by one is waited
+    for by the others.
+    Paths are checked as seen from the machine running the migration.
+    """
+
+    logger = logging.getLogger(__name__ + ".TargetVerifier")
+
+    def __init__(self, refuse: bool = False):
+        """
+        :param refuse: Fail torrents with missing paths rather than only
+        report them, so they are not written
+        :type refuse: bool
+        """
+        self.refuse = refuse
+        # Number of directories listed
+        self.listed = 0
+        self._listings: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def names(self, directory: str) -> Optional[FrozenSet[str]]:
+        """Names in a directory, None if it can't be listed."""
+        with self._lock:
+            listing = self._listings.get(directory)
+            owner = listing is None
+            if owner:
+                listing = self._listings[directory] = Future()
+        if not owner:
+            return listing.result()
+        try:
+            with os.scandir(directory) as it:
+                names = frozenset(entry.name for entry in it)
+        except OSError as e:
+            self.logger.debug(f"Unable to list {directory}: {e}")
+            names = None
+        with self._lock:
+            self.listed += 1
+        listing.set_result(names)
+        return names
+
+    def exists(self, path: str) -> bool:
+        """Whether `path` exists, from the listing of its parent."""
+        path = os.path.normpath(path)
+        parent, name = os.path.split(path)
+        if not name:
+            # A root, it has no parent to list
+            return self.names(path) is not None
+        names = self.names(parent)
+        return names is not None and name in names
+
+    def missing(self, fast_resume: "FastResume") -> List[str]:
+        """
+        Paths of a torrent that don't exist: its save path, its download
+        path if it has one, and the files of `mapped_files`, which may be in
+        either of them.
+        :param fast_resume: Migrated .fastresume file
+        :type fast_resume: FastResume
+        :return: Missing paths, empty if all of them exist
+        :rtype: list[str]
+        """
+        roots = [
+            root
+            for root in (
+                fast_resume.save_path or fast_resume.qbt_save_path,
+                fast_resume.qbt_download_path,
+            )
+            if root
+        ]
+        missing = [root for root in roots if not self.exists(root)]
+        for mapped_file in fast_resume.mapped_files or []:
+            if os.path.isabs(mapped_file):
+                candidates = [mapped_file]
+            else:
+                candidates = [
+                    os.path.join(root, mapped_file) for root in roots
+                ]
+            if candidates and not any(map(self.exists, candidates)):
+                missing.append(candidates[0])
+        return missing
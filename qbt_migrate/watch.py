@@ -0,0 +1,358 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set, Tuple, Union
+
+from qbt_migrate.classes import (
+    LOAD_ERRORS,
+    FastResume,
+    FileResult,
+    QBTBatchMove,
+    RunSummary,
+)
+from qbt_migrate.enums import Durability, TargetOS, Verification
+from qbt_migrate.mapping import PathMapping, as_mapping
+from qbt_migrate.methods import sync_directory
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds between rescans of BT_backup when inotify isn't available
+DEFAULT_POLL_INTERVAL = 5.0
+# Longest wait for events, so a stop request is noticed
+_TICK = 0.5
+
+# From <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+_EVENT = struct.Struct("iIII")
+
+
+def _stat_key(stat: os.stat_result) -> Tuple[int, int, int]:
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def _fast_resume_names(names: Iterable[str]) -> Set[str]:
+    # Skips the temporary files of `atomic_write` and backups
+    return {name for name in names if name.endswith(".fastresume")}
+
+
+class _Inotify(object):
+    """Names of files written in, or moved into, a directory."""
+
+    def __init__(self, folder_path: Union[str, Path]):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        watch = libc.inotify_add_watch(
+            self.fd, os.fsencode(folder_path), IN_CLOSE_WRITE | IN_MOVED_TO
+        )
+        if watch < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"Unable to watch {folder_path}")
+
+    def read(self, timeout: float) -> Optional[Set[str]]:
+        """
+        Names with events within `timeout` seconds. None if the kernel
+        dropped events, every file must then be looked at again.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        names = set()
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            if mask & IN_Q_OVERFLOW:
+                return None
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            if name:
+                names.add(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _Poller(object):
+    """Names of files changed since the last scan, by rescanning."""
+
+    def __init__(self, folder_path: Union[str, Path], interval: float):
+        self.folder_path = folder_path
+        self.interval = interval
+        self._seen = self._scan()
+        self._scanned = time.monotonic()
+
+    def _scan(self) -> Dict[str, Tuple[int, int, int]]:
+        with os.scandir(self.folder_path) as it:
+            return {
+                entry.name: _stat_key(entry.stat())
+                for entry in it
+                if entry.name.endswith(".fastresume") and entry.is_file()
+            }
+
+    def read(self, timeout: float) -> Optional[Set[str]]:
+        wait = self.interval - (time.monotonic() - self._scanned)
+        if wait > 0:
+            time.sleep(min(wait, timeout))
+            if wait > timeout:
+                return set()
+        seen = self._scan()
+        self._scanned = time.monotonic()
+        changed = {
+            name for name, key in seen.items() if self._seen.get(name) != key
+        }
+        self._seen = seen
+        return changed
+
+    def close(self):
+        pass
+
+
+class Watcher(object):
+    """
+    Keeps BT_backup migrated while qBittorrent is still writing .fastresume
+    files with old paths, such as during a staged storage cutover.
+    Only files that are created or modified are looked at, so an event
+    costs the same whatever the size of BT_backup. Events are reported by
+    inotify on Linux, elsewhere, or with `poll_interval`, BT_backup is
+    rescanned instead. A burst of writes to a file is handled once, after
+    it has been left alone for `debounce` seconds.
+    """
+
+    logger = logging.getLogger(__name__ + ".Watcher")
+
+    def __init__(
+        self,
+        bt_backup_path: Union[str, Path],
+        existing_path: Union[str, PathMapping],
+        new_path: Optional[str],
+        regex_path: bool = False,
+        target_os: Optional[TargetOS] = None,
+        create_backup: bool = True,
+        max_workers: Optional[int] = None,
+        durability: Durability = Durability.NONE,
+        verification: Verification = Verification.NONE,
+        debounce: float = 2.0,
+        poll_interval: Optional[float] = None,
+    ):
+        """
+        Arguments are the same as for `QBTBatchMove.run`.
+        :param create_backup: Back up each file next to it, see
+        `FastResume.backup`, before it is first updated while watching.
+        Files written by a run given to `written` are left to its backup.
+        :type create_backup: bool
+        :param debounce: Seconds a file must go without events before it
+        is migrated
+        :type debounce: float
+        :param poll_interval: Rescan BT_backup every so many seconds
+        instead of using inotify, which doesn't see writes made by other
+        hosts to network filesystems
+        :type poll_interval: float
+        """
+        self.bt_backup_path = Path(bt_backup_path)
+        self.mapping = as_mapping(existing_path, new_path, regex_path)
+        self.target_os = target_os
+        self.create_backup = create_backup
+        self.max_workers = max_workers
+        self.durability = durability
+        self.verification = verification
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        # Files updated while watching, see `watch`
+        self.summary = RunSummary()
+        self._source = None
+        # Stat of the files last written by us, their events are ignored
+        self._written: Dict[str, Tuple[int, int, int]] = {}
+        # Names of the files with a backup of their content before the watch
+        self._backed_up: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def start(self):
+        """
+        Start collecting events. Files written from here on are migrated
+        by `watch`, so starting before a full run leaves no gap between
+        the two.
+        """
+        if self._source is not None:
+            return
+        if self.poll_interval is None:
+            try:
+                self._source = _Inotify(self.bt_backup_path)
+                self.logger.info(f"👀 Watching {self.bt_backup_path}...")
+                return
+            except (AttributeError, OSError) as e:
+                self.logger.warning(
+                    f"⚠️ inotify is not available ({e}), polling instead."
+                )
+        interval = self.poll_interval or DEFAULT_POLL_INTERVAL
+        self._source = _Poller(self.bt_backup_path, interval)
+        self.logger.info(
+            f"👀 Watching {self.bt_backup_path}, "
+            f"rescanning every {interval:g} seconds..."
+        )
+
+    def close(self):
+        if self._source is not None:
+            self._source.close()
+            self._source = None
+
+    def written(self, summary: RunSummary):
+        """
+        Ignore the events of files written by a run, such as the first.
+        Their backup is the one made by the run.
+        """
+        for result in summary.results:
+            if result.ok:
+                self._record(result.file_path)
+                with self._lock:
+                    self._backed_up.add(result.file_path.name)
+
+    def _record(self, file_path: Path):
+        try:
+            key = _stat_key(os.stat(file_path))
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._written[file_path.name] = key
+
+    def watch(self, stop: Optional[threading.Event] = None) -> RunSummary:
+        """
+        Migrate files as they are written until `stop` is set, or until
+        interrupted. `summary` has the files updated so far either way.
+        :param stop: Stop watching once set
+        :type stop: threading.Event
+        :return: Summary of updated files, including per-file errors
+        :rtype: RunSummary
+        """
+        self.start()
+        if stop is None:
+            stop = threading.Event()
+        start = time.perf_counter()
+        # File names by the time they may be migrated
+        pending: Dict[str, float] = {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                while not stop.is_set():
+                    timeout = _TICK
+                    if pending:
+                        timeout = min(
+                            timeout,
+                            max(0.0, min(pending.values()) - time.monotonic()),
+                        )
+                    names = self._source.read(timeout)
+                    if names is None:
+                        self.logger.warning(
+                            "⚠️ Too many events at once, rescanning..."
+                        )
+                        names = os.listdir(self.bt_backup_path)
+                    deadline = time.monotonic() + self.debounce
+                    for name in _fast_resume_names(names):
+                        pending[name] = deadline
+                    now = time.monotonic()
+                    ready = [
+                        name for name, due in pending.items() if due <= now
+                    ]
+                    if not ready:
+                        continue
+                    for name in ready:
+                        del pending[name]
+                    self._migrate_batch(executor, ready)
+        finally:
+            self.close()
+            self.summary.stats.timings["total"] = time.perf_counter() - start
+        return self.summary
+
+    def _migrate_batch(self, executor: ThreadPoolExecutor, names):
+        # Directories are listed afresh for each batch, they change during
+        # a cutover
+        verifier = QBTBatchMove._verifier(self.verification)
+        written = []
+        for result in executor.map(
+            lambda name: self._migrate(name, verifier), names
+        ):
+            if result is None:
+                continue
+            self.summary.results.append(result)
+            self.summary.stats.add_result(result)
+            if result.ok:
+                written.append(result.file_path)
+                self.logger.info(f"✔️ Updated {result.file_path}")
+            else:
+                self.logger.error(
+                    f"🛑 Failed to update {result.file_path}: {result.error}"
+                )
+        if self.durability is Durability.BATCH and written:
+            with self.summary.stats.timer("write"):
+                sync_directory(self.bt_backup_path, written)
+
+    def _migrate(self, name: str, verifier) -> Optional[FileResult]:
+        file_path = self.bt_backup_path / name
+        stats = self.summary.stats
+        try:
+            if _stat_key(os.stat(file_path)) == self._written.get(name):
+                # Our own write
+                return None
+            fast_resume = FastResume.load_candidate(file_path, self.mapping)
+        except FileNotFoundError:
+            # The torrent was removed since
+            return None
+        except LOAD_ERRORS as e:
+            QBTBatchMove._handle_load_error(file_path, e, False)
+            with self._lock:
+                stats.files_skipped_bad += 1
+            return None
+        with self._lock:
+            stats.files_scanned += 1
+            if fast_resume is not None:
+                stats.files_decoded += 1
+                stats.bytes_read += fast_resume.raw_size
+        if fast_resume is None or not fast_resume.is_relevant(self.mapping):
+            return None
+        with self._lock:
+            stats.files_matched += 1
+        if self.create_backup and name not in self._backed_up:
+            # qBittorrent may write the old paths back many times during a
+            # cutover, only its content from before the watch is kept
+            try:
+                fast_resume.backup()
+            except OSError as e:
+                return FileResult(file_path, e)
+            with self._lock:
+                self._backed_up.add(name)
+        result = QBTBatchMove._replace_paths(
+            fast_resume,
+            self.mapping,
+            self.target_os,
+            self.durability,
+            verifier=verifier,
+        )
+        if result.ok:
+            self._record(file_path)
+        return result
@@ -0,0 +1,506 @@
+import http.client
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+from urllib.parse import urlencode, urlsplit
+
+from qbt_migrate.classes import FileResult, QBTBatchMove, RunSummary
+from qbt_migrate.enums import TargetOS
+from qbt_migrate.mapping import PathMapping, as_mapping
+from qbt_migrate.methods import convert_slashes, submit_bounded
+
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean a kept-alive connection was closed by the server
+_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    BrokenPipeError,
+    ConnectionResetError,
+)
+
+
+class WebUIError(Exception):
+    """A WebUI API request failed."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status} {message}" if status else message)
+        self.status = status
+
+
+class WebUIClient(object):
+    """
+    Client of the qBittorrent WebUI API.
+    Requests share a single authenticated session and up to
+    `max_connections` keep-alive connections, so a migration of thousands
+    of torrents logs in once and opens a handful of connections rather
+    than one per request.
+    """
+
+    logger = logging.getLogger(__name__ + ".WebUIClient")
+
+    def __init__(
+        self,
+        url: str,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        max_connections: int = 4,
+        timeout: float = 30.0,
+    ):
+        """
+        :param url: WebUI address, such as http://localhost:8080
+        :type url: str
+        :param username: WebUI username, no login if not given, for
+        instances that don't require one from this host
+        :type username: str
+        :param password: WebUI password
+        :type password: str
+        :param max_connections: Most requests in flight at once
+        :type max_connections: int
+        :param timeout: Seconds to wait for a response
+        :type timeout: float
+        """
+        parts = urlsplit(url if "://" in url else f"http://{url}")
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported WebUI address {url}")
+        self.url = url
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        # Number of requests made, logins included
+        self.requests = 0
+        self._https = parts.scheme == "https"
+        self._host = parts.hostname
+        self._port = parts.port
+        self._prefix = parts.path.rstrip("/")
+        self._referer = f"{parts.scheme}://{parts.netloc}"
+        self._cookie = None
+        self._lock = threading.Lock()
+        # Idle connections, `None` stands in for one that isn't open yet
+        self._pool = queue.LifoQueue()
+        for _ in range(max_connections):
+            self._pool.put(None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _connect(self) -> http.client.HTTPConnection:
+        connection = (
+            http.client.HTTPSConnection
+            if self._https
+            else http.client.HTTPConnection
+        )
+        return connection(self._host, self._port, timeout=self.timeout)
+
+    def _send(
+        self,
+        connection: Optional[http.client.HTTPConnection],
+        method: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]],
+    ) -> Tuple[http.client.HTTPConnection, int, bytes, Optional[str]]:
+        path = f"{self._prefix}/api/v2/{endpoint}"
+        headers = {"Referer": self._referer}
+        if self._cookie is not None:
+            headers["Cookie"] = self._cookie
+        body = None
+        if params and method == "GET":
+            path += f"?{urlencode(params)}"
+        elif params:
+            body = urlencode(params)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        for attempt in range(2):
+            if connection is None:
+                connection = self._connect()
+            try:
+                connection.request(method, path, body, headers)
+                response = connection.getresponse()
+                # Read to the end, so the connection can be reused
+                data = response.read()
+            except _CONNECTION_ERRORS:
+                # Closed while idle, retried once on a new connection
+                connection.close()
+                connection = None
+                if attempt:
+                    raise
+                continue
+            with self._lock:
+                self.requests += 1
+            if response.will_close:
+                connection.close()
+                connection = None
+            return (
+                connection,
+                response.status,
+                data,
+                response.getheader("Set-Cookie"),
+            )
+
+    def request(
+        self,
+        method: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+    ) -> bytes:
+        """
+        Make an API request, logging in first if needed.
+        :param method: GET or POST
+        :type method: str
+        :param endpoint: API method, such as torrents/info
+        :type endpoint: str
+        :param params: Query parameters of a GET, form fields of a POST
+        :type params: dict
+        :return: Response body
+        :rtype: bytes
+        """
+        if self._cookie is None and self.username is not None:
+            self.login()
+        connection = self._pool.get()
+        try:
+            cookie = self._cookie
+            connection, status, data, _ = self._send(
+                connection, method, endpoint, params
+            )
+            if status == 403 and self.username is not None:
+                # The session expired, started again on the connection
+                # already held, the pool may have no other
+                connection = self._login(connection, cookie)
+                connection, status, data, _ = self._send(
+                    connection, method, endpoint, params
+                )
+        except BaseException:
+            if connection is not None:
+                connection.close()
+            self._pool.put(None)
+            raise
+        self._pool.put(connection)
+        if status != 200:
+            raise WebUIError(
+                status, data.decode("utf-8", "replace").strip() or endpoint
+            )
+        return data
+
+    def get_json(
+        self, endpoint: str, params: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        return json.loads(self.request("GET", endpoint, params))
+
+    def login(self):
+        """Start the session shared by every request."""
+        connection = self._pool.get()
+        try:
+            connection = self._login(connection, self._cookie)
+        except BaseException:
+            if connection is not None:
+                connection.close()
+            self._pool.put(None)
+            raise
+        self._pool.put(connection)
+
+    def _login(
+        self,
+        connection: Optional[http.client.HTTPConnection],
+        expired: Optional[str],
+    ) -> Optional[http.client.HTTPConnection]:
+        """
+        Log in on a connection taken from the pool, unless another request
+        already replaced the `expired` session. Returns the connection.
+        """
+        with self._lock:
+            if self._cookie != expired:
+                return connection
+        self.logger.debug(f"Logging in to {self.url} as {self.username}...")
+        connection, status, data, set_cookie = self._send(
+            connection,
+            "POST",
+            "auth/login",
+            {"username": self.username, "password": self.password or ""},
+        )
+        if status != 200 or data.strip() != b"Ok." or not set_cookie:
+            if connection is not None:
+                connection.close()
+            raise WebUIError(status, f"Unable to log in to {self.url}")
+        with self._lock:
+            if self._cookie == expired:
+                self._cookie = set_cookie.split(";", 1)[0]
+        return connection
+
+    def close(self):
+        """Close idle connections, later requests open new ones."""
+        closed = 0
+        while True:
+            try:
+                connection = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            if connection is not None:
+                connection.close()
+            closed += 1
+        for _ in range(closed):
+            self._pool.put(None)
+
+
+def _map(mapping: PathMapping, path: str) -> str:
+    """Map a path reported by the WebUI, whichever slashes it uses."""
+    if not path:
+        return path
+    new_path = mapping.sub(path)
+    if new_path == path:
+        new_path = mapping.sub(path, posix=True)
+    return new_path
+
+
+def _batches(hashes: List[str], batch_size: int):
+    for index in range(0, len(hashes), batch_size):
+        yield hashes[index : index + batch_size]
+
+
+class WebUI(object):
+    """
+    Migrates a running qBittorrent through its WebUI API, with no
+    downtime, instead of editing BT_backup while it is stopped.
+    qBittorrent applies the new locations itself, moving any data that is
+    still at the old location.
+    """
+
+    logger = logging.getLogger(__name__ + ".WebUI")
+
+    def __init__(
+        self,
+        url: str,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        max_workers: int = 4,
+        batch_size: int = 100,
+        timeout: float = 30.0,
+    ):
+        """
+        :param url: WebUI address, such as http://localhost:8080
+        :type url: str
+        :param username: WebUI username
+        :type username: str
+        :param password: WebUI password
+        :type password: str
+        :param max_workers: Most API requests in flight at once
+        :type max_workers: int
+        :param batch_size: Most torrents moved by a single request
+        :type batch_size: int
+        :param timeout: Seconds to wait for a response
+        :type timeout: float
+        """
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.client = WebUIClient(
+            url, username, password, max_workers, timeout
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.client.close()
+
+    def torrents(self) -> List[Dict[str, Any]]:
+        """Every torrent, as reported by torrents/info."""
+        return self.client.get_json("torrents/info")
+
+    def migrate(
+        self,
+        existing_path: Union[str, PathMapping],
+        new_path: Optional[str],
+        regex_path: bool = False,
+        target_os: Optional[TargetOS] = None,
+    ) -> RunSummary:
+        """
+        Apply a mapping to the save and download paths of every torrent,
+        and to the paths of their files, as a run would to BT_backup.
+        Torrents moved to the same location are moved together, up to
+        `batch_size` per request. Arguments are the same as for
+        `QBTBatchMove.run`.
+        :return: Summary of migrated torrents, by hash, including
+        per-torrent errors
+        :rtype: RunSummary
+        """
+        mapping = as_mapping(existing_path, new_path, regex_path)
+        start = time.perf_counter()
+        summary = RunSummary()
+        stats = summary.stats
+        self.logger.info(
+            f"🕵️ Searching {self.client.url} for torrents with path "
+            f"{', '.join(mapping.existing_paths)} ..."
+        )
+        with stats.timer("discovery"):
+            torrents = self.torrents()
+            renames = self._renames(
+                [
+                    torrent
+                    for torrent in torrents
+                    if self._may_rename(torrent, mapping)
+                ],
+                mapping,
+            )
+        stats.files_scanned = len(torrents)
+        # Hashes of the torrents moved to each location
+        locations: Dict[Tuple[str, str], List[str]] = {}
+        with stats.timer("rewrite"):
+            for torrent in torrents:
+                for change in self._changes(torrent, mapping, target_os):
+                    locations.setdefault(change, []).append(torrent["hash"])
+        moves = [
+            (batch, endpoint, {"hashes": "|".join(batch), key: path})
+            for (endpoint, key, path), hashes in locations.items()
+            for batch in _batches(hashes, self.batch_size)
+        ]
+        relevant = {
+            torrent_hash
+            for hashes, _, _ in renames + moves
+            for torrent_hash in hashes
+        }
+        stats.files_matched = len(relevant)
+        errors = {}
+        with stats.timer("write"):
+            # Files are renamed before their torrents are moved
+            errors.update(self._post_all(renames))
+            errors.update(self._post_all(moves))
+        for torrent_hash in sorted(relevant):
+            summary.results.append(
+                FileResult(Path(torrent_hash), errors.get(torrent_hash))
+            )
+        for result in summary.results:
+            stats.add_result(result)
+        stats.timings["total"] = time.perf_counter() - start
+        QBTBatchMove._log_summary(summary)
+        return summary
+
+    @staticmethod
+    def _changes(
+        torrent: Dict[str, Any],
+        mapping: PathMapping,
+        target_os: Optional[TargetOS],
+    ) -> List[Tuple[str, str, str]]:
+        """Endpoint, parameter and new path of each path that changes."""
+        changes = []
+        for key, endpoint, parameter in (
+            ("save_path", "torrents/setLocation", "location"),
+            ("download_path", "torrents/setDownloadPath", "path"),
+        ):
+            path = torrent.get(key)
+            if not path:
+                continue
+            new_path = _map(mapping, path)
+            if new_path == path:
+                continue
+            if target_os is not None:
+                new_path = convert_slashes(new_path, target_os)
+            changes.append((endpoint, parameter, new_path))
+        return changes
+
+    @staticmethod
+    def _may_rename(torrent: Dict[str, Any], mapping: PathMapping) -> bool:
+        """
+        Whether a rule can reach inside the files of a torrent, rather than
+        only its save path, so its files must be listed.
+        """
+        if mapping.regex:
+            return True
+        save_path = torrent.get("save_path", "").replace("\\", "/")
+        if not save_path:
+            return False
+        save_path = save_path.rstrip("/") + "/"
+        return any(
+            existing_path.replace("\\", "/").startswith(save_path)
+            for existing_path in mapping.existing_paths
+        )
+
+    def _renames(
+        self, torrents: List[Dict[str, Any]], mapping: PathMapping
+    ) -> List[Tuple[List[str], str, Dict[str, str]]]:
+        """
+        renameFile requests for the files whose path within their torrent
+        is changed by the mapping, like `mapped_files` in BT_backup.
+        """
+        renames = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for (torrent,), future in submit_bounded(
+                executor,
+                lambda torrent: self.client.get_json(
+                    "torrents/files", {"hash": torrent["hash"]}
+                ),
+                ((torrent,) for torrent in torrents),
+                self.max_workers * 2,
+            ):
+                for old_name, new_name in _renamed_files(
+                    torrent["save_path"],
+                    [file["name"] for file in future.result()],
+                    mapping,
+                ):
+                    renames.append(
+                        (
+                            [torrent["hash"]],
+                            "torrents/renameFile",
+                            {
+                                "hash": torrent["hash"],
+                                "oldPath": old_name,
+                                "newPath": new_name,
+                            },
+                        )
+                    )
+        return renames
+
+    def _post_all(
+        self, requests: List[Tuple[List[str], str, Dict[str, str]]]
+    ) -> Dict[str, BaseException]:
+        """Make POST requests, return the errors by torrent hash."""
+        errors = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for (hashes, endpoint, params), future in submit_bounded(
+                executor,
+                lambda _, endpoint, params: self.client.request(
+                    "POST", endpoint, params
+                ),
+                requests,
+                self.max_workers * 2,
+            ):
+                try:
+                    future.result()
+                except (OSError, WebUIError) as e:
+                    self.logger.debug(f"{endpoint} {params} failed: {e}")
+                    for torrent_hash in hashes:
+                        errors.setdefault(torrent_hash, e)
+        return errors
+
+
+def _renamed_files(
+    save_path: str, names: List[str], mapping: PathMapping
+) -> List[Tuple[str, str]]:
+    """
+    Old and new names of the files of a torrent, relative to its save path
+    and with forward slashes as the WebUI has them, that the mapping
+    renames within the torrent.
+    """
+    separator = "\\" if "\\" in save_path else "/"
+    save_path = save_path.rstrip("/\\") + separator
+    new_save_path = _map(mapping, save_path)
+    renamed = []
+    for name in names:
+        path = save_path + name.replace("/", separator)
+        new_path = _map(mapping, path)
+        if not new_path.startswith(new_save_path):
+            logger.warning(
+                f"⚠️ {path} would be mapped outside of the save path of "
+                f"its torrent, to {new_path}. Skipping!"
+            )
+            continue
+        new_name = new_path[len(new_save_path) :].replace(separator, "/")
+        if new_name != name:
+            renamed.append((name, new_name))
+    return renamed
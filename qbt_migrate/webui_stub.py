@@ -0,0 +1,254 @@
+import argparse
+import json
+import logging
+import secrets
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+
+logger = logging.getLogger(__name__)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep-alive, as qBittorrent does
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def setup(self):
+        super().setup()
+        with self.server.stub.lock:
+            self.server.stub.connections += 1
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _reply(self, status: int, body: Any = b""):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        self._handle(parts.path, parse_qs(parts.query))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8")
+        self._handle(urlsplit(self.path).path, parse_qs(body))
+
+    def _handle(self, path: str, params: Dict[str, List[str]]):
+        stub = self.server.stub
+        endpoint = path.split("/api/v2/", 1)[-1]
+        params = {key: values[0] for key, values in params.items()}
+        with stub.lock:
+            stub.requests.append((self.command, endpoint, params))
+        if endpoint == "auth/login":
+            if (params.get("username"), params.get("password")) != (
+                stub.username,
+                stub.password,
+            ):
+                return self._reply(200, b"Fails.")
+            sid = secrets.token_hex(16)
+            with stub.lock:
+                stub.sessions.add(sid)
+            self.send_response(200)
+            self.send_header("Set-Cookie", f"SID={sid}; HttpOnly; path=/")
+            self.send_header("Content-Length", "3")
+            self.end_headers()
+            return self.wfile.write(b"Ok.")
+        sid = (self.headers.get("Cookie") or "").partition("SID=")[2]
+        if stub.username is not None and sid not in stub.sessions:
+            return self._reply(403, b"Forbidden")
+        handler = stub.ENDPOINTS.get((self.command, endpoint))
+        if handler is None:
+            return self._reply(404, b"Not Found")
+        status, body = getattr(stub, handler)(params)
+        self._reply(status, body)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    stub: "StubWebUI"
+
+
+class StubWebUI(object):
+    """
+    Stand-in for the qBittorrent WebUI API, serving the endpoints used by
+    `WebUI`, so the WebUI backend can be tried and tested without a
+    running qBittorrent. Serves on a free local port, in a background
+    thread. Moves and renames are applied to `torrents`, and every request
+    is recorded in `requests` as (method, endpoint, params).
+    It can also be run on its own, with a JSON file of torrents:
+        python -m qbt_migrate.webui_stub torrents.json --port 8080
+    """
+
+    ENDPOINTS = {
+        ("GET", "torrents/info"): "_info",
+        ("GET", "torrents/files"): "_files",
+        ("POST", "torrents/setLocation"): "_set_location",
+        ("POST", "torrents/setDownloadPath"): "_set_download_path",
+        ("POST", "torrents/renameFile"): "_rename_file",
+    }
+
+    def __init__(
+        self,
+        torrents: Iterable[Dict[str, Any]],
+        username: Optional[str] = "admin",
+        password: Optional[str] = "adminadmin",
+        failing_locations: Iterable[str] = (),
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        """
+        :param torrents: Torrents as torrents/info reports them, with an
+        optional `files` list of file names
+        :type torrents: list[dict]
+        :param username: Required username, no login required if None
+        :type username: str
+        :param password: Required password
+        :type password: str
+        :param failing_locations: Locations torrents can't be moved to,
+        setLocation answers 409 as qBittorrent does for an unwritable one
+        :type failing_locations: list[str]
+        :param host: Address to listen on
+        :type host: str
+        :param port: Port to listen on, any free port if 0
+        :type port: int
+        """
+        self.torrents = {
+            torrent["hash"]: dict(torrent) for torrent in torrents
+        }
+        self.username = username
+        self.password = password
+        self.failing_locations = set(failing_locations)
+        # SIDs of logged in sessions, clear to expire them
+        self.sessions = set()
+        self.requests = []
+        # TCP connections accepted
+        self.connections = 0
+        self.lock = threading.Lock()
+        self._server = _Server((host, port), _Handler)
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def calls(self, endpoint: str) -> List[Dict[str, str]]:
+        """Parameters of every request made to an endpoint."""
+        return [
+            params for _, name, params in self.requests if name == endpoint
+        ]
+
+    def _hashes(self, params: Dict[str, str]) -> List[str]:
+        return [
+            torrent_hash
+            for torrent_hash in params.get("hashes", "").split("|")
+            if torrent_hash in self.torrents
+        ]
+
+    def _info(self, _):
+        with self.lock:
+            return 200, [
+                {
+                    key: value
+                    for key, value in torrent.items()
+                    if key != "files"
+                }
+                for torrent in self.torrents.values()
+            ]
+
+    def _files(self, params):
+        torrent = self.torrents.get(params.get("hash"))
+        if torrent is None:
+            return 404, b"Not Found"
+        with self.lock:
+            return 200, [
+                {"index": index, "name": name}
+                for index, name in enumerate(torrent.get("files", []))
+            ]
+
+    def _set_location(self, params):
+        location = params.get("location")
+        if not location:
+            return 400, b"Save path is empty"
+        if location in self.failing_locations:
+            return 409, b"Cannot make save path"
+        with self.lock:
+            for torrent_hash in self._hashes(params):
+                self.torrents[torrent_hash]["save_path"] = location
+        return 200, b""
+
+    def _set_download_path(self, params):
+        with self.lock:
+            for torrent_hash in self._hashes(params):
+                self.torrents[torrent_hash]["download_path"] = params.get(
+                    "path", ""
+                )
+        return 200, b""
+
+    def _rename_file(self, params):
+        torrent = self.torrents.get(params.get("hash"))
+        if torrent is None:
+            return 404, b"Not Found"
+        with self.lock:
+            files = torrent.get("files", [])
+            if params.get("oldPath") not in files or not params.get("newPath"):
+                return 409, b"Invalid path"
+            files[files.index(params["oldPath"])] = params["newPath"]
+        return 200, b""
+
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Serve a stand-in qBittorrent WebUI API"
+    )
+    parser.add_argument("torrents", help="JSON file with a list of torrents")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="adminadmin")
+    args = parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO)
+    with open(args.torrents, encoding="utf-8") as f:
+        torrents = json.load(f)
+    stub = StubWebUI(
+        torrents, args.username, args.password, host=args.host, port=args.port
+    )
+    logger.info(f"Serving {len(torrents)} torrents on {stub.url}...")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import pytest
+
+from qbt_migrate import backup_store
+from qbt_migrate.backup_store import (
+    BackupStore,
+    compress,
+    decompress,
+    default_store_path,
+)
+from qbt_migrate.enums import Compression
+
+
+@pytest.fixture
+def bt_backup(tmp_path):
+    bt_backup = tmp_path / "BT_backup"
+    bt_backup.mkdir()
+    for x in range(5):
+        (bt_backup / f"{x}.fastresume").write_bytes(b"d4:save" * (x + 1))
+        (bt_backup / f"{x}.torrent").write_bytes(b"torrent" * 100)
+    (bt_backup / "other.txt").write_text("not backed up")
+    return bt_backup
+
+
+def test_default_store_path():
+    assert default_store_path("/config/qBittorrent/BT_backup").as_posix() == (
+        "/config/qBittorrent/qbt_migrate_backups"
+    )
+
+
+@pytest.mark.parametrize(
+    "compression", [Compression.STORED, Compression.DEFLATE]
+)
+def test_compress(compression):
+    data = b"some data" * 100
+    assert decompress(compress(data, compression), compression) == data
+
+
+def test_compress_zstd_missing(monkeypatch):
+    monkeypatch.setattr(backup_store, "zstandard", None)
+    with pytest.raises(ValueError):
+        compress(b"data", Compression.ZSTD)
+    with pytest.raises(ValueError):
+        BackupStore("store").backup("BT_backup", compression=Compression.ZSTD)
+
+
+def test_backup_store(tmp_path, bt_backup):
+    store = BackupStore(tmp_path / "store")
+    assert store.manifests() == []
+    with pytest.raises(FileNotFoundError):
+        store.load_manifest()
+
+    first = store.backup(bt_backup, max_workers=2)
+    manifest = store.load_manifest(first)
+    assert sorted(manifest["files"]) == sorted(
+        [f"{x}.fastresume" for x in range(5)]
+        + [f"{x}.torrent" for x in range(5)]
+    )
+    # Identical .torrent files are stored once
+    blobs = [path for path in store.blobs_path.rglob("*") if path.is_file()]
+    assert len(blobs) == 6
+
+    # Only changed files are read and stored again
+    (bt_backup / "0.fastresume").write_bytes(b"changed")
+    second = store.backup(
+        bt_backup, include_torrents=False, compression=Compression.STORED
+    )
+    assert store.manifests() == [first, second]
+    assert len(store.load_manifest()["files"]) == 5
+    blobs = [path for path in store.blobs_path.rglob("*") if path.is_file()]
+    assert len(blobs) == 7
+
+    # Restore the first snapshot over the changed and deleted files
+    (bt_backup / "1.fastresume").unlink()
+    assert store.restore(bt_backup, first) == 10
+    assert (bt_backup / "0.fastresume").read_bytes() == b"d4:save"
+    assert (bt_backup / "1.fastresume").read_bytes() == b"d4:save" * 2
+    assert (bt_backup / "other.txt").is_file()
+    assert store.restore(bt_backup) == 5
+    assert (bt_backup / "0.fastresume").read_bytes() == b"changed"
+
+
+def test_backup_store_restore_corrupt(tmp_path, bt_backup):
+    store = BackupStore(tmp_path / "store")
+    store.backup(bt_backup, include_torrents=False)
+    blob = next(path for path in store.blobs_path.rglob("*") if path.is_file())
+    blob.write_bytes(compress(b"corrupt", Compression.DEFLATE))
+    with pytest.raises(ValueError):
+        store.restore(tmp_path / "restored")
@@ -0,0 +1,62 @@
+import json
+
+from benchmarks.__main__ import main
+from benchmarks.generate import RELEVANT_ROOT, generate_bt_backup
+from benchmarks.startup import main as startup_main
+from qbt_migrate import FastResume, QBTBatchMove
+from qbt_migrate.bencoding import bencode
+
+
+def test_generate_bt_backup(tmp_path):
+    bt_backup = generate_bt_backup(tmp_path / "a", 50, relevant=0.5, seed=1)
+    fast_resumes = sorted(bt_backup.glob("*.fastresume"))
+    torrents = sorted(bt_backup.glob("*.torrent"))
+    assert len(fast_resumes) == len(torrents) == 50
+    assert [file.stem for file in fast_resumes] == [
+        file.stem for file in torrents
+    ]
+    for file in fast_resumes:
+        fast_resume = FastResume(file)
+        assert fast_resume.save_path
+        torrent = bencode.decode(
+            (bt_backup / f"{file.stem}.torrent").read_bytes()
+        )
+        pieces = len(torrent["info"]["pieces"]) // 20
+        assert len(fast_resume._data["pieces"]) == pieces
+    relevant = list(
+        QBTBatchMove.discover_relevant_fast_resume(bt_backup, RELEVANT_ROOT)
+    )
+    assert 10 < len(relevant) < 40
+
+    # The same seed gives the same files
+    other = generate_bt_backup(tmp_path / "b", 50, relevant=0.5, seed=1)
+    for file in fast_resumes:
+        assert (other / file.name).read_bytes() == file.read_bytes()
+
+
+def test_benchmarks_main(tmp_path):
+    results_path = tmp_path / "results.json"
+    main(["-n", "10", "-r", "1", "--json", str(results_path)])
+    with open(results_path) as f:
+        results = json.load(f)
+    assert [result["scenario"] for result in results["results"]] == [
+        "discover",
+        "replace_save",
+        "backup_folder",
+        "run",
+        "run_streaming",
+        "run_async",
+    ]
+    for result in results["results"]:
+        assert result["peak_memory_mib"] > 0
+
+
+def test_startup_main(tmp_path):
+    results_path = tmp_path / "startup.json"
+    assert startup_main(["-r", "1", "--json", str(results_path)]) == 0
+    with open(results_path) as f:
+        result = json.load(f)
+    # --version doesn't import anything only a migration needs
+    assert result["heavy_modules"] == []
+    assert result["version_ms"] > 0
+    assert startup_main(["-r", "1", "--max-ms", "0"]) == 1
@@ -0,0 +1,124 @@
+import glob
+
+import bencodepy
+import pytest
+from bencodepy.exceptions import BencodeDecodeError
+
+from qbt_migrate.bencoding import (
+    PATH_KEYS,
+    bencode,
+    decode_keys,
+    iter_dict_items,
+    skip_value,
+    splice_dict,
+)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"i42e",
+        b"i-1e",
+        b"4:spam",
+        b"0:",
+        b"le",
+        b"l4:spami42ee",
+        b"d3:bar4:spam3:fooi42ee",
+        b"d1:ald1:bl1:ceeee",
+    ],
+)
+def test_skip_value(data: bytes):
+    assert skip_value(data + b"trailing", 0) == len(data)
+
+
+@pytest.mark.parametrize("data", [b"x", b"l4:spam", b"10:short", b"e"])
+def test_skip_value_invalid(data: bytes):
+    with pytest.raises((IndexError, ValueError)):
+        skip_value(data, 0)
+
+
+def test_iter_dict_items():
+    data = b"d3:bar4:spam3:fooli1ei2eee"
+    items = list(iter_dict_items(data))
+    assert [key for key, _, _ in items] == [b"bar", b"foo"]
+    assert [data[start:end] for _, start, end in items] == [
+        b"4:spam",
+        b"li1ei2ee",
+    ]
+    with pytest.raises(ValueError):
+        list(iter_dict_items(b"l4:spame"))
+    with pytest.raises(ValueError):
+        list(iter_dict_items(data + b"e"))
+
+
+def test_decode_keys():
+    for file in glob.glob("./tests/test_files/good*.fastresume"):
+        with open(file, "rb") as f:
+            data = f.read()
+        full = bencode.decode(data)
+        assert decode_keys(data) == {
+            key: value for key, value in full.items() if key in PATH_KEYS
+        }
+        assert decode_keys(data, ["info-hash"]) == {
+            "info-hash": full["info-hash"]
+        }
+
+
+def test_decode_keys_skips_large_values():
+    pieces = b"\x01" * 1024 * 1024
+    data = bencodepy.encode(
+        {
+            "pieces": pieces,
+            "peers": [{"ip": "127.0.0.1", "port": 6881}] * 100,
+            "save_path": "/some/test/path",
+        }
+    )
+    assert decode_keys(data) == {"save_path": "/some/test/path"}
+
+
+def test_decode_keys_invalid():
+    with open("./tests/test_files/bad.fastresume", "rb") as f:
+        data = f.read()
+    with pytest.raises(BencodeDecodeError):
+        decode_keys(data)
+    with pytest.raises(BencodeDecodeError):
+        decode_keys(b"d9:save_path")
+
+
+@pytest.mark.parametrize(
+    "values, expected",
+    [
+        ({}, b"d3:bbb1:x3:ddd1:ye"),
+        ({"bbb": "new"}, b"d3:bbb3:new3:ddd1:ye"),
+        ({"aaa": 1}, b"d3:aaai1e3:bbb1:x3:ddd1:ye"),
+        ({"ccc": [1]}, b"d3:bbb1:x3:cccli1ee3:ddd1:ye"),
+        ({"eee": "z"}, b"d3:bbb1:x3:ddd1:y3:eee1:ze"),
+        (
+            {"aaa": "a", "bbb": "b", "ccc": "c", "ddd": "d", "eee": "e"},
+            b"d3:aaa1:a3:bbb1:b3:ccc1:c3:ddd1:d3:eee1:ee",
+        ),
+    ],
+)
+def test_splice_dict(values: dict, expected: bytes):
+    data = b"d3:bbb1:x3:ddd1:ye"
+    assert b"".join(splice_dict(data, values)) == expected
+
+
+def test_splice_dict_preserves_bytes():
+    with open("./tests/test_files/good.fastresume", "rb") as f:
+        data = f.read()
+    new_mapped_files = ["/a/new/path/1", "/a/new/path/2"]
+    spliced = b"".join(
+        splice_dict(
+            data,
+            {"save_path": "/a/new/path", "mapped_files": new_mapped_files},
+        )
+    )
+    expected = bencode.decode(data)
+    expected["save_path"] = "/a/new/path"
+    expected["mapped_files"] = new_mapped_files
+    assert spliced == bencodepy.encode(expected)
+    assert spliced.startswith(data[: data.index(b"12:mapped_files")])
+
+    with pytest.raises(BencodeDecodeError):
+        splice_dict(b"d9:save_path", {"save_path": "/a/new/path"})
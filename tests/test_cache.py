@@ -0,0 +1,46 @@
+import os
+from pathlib import Path
+
+from qbt_migrate.cache import MetadataCache, default_cache_path
+
+
+PATHS = {
+    "save_path": "/some/test/path",
+    "qBt-savePath": "/some/test/path",
+    "qBt-downloadPath": None,
+}
+
+
+def test_default_cache_path():
+    assert default_cache_path("/config/qBittorrent/BT_backup") == Path(
+        "/config/qBittorrent/qbt_migrate_cache.sqlite"
+    )
+
+
+def test_metadata_cache(tmp_path):
+    file = tmp_path / "a.fastresume"
+    file.write_text("a")
+    stat = os.stat(file)
+    cache_path = tmp_path / "cache.sqlite"
+
+    with MetadataCache(cache_path) as cache:
+        assert len(cache) == 0
+        assert cache.get("a.fastresume", stat) is None
+        cache.put("a.fastresume", stat, PATHS)
+        cache.put("b.fastresume", stat, PATHS)
+        assert cache.get("a.fastresume", stat) == PATHS
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    # Entries persist between runs
+    with MetadataCache(cache_path) as cache:
+        assert len(cache) == 2
+        assert cache.get("a.fastresume", stat) == PATHS
+        cache.prune(["a.fastresume"])
+        assert cache.get("b.fastresume", stat) is None
+
+    # Changed files are not served from the cache
+    with MetadataCache(cache_path) as cache:
+        assert len(cache) == 1
+        file.write_text("changed")
+        os.utime(file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        assert cache.get("a.fastresume", os.stat(file)) is None
@@ -1,8 +1,10 @@
+import asyncio
 import glob
 import os
 import shutil
 import sys
 import tempfile
+import zipfile
 from pathlib import Path
 from tempfile import NamedTemporaryFile
 
@@ -10,8 +12,18 @@ import pytest
 from bencodepy.exceptions import BencodeDecodeError
 
 import qbt_migrate
+from qbt_migrate.backup_store import BackupStore
+from qbt_migrate.cache import MetadataCache
 from qbt_migrate.classes import FastResume, QBTBatchMove
-from qbt_migrate.enums import TargetOS
+from qbt_migrate.enums import (
+    BackupMode,
+    Durability,
+    TargetOS,
+    Verification,
+)
+from qbt_migrate.mapping import PathMapping
+from qbt_migrate.plan import PlanMismatchError
+from qbt_migrate.verify import MissingTargetsError
 
 
 @pytest.fixture
@@ -117,6 +129,292 @@ def test_qbt_batch_move_discover_relevant_fast_resume(temp_dir):
     assert len(fast_resume_files) == 3
 
 
+def test_qbt_batch_move_discover_relevant_fast_resume_prefilter(
+    monkeypatch, temp_dir
+):
+    for file in glob.glob("./tests/test_files/*.fastresume"):
+        file = Path(file)
+        shutil.copy(file, temp_dir / file.name)
+
+    decoded = []
+
+    class MockFastResume(FastResume):
+        def __init__(self, file_path, **kwargs):
+            decoded.append(Path(file_path).name)
+            super().__init__(file_path, **kwargs)
+
+    monkeypatch.setattr(qbt_migrate.classes, "FastResume", MockFastResume)
+
+    # Only files containing the needle are decoded, so the bad file is
+    # never parsed when searching for a path it does not contain
+    assert (
+        list(
+            QBTBatchMove.discover_relevant_fast_resume(
+                temp_dir, "/not/in/any/file", False, True
+            )
+        )
+        == []
+    )
+    assert decoded == []
+
+    fast_resume_files = list(
+        QBTBatchMove.discover_relevant_fast_resume(
+            temp_dir, r"^/some/(\w+)/path$", True, False
+        )
+    )
+    assert len(fast_resume_files) == 3
+    assert "good_not_relevant.fastresume" not in decoded
+
+
+def test_fastresume_load_candidate(temp_dir):
+    shutil.copy("./tests/test_files/good.fastresume", temp_dir)
+    file = temp_dir / "good.fastresume"
+    assert FastResume.load_candidate(file, "/not/relevant") is None
+    assert FastResume.load_candidate(file, "/some/test") is not None
+    assert FastResume.load_candidate(file, r"/some/\w+/path", True) is not None
+    assert FastResume.load_candidate(file, r"/other/\w+/path", True) is None
+    # No literal can be derived, so the file has to be decoded
+    assert FastResume.load_candidate(file, r"/(a|b)", True) is not None
+    with pytest.raises(FileNotFoundError):
+        FastResume.load_candidate(temp_dir / "missing.fastresume", "/some")
+
+
+def test_qbt_batch_move_discover_relevant_fast_resume_cache(
+    monkeypatch, temp_dir
+):
+    bt_backup = temp_dir / "BT_backup"
+    bt_backup.mkdir()
+    for file in glob.glob("./tests/test_files/good*.fastresume"):
+        shutil.copy(file, bt_backup)
+
+    decoded = []
+
+    class MockFastResume(FastResume):
+        def __init__(self, file_path, **kwargs):
+            decoded.append(Path(file_path).name)
+            super().__init__(file_path, **kwargs)
+
+    monkeypatch.setattr(qbt_migrate.classes, "FastResume", MockFastResume)
+
+    def discover(existing_path, use_processes=False):
+        decoded.clear()
+        with MetadataCache(temp_dir / "cache.sqlite") as cache:
+            return list(
+                QBTBatchMove.discover_relevant_fast_resume(
+                    bt_backup,
+                    existing_path,
+                    use_processes=use_processes,
+                    max_workers=2,
+                    cache=cache,
+                )
+            )
+
+    # The first run parses every file, even ones the prefilter would skip
+    assert discover("/no/match") == []
+    assert len(decoded) == 4
+    # Later runs answer from the cache
+    assert discover("/no/match") == []
+    assert decoded == []
+    assert len(discover("/some/test")) == 3
+    assert len(decoded) == 3
+
+    # Only changed files are parsed again
+    shutil.copy(
+        "./tests/test_files/good_not_relevant.fastresume",
+        bt_backup / "good.fastresume",
+    )
+    os.remove(bt_backup / "good_no_save_path.fastresume")
+    assert len(discover("/some/test", use_processes=True)) == 1
+    with MetadataCache(temp_dir / "cache.sqlite") as cache:
+        assert len(cache) == 3
+        assert cache.get(
+            "good.fastresume", os.stat(bt_backup / "good.fastresume")
+        ) == {
+            "save_path": "/not/relevant/path",
+            "qBt-savePath": "/not/relevant/path",
+            "qBt-downloadPath": None,
+        }
+
+
+def test_qbt_batch_move_run_cache(temp_dir):
+    bt_backup = temp_dir / "BT_backup"
+    bt_backup.mkdir()
+    for file in glob.glob("./tests/test_files/good*.fastresume"):
+        shutil.copy(file, bt_backup)
+    cache_path = temp_dir / "cache.sqlite"
+
+    for use_processes in (False, True):
+        qbt = QBTBatchMove(bt_backup)
+        summary = qbt.run(
+            "/some/test",
+            "/a/new/test",
+            create_backup=False,
+            use_processes=use_processes,
+            max_workers=2,
+            cache_path=cache_path,
+        )
+        assert summary.processed == 3
+        qbt.run(
+            "/a/new/test",
+            "/some/test",
+            create_backup=False,
+            use_processes=use_processes,
+            max_workers=2,
+            cache_path=cache_path,
+        )
+    with MetadataCache(cache_path) as cache:
+        assert len(cache) == 4
+
+
+def test_qbt_batch_move_plan_and_apply(temp_dir):
+    for file in glob.glob("./tests/test_files/good*.fastresume"):
+        shutil.copy(file, temp_dir)
+    originals = {file.name: file.read_bytes() for file in temp_dir.iterdir()}
+
+    qbt = QBTBatchMove(temp_dir)
+    plan = qbt.plan("/some/test", "/a/new/test")
+    assert len(plan) == 3
+    assert "good_not_relevant.fastresume" not in {
+        entry.file_name for entry in plan.entries
+    }
+    # Planning doesn't write anything
+    for file in temp_dir.iterdir():
+        assert file.read_bytes() == originals[file.name]
+    entry = next(
+        entry for entry in plan.entries if entry.file_name == "good.fastresume"
+    )
+    assert entry.old["save_path"] == "/some/test/path"
+    assert entry.new["save_path"] == "/a/new/test/path"
+
+    # Files changed since the plan was made are left alone
+    changed = temp_dir / "good_no_save_path.fastresume"
+    changed.write_bytes(originals["good.fastresume"])
+    summary = QBTBatchMove(temp_dir).apply_plan(plan, create_backup=False)
+    assert summary.processed == 3
+    assert summary.failed == 1
+    assert isinstance(summary.errors[changed], PlanMismatchError)
+    assert changed.read_bytes() == originals["good.fastresume"]
+
+    fast_resume = FastResume(temp_dir / "good.fastresume")
+    assert fast_resume.save_path == "/a/new/test/path"
+    assert fast_resume.qbt_save_path == "/a/new/test/path"
+    # Applying the plan gives the same result as a run
+    shutil.copy("./tests/test_files/good.fastresume", temp_dir / "run")
+    FastResume(temp_dir / "run").replace_paths(
+        "/some/test", "/a/new/test", create_backup=False
+    )
+    assert (temp_dir / "run").read_bytes() == fast_resume.encode()
+    assert not list(temp_dir.glob("*.bkup"))
+
+
+@pytest.mark.parametrize(
+    "durability, fsyncs, syncs",
+    [
+        (Durability.NONE, 0, 0),
+        (Durability.FILE, 3, 0),
+        (Durability.BATCH, 0, 1),
+    ],
+)
+def test_qbt_batch_move_run_durability(
+    monkeypatch, temp_dir, durability, fsyncs, syncs
+):
+    for file in glob.glob("./tests/test_files/good*.fastresume"):
+        shutil.copy(file, temp_dir)
+    calls = []
+    monkeypatch.setattr(
+        qbt_migrate.classes,
+        "sync_directory",
+        lambda path, file_paths: calls.append(
+            ("sync", path, sorted(file_paths))
+        ),
+    )
+    monkeypatch.setattr(os, "fsync", lambda fd: calls.append(("fsync", fd)))
+
+    summary = QBTBatchMove(temp_dir).run(
+        "/some/test", "/a/new/test", create_backup=False, durability=durability
+    )
+    assert summary.succeeded == 3
+    assert len([call for call in calls if call[0] == "fsync"]) == fsyncs
+    # Only the files written are synced, with their directory
+    written = sorted(result.file_path for result in summary.results)
+    assert calls.count(("sync", temp_dir, written)) == syncs
+    # Only the .fastresume files remain, no temp files
+    assert len(list(temp_dir.iterdir())) == 4
+
+
+def test_qbt_batch_move_run_backup_store(temp_dir):
+    bt_backup = temp_dir / "BT_backup"
+    bt_backup.mkdir()
+    for file in glob.glob("./tests/test_files/good*.fastresume"):
+        shutil.copy(file, bt_backup)
+    originals = {file.name: file.read_bytes() for file in bt_backup.iterdir()}
+
+    qbt = QBTBatchMove(bt_backup)
+    qbt.run("/some/test", "/a/new/test", backup_mode=BackupMode.STORE)
+    assert not list(bt_backup.glob("*.zip"))
+    store = BackupStore(temp_dir / "qbt_migrate_backups")
+    assert len(store.manifests()) == 1
+    store.restore(bt_backup)
+    for file in bt_backup.iterdir():
+        assert file.read_bytes() == originals[file.name]
+
+
+def test_qbt_batch_move_run_snapshot(temp_dir):
+    for file in glob.glob("./tests/test_files/good*.fastresume"):
+        shutil.copy(file, temp_dir)
+    originals = {file.name: file.read_bytes() for file in temp_dir.iterdir()}
+
+    qbt = QBTBatchMove(temp_dir)
+    summary = qbt.run(
+        "/some/test", "/a/new/test", backup_mode=BackupMode.SNAPSHOT
+    )
+    assert summary.succeeded == 3
+    (snapshot,) = temp_dir.glob("fastresume_backup*")
+    assert snapshot.is_dir()
+    # Migrated files were replaced, the linked originals are untouched
+    for file in snapshot.iterdir():
+        assert file.read_bytes() == originals[file.name]
+    assert len(list(snapshot.iterdir())) == 4
+
+
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_qbt_batch_move_run_stats(temp_dir, use_processes):
+    for file in glob.glob("./tests/test_files/*.fastresume"):
+        shutil.copy(file, temp_dir)
+    relevant = [
+        temp_dir / "good.fastresume",
+        temp_dir / "good_no_qbt_save_path.fastresume",
+        temp_dir / "good_no_save_path.fastresume",
+    ]
+    decoded_size = sum(file.stat().st_size for file in relevant)
+
+    summary = QBTBatchMove(temp_dir).run(
+        "/some/test",
+        "/a/new/test",
+        skip_bad_files=True,
+        max_workers=2,
+        use_processes=use_processes,
+    )
+    stats = summary.stats
+    assert stats.files_scanned == 5
+    # The irrelevant file is ruled out by the prefilter, bad is not
+    assert stats.files_decoded == 3
+    assert stats.bytes_read == decoded_size
+    assert stats.files_matched == 3
+    assert stats.files_skipped_bad == 1
+    assert stats.files_written == 3
+    assert stats.bytes_written == sum(file.stat().st_size for file in relevant)
+    assert stats.errors == 0
+    assert set(stats.timings) == {
+        "backup",
+        "discovery",
+        "rewrite",
+        "write",
+        "total",
+    }
+    assert stats.to_dict()["files_per_second"] > 0
+
+
 def test_qbt_batch_move_run_not_a_dir(temp_file):
     # Test path not exists
     qbt = QBTBatchMove("/not/a/valid/path")
@@ -134,7 +432,7 @@ def test_qbt_batch_move_run_create_backup_and_backup_folder(
         def __init__(self):
             self.called = False
 
-        def mock_create_backup(self, directory: str, archive: str):
+        def mock_create_backup(self, directory: str, archive: str, **__):
             self.called = True
             directory = Path(directory)
             archive = Path(archive)
@@ -159,28 +457,407 @@ def test_qbt_batch_move_run_create_backup_and_backup_folder(
     assert mock.called is True
 
 
+def test_qbt_batch_move_run_shares_directory_listing(monkeypatch, temp_dir):
+    for file in glob.glob("./tests/test_files/good*.fastresume"):
+        shutil.copy(file, temp_dir)
+    with open(temp_dir / "test.torrent", "w") as f:
+        f.write("torrent")
+
+    scans = []
+    scan_bt_backup = qbt_migrate.classes.scan_bt_backup
+
+    def mock_scan_bt_backup(folder_path):
+        scans.append(folder_path)
+        return scan_bt_backup(folder_path)
+
+    monkeypatch.setattr(
+        qbt_migrate.classes, "scan_bt_backup", mock_scan_bt_backup
+    )
+    monkeypatch.setattr(
+        qbt_migrate.methods, "scan_bt_backup", mock_scan_bt_backup
+    )
+
+    qbt = QBTBatchMove(temp_dir)
+    summary = qbt.run("/some/test", "/a/new/test", create_backup=True)
+    assert scans == [temp_dir]
+    assert summary.processed == 3
+    (archive,) = temp_dir.glob("fastresume_backup*.zip")
+    with zipfile.ZipFile(archive) as zf:
+        assert len(zf.namelist()) == 5
+
+
 def test_qbt_batch_move_run_replace_paths(monkeypatch, temp_dir):
     class MockFastResume(FastResume):
-        def __init__(self, *_, **__):
+        def __init__(self, file_path, *_, **__):
             self.called = False
+            self._file_path = Path(file_path)
+            self._raw = b"existing_path"
             self._data = {
                 "save_path": "existing_path",
                 "qBt-savePath": "existing_path",
             }
 
-        def replace_paths(self, *_, **__):
+        def apply_mapping(self, *_, **__):
             self.called = True
 
-    with open(temp_dir / "test.fastresume", "w") as _:
-        pass
+        def save(self, *_, **__):
+            return len(self._raw)
+
+    # Discovery only decodes files whose raw bytes contain the existing path
+    with open(temp_dir / "test.fastresume", "w") as f:
+        f.write("existing_path")
 
     monkeypatch.setattr(qbt_migrate.classes, "FastResume", MockFastResume)
 
     qbt = QBTBatchMove(temp_dir)
-    qbt.run("existing", "new", create_backup=False)
+    summary = qbt.run("existing", "new", create_backup=False)
     assert len(qbt.discovered_files) == 1
     for fast_resume in qbt.discovered_files:
         assert fast_resume.called
+    assert summary.processed == 1
+    assert summary.succeeded == 1
+    assert summary.failed == 0
+
+
+def test_qbt_batch_move_run_collects_errors(monkeypatch, temp_dir):
+    class MockFastResume(FastResume):
+        def __init__(self, file_path, *_, **__):
+            self._file_path = Path(file_path)
+            self._raw = b"existing_path"
+            self._data = {"save_path": "existing_path"}
+
+        def apply_mapping(self, *_, **__):
+            if self.file_path.name.startswith("bad"):
+                raise PermissionError(self.file_path)
+
+        def save(self, *_, **__):
+            return len(self._raw)
+
+    for x in range(10):
+        with open(temp_dir / f"good_{x}.fastresume", "w") as f:
+            f.write("existing_path")
+    for x in range(3):
+        with open(temp_dir / f"bad_{x}.fastresume", "w") as f:
+            f.write("existing_path")
+
+    monkeypatch.setattr(qbt_migrate.classes, "FastResume", MockFastResume)
+
+    qbt = QBTBatchMove(temp_dir)
+    summary = qbt.run("existing", "new", create_backup=False, max_workers=2)
+    assert summary.processed == 13
+    assert summary.succeeded == 10
+    assert summary.failed == 3
+    assert set(summary.errors) == {
+        temp_dir / f"bad_{x}.fastresume" for x in range(3)
+    }
+    for error in summary.errors.values():
+        assert isinstance(error, PermissionError)
+
+
+def test_qbt_batch_move_discover_relevant_fast_resume_processes(temp_dir):
+    for file in glob.glob("./tests/test_files/*.fastresume"):
+        file = Path(file)
+        shutil.copy(file, temp_dir / file.name)
+
+    with pytest.raises(BencodeDecodeError):
+        list(
+            QBTBatchMove.discover_relevant_fast_resume(
+                temp_dir, "/some/test", False, True, 2, True
+            )
+        )
+    fast_resume_files = list(
+        QBTBatchMove.discover_relevant_fast_resume(
+            temp_dir, "/some/test", False, False, 2, True
+        )
+    )
+    assert len(fast_resume_files) == 3
+    assert all(isinstance(fr, FastResume) for fr in fast_resume_files)
+
+
+def test_qbt_batch_move_run_processes(temp_dir):
+    for file in glob.glob("./tests/test_files/*.fastresume"):
+        file = Path(file)
+        shutil.copy(file, temp_dir / file.name)
+
+    qbt = QBTBatchMove(temp_dir)
+    with pytest.raises(BencodeDecodeError):
+        qbt.run(
+            "/some/test",
+            "/a/new/test",
+            create_backup=False,
+            max_workers=2,
+            use_processes=True,
+        )
+
+    # Restore files the first run may have already migrated
+    (temp_dir / "bad.fastresume").unlink()
+    for file in glob.glob("./tests/test_files/good*.fastresume"):
+        file = Path(file)
+        shutil.copy(file, temp_dir / file.name)
+    summary = qbt.run(
+        "/some/test",
+        "/a/new/test",
+        create_backup=False,
+        max_workers=2,
+        use_processes=True,
+    )
+    assert summary.processed == 3
+    assert summary.failed == 0
+    assert len(qbt.discovered_files) == 0
+    for result in summary.results:
+        fast_resume = FastResume(result.file_path)
+        assert fast_resume.save_path == "/a/new/test/path"
+        assert fast_resume.qbt_save_path == "/a/new/test/path"
+    assert not list(temp_dir.glob("*.bkup"))
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_qbt_batch_move_run_streaming(temp_dir, use_async):
+    for file in glob.glob("./tests/test_files/good*.fastresume"):
+        shutil.copy(file, temp_dir)
+
+    qbt = QBTBatchMove(temp_dir)
+    kwargs = {"create_backup": False, "max_workers": 2, "streaming": True}
+    if use_async:
+        summary = asyncio.run(
+            qbt.run_async("/some/test", "/a/new/test", **kwargs)
+        )
+    else:
+        summary = qbt.run("/some/test", "/a/new/test", **kwargs)
+    assert summary.processed == 3
+    assert summary.failed == 0
+    assert summary.stats.files_written == 3
+    assert len(qbt.discovered_files) == 0
+    for result in summary.results:
+        fast_resume = FastResume(result.file_path)
+        assert fast_resume.save_path == "/a/new/test/path"
+        assert fast_resume.qbt_save_path == "/a/new/test/path"
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_qbt_batch_move_run_verification(temp_dir, use_async):
+    bt_backup = temp_dir / "BT_backup"
+    bt_backup.mkdir()
+    for file in glob.glob("./tests/test_files/good*.fastresume"):
+        shutil.copy(file, bt_backup)
+    new_path = temp_dir / "new"
+    (new_path / "path").mkdir(parents=True)
+    (new_path / "path" / "mapped_file_1").touch()
+    qbt = QBTBatchMove(bt_backup)
+
+    def run(verification):
+        kwargs = {
+            "create_backup": False,
+            "max_workers": 2,
+            "verification": verification,
+        }
+        if use_async:
+            return asyncio.run(
+                qbt.run_async("/some/test", str(new_path), **kwargs)
+            )
+        return qbt.run("/some/test", str(new_path), **kwargs)
+
+    missing = [str(new_path / "path" / "mapped_file_2")]
+    summary = run(Verification.REFUSE)
+    assert summary.processed == 3
+    assert summary.failed == 3
+    assert all(
+        isinstance(error, MissingTargetsError)
+        for error in summary.errors.values()
+    )
+    assert list(summary.missing.values()) == [missing] * 3
+    assert summary.stats.files_missing_targets == 3
+    # The parent of the save path and the save path, listed once each
+    assert summary.stats.directories_listed == 2
+    assert "verify" in summary.stats.timings
+    for result in summary.results:
+        fast_resume = FastResume(result.file_path)
+        assert fast_resume.mapped_files[0] == "/some/test/path/mapped_file_1"
+
+    (new_path / "path" / "mapped_file_2").touch()
+    summary = run(Verification.REPORT)
+    assert summary.failed == 0
+    assert summary.missing == {}
+    for result in summary.results:
+        fast_resume = FastResume(result.file_path)
+        assert fast_resume.mapped_files[0] == str(
+            new_path / "path" / "mapped_file_1"
+        )
+
+
+def test_qbt_batch_move_plan_verification(temp_dir):
+    for file in glob.glob("./tests/test_files/good*.fastresume"):
+        shutil.copy(file, temp_dir)
+    new_path = temp_dir / "new"
+    (new_path / "path").mkdir(parents=True)
+    (new_path / "path" / "mapped_file_1").touch()
+    qbt = QBTBatchMove(temp_dir)
+
+    plan = qbt.plan("/some/test", str(new_path))
+    assert len(plan) == 3
+    # Missing mapped_file_2 is reported, the files are still planned
+    plan = qbt.plan(
+        "/some/test", str(new_path), verification=Verification.REPORT
+    )
+    assert len(plan) == 3
+    plan = qbt.plan(
+        "/some/test", str(new_path), verification=Verification.REFUSE
+    )
+    assert len(plan) == 0
+
+    with pytest.raises(ValueError):
+        qbt.run(
+            "/some/test",
+            str(new_path),
+            use_processes=True,
+            verification=Verification.REPORT,
+        )
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_qbt_batch_move_run_journal(monkeypatch, temp_dir, use_async):
+    bt_backup = temp_dir / "BT_backup"
+    bt_backup.mkdir()
+    for file in glob.glob("./tests/test_files/good*.fastresume"):
+        shutil.copy(file, bt_backup)
+    journal_path = temp_dir / "qbt_migrate.journal"
+    qbt = QBTBatchMove(bt_backup)
+
+    def run(**kwargs):
+        # Not idempotent, every file must be mapped exactly once
+        kwargs = {"create_backup": False, "max_workers": 1, **kwargs}
+        if use_async:
+            return asyncio.run(
+                qbt.run_async("/some/test", "/some/test/moved", **kwargs)
+            )
+        return qbt.run("/some/test", "/some/test/moved", **kwargs)
+
+    saves = []
+    save = FastResume.save
+
+    def interrupted_save(self, *args, **kwargs):
+        saves.append(self.file_path.name)
+        if len(saves) == 2:
+            raise KeyboardInterrupt
+        return save(self, *args, **kwargs)
+
+    monkeypatch.setattr(FastResume, "save", interrupted_save)
+    with pytest.raises(KeyboardInterrupt):
+        run(journal_path=journal_path)
+    monkeypatch.setattr(FastResume, "save", save)
+
+    summary = run(journal_path=journal_path, resume=True)
+    assert summary.failed == 0
+    # Work already queued may have finished after the interruption
+    assert summary.stats.files_skipped_done in (1, 2)
+    assert summary.processed == 3 - summary.stats.files_skipped_done
+    assert saves[1] in {result.file_path.name for result in summary.results}
+    for name in (
+        "good.fastresume",
+        "good_no_qbt_save_path.fastresume",
+        "good_no_save_path.fastresume",
+    ):
+        fast_resume = FastResume(bt_backup / name)
+        assert fast_resume.save_path == "/some/test/moved/path"
+    # Resuming a finished run has nothing left to do
+    summary = run(journal_path=journal_path, resume=True)
+    assert summary.stats.files_skipped_done == 3
+    assert summary.processed == 0
+
+    with pytest.raises(ValueError):
+        run(resume=True)
+    if not use_async:
+        with pytest.raises(ValueError):
+            run(journal_path=journal_path, use_processes=True)
+
+
+def test_qbt_batch_move_run_async(temp_dir):
+    for file in glob.glob("./tests/test_files/*.fastresume"):
+        shutil.copy(file, temp_dir)
+
+    qbt = QBTBatchMove(temp_dir)
+    with pytest.raises(BencodeDecodeError):
+        asyncio.run(
+            qbt.run_async("/some/test", "/a/new/test", create_backup=False)
+        )
+
+    # Restore files the first run may have already migrated
+    for file in glob.glob("./tests/test_files/good*.fastresume"):
+        shutil.copy(file, temp_dir)
+    cache_path = temp_dir / "cache.sqlite"
+    qbt = QBTBatchMove(temp_dir)
+    summary = asyncio.run(
+        qbt.run_async(
+            "/some/test",
+            "/a/new/test",
+            skip_bad_files=True,
+            max_workers=2,
+            cache_path=cache_path,
+            queue_size=1,
+        )
+    )
+    assert summary.processed == 3
+    assert summary.failed == 0
+    assert summary.stats.files_scanned == 5
+    assert summary.stats.files_skipped_bad == 1
+    assert summary.stats.files_written == 3
+    assert len(qbt.discovered_files) == 3
+    for result in summary.results:
+        fast_resume = FastResume(result.file_path)
+        assert fast_resume.save_path == "/a/new/test/path"
+        assert fast_resume.qbt_save_path == "/a/new/test/path"
+    assert len(list(temp_dir.glob("fastresume_backup*.zip"))) == 1
+    with MetadataCache(cache_path) as cache:
+        assert len(cache) == 4
+
+    with pytest.raises(NotADirectoryError):
+        asyncio.run(QBTBatchMove(temp_dir / "missing").run_async("/a", "/b"))
+
+
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_qbt_batch_move_run_mapping(monkeypatch, temp_dir, use_processes):
+    for file in glob.glob("./tests/test_files/good*.fastresume"):
+        shutil.copy(file, temp_dir)
+    writes = []
+    atomic_write = qbt_migrate.classes.atomic_write
+
+    def mock_atomic_write(file_path, *args, **kwargs):
+        writes.append(Path(file_path).name)
+        return atomic_write(file_path, *args, **kwargs)
+
+    monkeypatch.setattr(qbt_migrate.classes, "atomic_write", mock_atomic_write)
+    mapping = PathMapping(
+        [
+            ("/some/test", "/a/new/test"),
+            ("/not/relevant", "/now/relevant"),
+            ("/some/test/path/mapped_file_1", "/elsewhere/file_1"),
+        ]
+    )
+    summary = QBTBatchMove(temp_dir).run(
+        mapping,
+        None,
+        create_backup=False,
+        max_workers=2,
+        use_processes=use_processes,
+    )
+    assert summary.processed == 4
+    assert summary.failed == 0
+    if not use_processes:
+        # Every file is written once, however many rules match it
+        assert sorted(writes) == sorted(
+            file.name for file in temp_dir.iterdir()
+        )
+    fast_resume = FastResume(temp_dir / "good.fastresume")
+    assert fast_resume.save_path == "/a/new/test/path"
+    assert fast_resume.qbt_save_path == "/a/new/test/path"
+    # The longest existing path wins
+    assert fast_resume.mapped_files == [
+        "/elsewhere/file_1",
+        "/a/new/test/path/mapped_file_2",
+    ]
+    fast_resume = FastResume(temp_dir / "good_not_relevant.fastresume")
+    assert fast_resume.save_path == "/now/relevant/path"
+    assert fast_resume.qbt_save_path == "/now/relevant/path"
 
 
 def test_qbt_batch_move_update_fastresume(monkeypatch):
@@ -221,6 +898,92 @@ def test_fastresume_init(temp_dir):
         FastResume("/not/a/valid/file")
 
 
+def test_fastresume_init_lazy(temp_dir):
+    for file in glob.glob("./tests/test_files/good*.fastresume"):
+        file = Path(file)
+        shutil.copy(file, temp_dir / file.name)
+        eager = FastResume(temp_dir / file.name)
+        lazy = FastResume(temp_dir / file.name, lazy=True)
+        assert eager.projected is False
+        assert lazy.projected is True
+        assert set(lazy._data) <= {
+            "save_path",
+            "qBt-savePath",
+            "qBt-downloadPath",
+            "mapped_files",
+        }
+        assert lazy.save_path == eager.save_path
+        assert lazy.qbt_save_path == eager.qbt_save_path
+        assert lazy.qbt_download_path == eager.qbt_download_path
+        assert lazy.mapped_files == eager.mapped_files
+        # Slots only, no per-instance __dict__
+        assert not hasattr(lazy, "__dict__")
+
+    with pytest.raises(BencodeDecodeError):
+        FastResume("./tests/test_files/bad.fastresume", lazy=True)
+
+
+def test_fastresume_decode_all(temp_dir):
+    shutil.copy("./tests/test_files/good.fastresume", temp_dir)
+    fast_resume = FastResume(temp_dir / "good.fastresume", lazy=True)
+    fast_resume.replace_paths(
+        "/some/test", "/a/new/test", save_file=False, create_backup=False
+    )
+    # Path keys don't need the rest decoded, other keys do
+    assert fast_resume.get("save_path") == "/a/new/test/path"
+    assert fast_resume.projected is True
+    assert fast_resume.get("qBt-contentLayout") == "Original"
+    assert fast_resume.projected is False
+    assert fast_resume.save_path == "/a/new/test/path"
+
+    # Saving a lazily loaded file keeps every key
+    expected = FastResume(temp_dir / "good.fastresume")._data
+    fast_resume = FastResume(temp_dir / "good.fastresume", lazy=True)
+    fast_resume.save(temp_dir / "saved.fastresume")
+    assert FastResume(temp_dir / "saved.fastresume")._data == expected
+
+
+def test_fastresume_apply_mapping_mapped_files():
+    fast_resume = FastResume("./tests/test_files/good.fastresume", lazy=True)
+    mapped_files = list(fast_resume.mapped_files)
+    # mapped_files is only rewritten if one of its paths changes
+    fast_resume.apply_mapping(
+        PathMapping.from_paths("/some/test/path/elsewhere", "/x"),
+        save_file=False,
+        create_backup=False,
+    )
+    assert "mapped_files" not in fast_resume.changes()
+    assert fast_resume.mapped_files == mapped_files
+
+    fast_resume.apply_mapping(
+        PathMapping.from_paths("/some/test", "D:/new"),
+        TargetOS.WINDOWS,
+        save_file=False,
+        create_backup=False,
+    )
+    assert fast_resume.changes()["mapped_files"] == [
+        path.replace("/some/test", "D:/new").replace("/", "\\")
+        for path in mapped_files
+    ]
+
+
+def test_fastresume_init_dir_entry(temp_dir):
+    shutil.copy("./tests/test_files/good.fastresume", temp_dir)
+    os.makedirs(temp_dir / "not_a_file.fastresume")
+    entries = {entry.name: entry for entry in os.scandir(temp_dir)}
+
+    fast_resume = FastResume(entries["good.fastresume"])
+    assert fast_resume.file_path == temp_dir / "good.fastresume"
+    assert fast_resume.save_path == "/some/test/path"
+    assert fast_resume.stat().st_size == fast_resume.file_path.stat().st_size
+    assert FastResume(temp_dir / "good.fastresume").stat() == (
+        fast_resume.file_path.stat()
+    )
+
+    with pytest.raises(FileNotFoundError):
+        FastResume(entries["not_a_file.fastresume"])
+
+
 def test_fastresume_properties(temp_dir):
     for file in glob.glob("./tests/test_files/good*.fastresume"):
         file = Path(file)
@@ -250,6 +1013,10 @@ def test_fastresume_properties(temp_dir):
         )
 
 
+class PatchableFastResume(FastResume):
+    """`FastResume` with an instance `__dict__`, so methods can be patched"""
+
+
 class MockFastResumeSaveCaller:
     """
     Simple mock caller for `FastResume.save` method
@@ -259,8 +1026,9 @@ class MockFastResumeSaveCaller:
     def __init__(self):
         self.called = False
         self.saved_file_names = set()
+        self.backups = 0
 
-    def mock_save(self, fn=None):
+    def mock_save(self, fn=None, **__):
         self.called = True
         if fn is not None:
             self.saved_file_names.add(fn)
@@ -268,14 +1036,18 @@ class MockFastResumeSaveCaller:
     def mock_write(self, _, fn):
         self.mock_save(fn)
 
+    def mock_backup(self, *_):
+        self.backups += 1
+
     def reset(self):
         self.__init__()
 
 
 def test_fastresume_set_save_path(monkeypatch):
-    fast_resume = FastResume("./tests/test_files/good.fastresume")
+    fast_resume = PatchableFastResume("./tests/test_files/good.fastresume")
     mock = MockFastResumeSaveCaller()
     monkeypatch.setattr(fast_resume, "save", mock.mock_save)
+    monkeypatch.setattr(fast_resume, "backup", mock.mock_backup)
 
     # Test invalid save key
     with pytest.raises(KeyError):
@@ -334,20 +1106,18 @@ def test_fastresume_set_save_path(monkeypatch):
     mock.reset()
     # Test create_backup=False
     fast_resume.set_save_path("test", save_file=False, create_backup=False)
-    assert mock.called is False
-    # Test create_backup=True
+    assert mock.backups == 0
+    # Test create_backup=True, backups don't re-encode through `save`
     fast_resume.set_save_path("test", save_file=False, create_backup=True)
-    assert mock.called
-    assert len(mock.saved_file_names) == 1
-    for file_name in mock.saved_file_names:
-        assert "good.fastresume." in file_name.name
-        assert file_name.name.endswith(".bkup")
+    assert mock.backups == 1
+    assert mock.called is False
 
 
 def test_fastresume_set_save_paths(monkeypatch):
-    fast_resume = FastResume("./tests/test_files/good.fastresume")
+    fast_resume = PatchableFastResume("./tests/test_files/good.fastresume")
     mock = MockFastResumeSaveCaller()
     monkeypatch.setattr(fast_resume, "save", mock.mock_save)
+    monkeypatch.setattr(fast_resume, "backup", mock.mock_backup)
 
     # Test empty path ValueError
     with pytest.raises(ValueError):
@@ -386,25 +1156,88 @@ def test_fastresume_set_save_paths(monkeypatch):
     assert fast_resume.qbt_download_path is None
 
 
-def test_fastresume_save(monkeypatch):
-    fast_resume = FastResume("./tests/test_files/good.fastresume")
-    mock = MockFastResumeSaveCaller()
-    monkeypatch.setattr(qbt_migrate.classes.bencode, "write", mock.mock_write)
+def test_fastresume_backup(temp_dir):
+    file = temp_dir / "good.fastresume"
+    shutil.copy("./tests/test_files/good.fastresume", file)
+    original = file.read_bytes()
+    fast_resume = FastResume(file)
 
-    # Test default call
+    backup = fast_resume.backup()
+    assert backup.name.startswith("good.fastresume.")
+    assert backup.name.endswith(".bkup")
+    assert backup.read_bytes() == original
+
+    # Pending changes are not part of the backup
+    fast_resume.set_save_path(
+        "/new/path", save_file=False, create_backup=False
+    )
+    assert fast_resume.backup(temp_dir / "a.bkup").read_bytes() == original
+
+    # The loaded bytes are used once the file on disk has changed
+    file.write_bytes(b"de")
+    assert fast_resume.backup(temp_dir / "b.bkup").read_bytes() == original
+
+    # After a save the saved content is backed up
     fast_resume.save()
-    assert mock.called
-    assert len(mock.saved_file_names) == 1
-    for file_name in mock.saved_file_names:
-        assert file_name.name.endswith("good.fastresume")
+    saved = file.read_bytes()
+    assert fast_resume.backup(temp_dir / "c.bkup").read_bytes() == saved
+
+
+def test_fastresume_save(temp_dir):
+    shutil.copy("./tests/test_files/good.fastresume", temp_dir)
+    file = temp_dir / "good.fastresume"
+    original = file.read_bytes()
+    fast_resume = FastResume(file)
+
+    # Test default call, nothing changed so the file is byte-identical
+    fast_resume.save()
+    assert file.read_bytes() == original
 
-    mock.reset()
     # Test calling with file name
-    fast_resume.save("test_file")
-    assert mock.called
-    assert len(mock.saved_file_names) == 1
-    for file_name in mock.saved_file_names:
-        assert file_name == "test_file"
+    fast_resume.save(temp_dir / "test_file")
+    assert (temp_dir / "test_file").read_bytes() == original
+
+    # Only the changed values are spliced in
+    fast_resume.set_save_path(
+        "/a/new/path", save_file=False, create_backup=False
+    )
+    fast_resume.save(temp_dir / "test_file")
+    saved = (temp_dir / "test_file").read_bytes()
+    assert saved == original.replace(
+        b"9:save_path15:/some/test/path", b"9:save_path11:/a/new/path"
+    )
+    assert file.read_bytes() == original
+    expected = FastResume(file)._data
+    expected["save_path"] = "/a/new/path"
+    assert FastResume(temp_dir / "test_file")._data == expected
+
+    # Saving over the loaded file makes its bytes the new baseline
+    fast_resume.save()
+    assert file.read_bytes() == saved
+    assert fast_resume.encode() == saved
+
+
+def test_fastresume_save_adds_missing_keys(temp_dir):
+    shutil.copy(
+        "./tests/test_files/good_no_qbt_save_path.fastresume", temp_dir
+    )
+    file = temp_dir / "good_no_qbt_save_path.fastresume"
+    fast_resume = FastResume(file, lazy=True)
+    fast_resume.replace_paths(
+        "/some/test", "/a/new/test", save_file=True, create_backup=False
+    )
+    expected = FastResume(
+        "./tests/test_files/good_no_qbt_save_path.fastresume"
+    )._data
+    expected["save_path"] = "/a/new/test/path"
+    expected["qBt-savePath"] = "/a/new/test/path"
+    expected["mapped_files"] = [
+        path.replace("/some/test", "/a/new/test")
+        for path in expected["mapped_files"]
+    ]
+    assert FastResume(file)._data == expected
+    # Keys stay sorted, as bencode requires
+    assert file.read_bytes() == qbt_migrate.classes.bencode.encode(expected)
 
 
 def test_fastresume_replace_paths(monkeypatch):
@@ -1,16 +1,30 @@
+import json
 from pathlib import Path
 from unittest.mock import patch
 
 import pytest
 
-from qbt_migrate import __version__
+from qbt_migrate import FileResult, PathMapping, RunSummary, __version__
+from qbt_migrate.classes import QBTBatchMove
 from qbt_migrate.cli import main, parse_args
-from qbt_migrate.enums import TargetOS
+from qbt_migrate.enums import (
+    BackupMode,
+    Compression,
+    Durability,
+    TargetOS,
+    Verification,
+)
+from qbt_migrate.fleet import FleetReport
+from qbt_migrate.journal import Journal, run_arguments
+from qbt_migrate.plan import MigrationPlan, PlanEntry
+from qbt_migrate.webui_stub import StubWebUI
 
 
 class MockQBTBatchMove:
     instance = None
     run_call = None
+    plan_call = None
+    apply_plan_call = None
 
     def __init__(self, bt_backup_path: str = None):
         self.bt_backup_path = bt_backup_path
@@ -19,6 +33,20 @@ class MockQBTBatchMove:
     @classmethod
     def run(cls, *args, **kwargs):
         cls.run_call = (args, kwargs)
+        return RunSummary()
+
+    @classmethod
+    def plan(cls, *args, **kwargs):
+        cls.plan_call = (args, kwargs)
+        return MigrationPlan(
+            "/bt/BT_backup",
+            [PlanEntry("a.fastresume", "0" * 64, {"save_path": "e"}, {})],
+        )
+
+    @classmethod
+    def apply_plan(cls, plan, **kwargs):
+        cls.apply_plan_call = (plan, kwargs)
+        return RunSummary()
 
     @classmethod
     def add_instance(cls, instance):
@@ -37,6 +65,10 @@ class MockUserInput:
             return cur
 
 
+def no_input(prompt):
+    raise AssertionError(f"Unexpected prompt {prompt}")
+
+
 def test_parse_args_defaults():
     # Check defaults
     args = parse_args([])
@@ -49,6 +81,10 @@ def test_parse_args_defaults():
             "target_os",
             "bt_backup_path",
             "skip_bad_files",
+            "jobs",
+            "processes",
+            "cache",
+            "cache_path",
             "log_level",
         ]
     )
@@ -58,6 +94,10 @@ def test_parse_args_defaults():
     assert args.target_os is None
     assert args.bt_backup_path is None
     assert args.skip_bad_files is False
+    assert args.jobs is None
+    assert args.processes is False
+    assert args.cache is False
+    assert args.cache_path is None
     assert args.log_level == "INFO"
 
 
@@ -75,6 +115,10 @@ def test_parse_args_shorthand():
             "-b",
             "bt-backup-path",
             "-s",
+            "-j",
+            "4",
+            "-p",
+            "-c",
             "-l",
             "DEBUG",
         ]
@@ -85,6 +129,9 @@ def test_parse_args_shorthand():
     assert args.target_os == "Linux"
     assert args.bt_backup_path == "bt-backup-path"
     assert args.skip_bad_files is True
+    assert args.jobs == 4
+    assert args.processes is True
+    assert args.cache is True
     assert args.log_level == "DEBUG"
 
 
@@ -102,6 +149,12 @@ def test_parse_args_longhand():
             "--bt-backup-path",
             "bt-backup-path",
             "--skip-bad-files",
+            "--jobs",
+            "4",
+            "--processes",
+            "--cache",
+            "--cache-path",
+            "cache-path",
             "--log-level",
             "DEBUG",
         ]
@@ -112,6 +165,10 @@ def test_parse_args_longhand():
     assert args.target_os == "Linux"
     assert args.bt_backup_path == "bt-backup-path"
     assert args.skip_bad_files is True
+    assert args.jobs == 4
+    assert args.processes is True
+    assert args.cache is True
+    assert args.cache_path == "cache-path"
     assert args.log_level == "DEBUG"
 
 
@@ -127,6 +184,21 @@ def test_parse_args_target_os():
         args = parse_args(["-t", "windows"])
 
 
+def test_parse_args_durability():
+    assert parse_args([]).durability == "none"
+    assert parse_args(["--durability", "batch"]).durability == "batch"
+    with pytest.raises(SystemExit):
+        parse_args(["--durability", "always"])
+
+
+def test_parse_args_jobs():
+    assert parse_args(["-j", "1"]).jobs == 1
+    with pytest.raises(SystemExit):
+        parse_args(["-j", "0"])
+    with pytest.raises(SystemExit):
+        parse_args(["-j", "many"])
+
+
 def test_main_version_check(monkeypatch):
     monkeypatch.setattr("sys.argv", ["qbt_migrate", "-v"])
 
@@ -137,6 +209,16 @@ def test_main_version_check(monkeypatch):
         main()
 
 
+def test_parse_args_no_discovery(monkeypatch):
+    def discover_bt_backup_path():
+        raise AssertionError("BT_backup discovered to build the parser")
+
+    monkeypatch.setattr(
+        "qbt_migrate.methods.discover_bt_backup_path", discover_bt_backup_path
+    )
+    assert parse_args(["-b", "/bt"]).bt_backup_path == "/bt"
+
+
 def test_main_with_inputs(monkeypatch):
     mock_user_input = MockUserInput(
         ["bt-backup-path", "existing-path", "new-path", "no", "windows"]
@@ -184,6 +266,7 @@ def test_main_with_args(monkeypatch):
     assert MockQBTBatchMove.run_call[0][3] is TargetOS.WINDOWS
     assert MockQBTBatchMove.run_call[0][4] is True
     assert MockQBTBatchMove.run_call[0][5] is True
+    assert MockQBTBatchMove.run_call[1]["streaming"] is True
 
 
 def test_main_invalid_input_loops(monkeypatch):
@@ -242,3 +325,470 @@ def test_main_target_os_auto_detect(monkeypatch):
     monkeypatch.setattr("builtins.input", lambda _: mock_user_input.next())
     main()
     assert MockQBTBatchMove.run_call[0][3] is TargetOS.WINDOWS
+
+
+def test_main_failed_files_exit_code(monkeypatch):
+    class FailingQBTBatchMove(MockQBTBatchMove):
+        @classmethod
+        def run(cls, *args, **kwargs):
+            super().run(*args, **kwargs)
+            return RunSummary(
+                [FileResult(Path("a.fastresume"), OSError("disk full"))]
+            )
+
+    monkeypatch.setattr("qbt_migrate.cli.QBTBatchMove", FailingQBTBatchMove)
+    monkeypatch.setattr(
+        "sys.argv",
+        ["qbt_migrate", "-b", "b", "-e", "e", "-n", "n", "-r", "-t", "Linux"],
+    )
+    assert main() == 1
+    assert FailingQBTBatchMove.run_call[1]["max_workers"] is None
+    assert FailingQBTBatchMove.run_call[1]["use_processes"] is False
+    assert FailingQBTBatchMove.run_call[1]["cache_path"] is None
+    assert FailingQBTBatchMove.run_call[1]["durability"] is Durability.NONE
+    assert FailingQBTBatchMove.run_call[1]["backup_mode"] is BackupMode.ZIP
+
+
+def test_main_cache_path(monkeypatch):
+    monkeypatch.setattr("qbt_migrate.cli.QBTBatchMove", MockQBTBatchMove)
+    argv = ["qbt_migrate", "-b", "/bt/BT_backup", "-e", "e", "-n", "n", "-r"]
+    argv += ["-t", "Linux"]
+    monkeypatch.setattr("sys.argv", argv + ["--cache"])
+    main()
+    assert MockQBTBatchMove.run_call[1]["cache_path"] == Path(
+        "/bt/qbt_migrate_cache.sqlite"
+    )
+    monkeypatch.setattr("sys.argv", argv + ["--cache-path", "/tmp/c.db"])
+    main()
+    assert MockQBTBatchMove.run_call[1]["cache_path"] == "/tmp/c.db"
+
+
+def test_main_verify(monkeypatch):
+    monkeypatch.setattr("qbt_migrate.cli.QBTBatchMove", MockQBTBatchMove)
+    argv = ["qbt_migrate", "-b", "/bt/BT_backup", "-e", "e", "-n", "n", "-r"]
+    argv += ["-t", "Linux"]
+    monkeypatch.setattr("sys.argv", argv)
+    main()
+    assert MockQBTBatchMove.run_call[1]["verification"] is Verification.NONE
+    monkeypatch.setattr("sys.argv", argv + ["--verify", "refuse"])
+    main()
+    assert MockQBTBatchMove.run_call[1]["verification"] is Verification.REFUSE
+    monkeypatch.setattr("sys.argv", argv + ["--verify", "report", "-d"])
+    main()
+    assert MockQBTBatchMove.plan_call[1]["verification"] is Verification.REPORT
+    for unsupported in (["-p"], ["--torrents-db"]):
+        monkeypatch.setattr(
+            "sys.argv", argv + ["--verify", "report"] + unsupported
+        )
+        assert main() == 1
+
+
+def test_main_dry_run(monkeypatch, tmp_path):
+    monkeypatch.setattr("qbt_migrate.cli.QBTBatchMove", MockQBTBatchMove)
+    MockQBTBatchMove.run_call = None
+    argv = ["qbt_migrate", "-b", "/bt/BT_backup", "-e", "e", "-n", "n", "-r"]
+    argv += ["-t", "Linux"]
+    monkeypatch.setattr("sys.argv", argv + ["--dry-run"])
+    main()
+    assert MockQBTBatchMove.plan_call[0][:2] == ("e", "n")
+    assert MockQBTBatchMove.run_call is None
+
+    plan_path = tmp_path / "plan.json"
+    monkeypatch.setattr("sys.argv", argv + ["--plan-out", str(plan_path)])
+    main()
+    assert MockQBTBatchMove.run_call is None
+    plan = MigrationPlan.load(plan_path)
+    assert plan.entries[0].file_name == "a.fastresume"
+
+    # Applying needs neither paths nor input
+    monkeypatch.setattr("builtins.input", None)
+    monkeypatch.setattr(
+        "sys.argv", ["qbt_migrate", "--apply-plan", str(plan_path), "-j", "2"]
+    )
+    assert main() is None
+    assert MockQBTBatchMove.instance.bt_backup_path == "/bt/BT_backup"
+    assert MockQBTBatchMove.apply_plan_call == (
+        plan,
+        {
+            "max_workers": 2,
+            "durability": Durability.NONE,
+            "backup_mode": BackupMode.ZIP,
+            "backup_path": None,
+            "compression": Compression.DEFLATE,
+        },
+    )
+    assert MockQBTBatchMove.run_call is None
+
+
+def test_main_backup_store(monkeypatch, tmp_path):
+    monkeypatch.setattr("qbt_migrate.cli.QBTBatchMove", MockQBTBatchMove)
+    argv = ["qbt_migrate", "-b", "/bt/BT_backup", "-e", "e", "-n", "n", "-r"]
+    argv += ["-t", "Linux", "--backup-mode", "store"]
+    argv += ["--backup-path", "/backups", "--compression", "stored"]
+    monkeypatch.setattr("sys.argv", argv)
+    main()
+    assert MockQBTBatchMove.run_call[1]["backup_mode"] is BackupMode.STORE
+    assert MockQBTBatchMove.run_call[1]["backup_path"] == "/backups"
+    assert MockQBTBatchMove.run_call[1]["compression"] is Compression.STORED
+
+
+def test_main_restore(monkeypatch, tmp_path):
+    restores = []
+
+    class MockBackupStore:
+        def __init__(self, store_path):
+            self.store_path = store_path
+
+        def restore(self, *args, **kwargs):
+            restores.append((self.store_path, args, kwargs))
+
+    monkeypatch.setattr("qbt_migrate.cli.BackupStore", MockBackupStore)
+    monkeypatch.setattr("builtins.input", None)
+    monkeypatch.setattr(
+        "sys.argv", ["qbt_migrate", "-b", "/bt/BT_backup", "--restore"]
+    )
+    main()
+    monkeypatch.setattr(
+        "sys.argv",
+        ["qbt_migrate", "-b", "/bt/BT_backup", "--restore", "20240101"],
+    )
+    main()
+    assert restores == [
+        (
+            Path("/bt/qbt_migrate_backups"),
+            (Path("/bt/BT_backup"), None),
+            {"max_workers": None},
+        ),
+        (
+            Path("/bt/qbt_migrate_backups"),
+            (Path("/bt/BT_backup"), "20240101"),
+            {"max_workers": None},
+        ),
+    ]
+
+
+def test_main_stats(monkeypatch, tmp_path, capsys):
+    class StatsQBTBatchMove(MockQBTBatchMove):
+        @classmethod
+        def run(cls, *args, **kwargs):
+            summary = super().run(*args, **kwargs)
+            summary.stats.files_scanned = 10
+            summary.stats.files_written = 4
+            summary.stats.timings["total"] = 2.0
+            return summary
+
+    monkeypatch.setattr("qbt_migrate.cli.QBTBatchMove", StatsQBTBatchMove)
+    argv = [
+        "qbt_migrate",
+        "-b",
+        "b",
+        "-e",
+        "e",
+        "-n",
+        "n",
+        "-r",
+        "-t",
+        "Linux",
+    ]
+    monkeypatch.setattr("sys.argv", argv + ["--stats"])
+    main()
+    stats = json.loads(capsys.readouterr().out)
+    assert stats["files_scanned"] == 10
+    assert stats["files_per_second"] == 2.0
+
+    stats_path = tmp_path / "stats.json"
+    monkeypatch.setattr("sys.argv", argv + ["--stats", str(stats_path)])
+    main()
+    with open(stats_path) as f:
+        assert json.load(f)["files_written"] == 4
+
+
+def test_main_mappings(monkeypatch, tmp_path):
+    monkeypatch.setattr("qbt_migrate.cli.QBTBatchMove", MockQBTBatchMove)
+    monkeypatch.setattr("builtins.input", None)
+    map_file = tmp_path / "map.tsv"
+    map_file.write_text("/mnt/tv\t/srv/tv\n", encoding="utf-8")
+    argv = ["qbt_migrate", "-b", "b", "-r", "-t", "Linux"]
+    monkeypatch.setattr(
+        "sys.argv",
+        argv + ["-m", "/data", "/srv", "--map-file", str(map_file)],
+    )
+    main()
+    mapping, new_path = MockQBTBatchMove.run_call[0][:2]
+    assert isinstance(mapping, PathMapping)
+    assert mapping.rules == [("/data", "/srv"), ("/mnt/tv", "/srv/tv")]
+    assert mapping.regex is True
+    assert new_path is None
+
+    # -e and -n are the first rule
+    monkeypatch.setattr(
+        "sys.argv", argv + ["-e", "/a", "-n", "/b", "--map", "/c", "/d"]
+    )
+    main()
+    assert MockQBTBatchMove.run_call[0][0].rules == [
+        ("/a", "/b"),
+        ("/c", "/d"),
+    ]
+
+    # A single rule is passed as plain paths
+    monkeypatch.setattr(
+        "sys.argv",
+        ["qbt_migrate", "-b", "b", "-r", "--map", "C:\\data", "/data"],
+    )
+    monkeypatch.setattr("builtins.input", lambda _: "")
+    main()
+    assert MockQBTBatchMove.run_call[0][:2] == ("C:\\data", "/data")
+    assert MockQBTBatchMove.run_call[0][3] is TargetOS.POSIX
+
+
+def test_main_torrents_db(monkeypatch):
+    migrations = []
+
+    class MockTorrentsDB:
+        def __init__(self, db_path):
+            self.db_path = db_path
+
+        def migrate(self, *args, **kwargs):
+            migrations.append((self.db_path, args, kwargs))
+            return RunSummary()
+
+    monkeypatch.setattr("qbt_migrate.cli.QBTBatchMove", MockQBTBatchMove)
+    monkeypatch.setattr("qbt_migrate.cli.TorrentsDB", MockTorrentsDB)
+    MockQBTBatchMove.run_call = None
+    argv = ["qbt_migrate", "-b", "/bt/BT_backup", "-e", "e", "-n", "n", "-r"]
+    argv += ["-t", "Linux", "--torrents-db"]
+    monkeypatch.setattr("sys.argv", argv)
+    assert main() is None
+    monkeypatch.setattr("sys.argv", argv + ["/other/torrents.db", "-s"])
+    main()
+    assert migrations == [
+        (
+            Path("/bt/torrents.db"),
+            ("e", "n", True, TargetOS.POSIX),
+            {"skip_bad_files": False},
+        ),
+        (
+            "/other/torrents.db",
+            ("e", "n", True, TargetOS.POSIX),
+            {"skip_bad_files": True},
+        ),
+    ]
+    assert MockQBTBatchMove.run_call is None
+
+    monkeypatch.setattr("sys.argv", argv + ["--dry-run"])
+    assert main() == 1
+    for unsupported in (
+        ["--journal"],
+        ["--resume"],
+        ["-p"],
+        ["-c"],
+        ["--durability", "file"],
+        ["--backup-mode", "store"],
+        ["--backup-path", "/backups"],
+        ["--compression", "zstd"],
+    ):
+        monkeypatch.setattr("sys.argv", argv + unsupported)
+        assert main() == 1
+    assert len(migrations) == 2
+
+    # BT_backup isn't asked for when the database is given
+    monkeypatch.setattr("builtins.input", no_input)
+    monkeypatch.setattr(
+        "sys.argv",
+        ["qbt_migrate", "-e", "e", "-n", "n", "-r", "-t", "Linux"]
+        + ["--torrents-db", "/other/torrents.db"],
+    )
+    main()
+    assert migrations[-1][0] == "/other/torrents.db"
+
+
+def test_main_resume(monkeypatch, tmp_path, caplog):
+    bt_backup = tmp_path / "BT_backup"
+    journal_path = tmp_path / "qbt_migrate.journal"
+    Journal(
+        journal_path,
+        run_arguments(
+            bt_backup,
+            PathMapping([("/a", "D:\\a"), ("/b", "D:\\b")]),
+            TargetOS.WINDOWS,
+        ),
+    ).close()
+    monkeypatch.setattr("qbt_migrate.cli.QBTBatchMove", MockQBTBatchMove)
+    monkeypatch.setattr(
+        "sys.argv", ["qbt_migrate", "-b", str(bt_backup), "--resume"]
+    )
+    main()
+    # Paths and options come from the journal, no new backup is made
+    args, kwargs = MockQBTBatchMove.run_call
+    assert isinstance(args[0], PathMapping)
+    assert args[0].rules == [("/a", "D:\\a"), ("/b", "D:\\b")]
+    assert args[2:5] == (False, TargetOS.WINDOWS, False)
+    assert kwargs["journal_path"] == journal_path
+    assert kwargs["resume"] is True
+
+    monkeypatch.setattr(
+        "sys.argv",
+        ["qbt_migrate", "-b", str(bt_backup), "-e", "/a", "-n", "/c"]
+        + ["-r", "-t", "Linux", "--journal", str(tmp_path / "other")],
+    )
+    main()
+    args, kwargs = MockQBTBatchMove.run_call
+    assert args[:5] == ("/a", "/c", True, TargetOS.POSIX, True)
+    assert kwargs["journal_path"] == str(tmp_path / "other")
+    assert kwargs["resume"] is False
+
+    # Options not given are still taken from the journal, without prompts
+    monkeypatch.setattr("builtins.input", no_input)
+    monkeypatch.setattr(
+        "sys.argv",
+        ["qbt_migrate", "-b", str(bt_backup), "--resume"]
+        + ["-e", "/a", "-n", "D:\\a"],
+    )
+    main()
+    args, kwargs = MockQBTBatchMove.run_call
+    assert args[:4] == ("/a", "D:\\a", False, TargetOS.WINDOWS)
+    assert kwargs["resume"] is True
+
+    monkeypatch.setattr(
+        "sys.argv", ["qbt_migrate", "-b", str(bt_backup), "--resume", "-p"]
+    )
+    assert main() == 1
+
+    # Reported, not raised
+    monkeypatch.setattr("qbt_migrate.cli.QBTBatchMove", QBTBatchMove)
+    bt_backup.mkdir()
+    monkeypatch.setattr(
+        "sys.argv",
+        ["qbt_migrate", "-b", str(bt_backup), "--resume", "-e", "/a"]
+        + ["-n", "/c", "-r", "-t", "Linux"],
+    )
+    assert main() == 1
+    assert "different arguments" in caplog.text
+    monkeypatch.setattr(
+        "sys.argv",
+        ["qbt_migrate", "-b", str(bt_backup), "--resume", "--journal"]
+        + [str(tmp_path / "missing.journal")],
+    )
+    assert main() == 1
+    journal_path.write_text("not a journal\n")
+    monkeypatch.setattr(
+        "sys.argv", ["qbt_migrate", "-b", str(bt_backup), "--resume"]
+    )
+    assert main() == 1
+    assert "is not a journal" in caplog.text
+
+
+def test_main_job_file(monkeypatch, tmp_path, capsys):
+    job_file = tmp_path / "job.json"
+    job_file.write_text(
+        json.dumps(
+            {
+                "max_workers": 4,
+                "defaults": {"existing_path": "/a", "new_path": "/b"},
+                "instances": [
+                    {"name": "gone", "bt_backup_path": str(tmp_path / "gone")}
+                ],
+            }
+        )
+    )
+    monkeypatch.setattr(
+        "sys.argv",
+        ["qbt_migrate", "--job-file", str(job_file), "-j", "2", "--stats"],
+    )
+    # The missing BT_backup fails the run and is in the report
+    assert main() == 1
+    report = json.loads(capsys.readouterr().out)
+    assert (report["instances"], report["failed"]) == (1, 1)
+    assert report["results"][0]["name"] == "gone"
+
+    jobs = []
+
+    def run_fleet(job):
+        jobs.append(job)
+        return FleetReport()
+
+    monkeypatch.setattr("qbt_migrate.cli.run_fleet", run_fleet)
+    monkeypatch.setattr(
+        "sys.argv", ["qbt_migrate", "--job-file", str(job_file)]
+    )
+    assert main() is None
+    assert jobs[0].max_workers == 4
+
+
+def test_main_watch(monkeypatch):
+    calls = []
+
+    class MockWatcher:
+        def __init__(self, bt_backup_path, *args, **kwargs):
+            calls.append(("init", (bt_backup_path,) + args, kwargs))
+            self.summary = RunSummary(
+                [FileResult(Path("a.fastresume"), ValueError("bad"))]
+            )
+
+        def start(self):
+            # Before the run, so no file is missed
+            assert MockQBTBatchMove.run_call is None
+            calls.append(("start",))
+
+        def written(self, summary):
+            calls.append(("written", summary))
+
+        def watch(self):
+            calls.append(("watch",))
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr("qbt_migrate.cli.QBTBatchMove", MockQBTBatchMove)
+    monkeypatch.setattr("qbt_migrate.cli.Watcher", MockWatcher)
+    MockQBTBatchMove.run_call = None
+    argv = ["qbt_migrate", "-b", "/bt/BT_backup", "-e", "e", "-n", "n", "-r"]
+    argv += ["-t", "Linux", "--watch", "--debounce", "0.5"]
+    monkeypatch.setattr("sys.argv", argv + ["--poll-interval", "10"])
+    # Interrupted, with a file that failed while watching
+    assert main() == 1
+    assert [call[0] for call in calls] == ["init", "start", "written", "watch"]
+    assert calls[0][1] == (
+        Path("/bt/BT_backup"),
+        "e",
+        "n",
+        True,
+        TargetOS.POSIX,
+    )
+    assert calls[0][2]["debounce"] == 0.5
+    assert calls[0][2]["poll_interval"] == 10.0
+    assert calls[0][2]["verification"] is Verification.NONE
+    assert calls[0][2]["create_backup"] is True
+
+    for unsupported in (["-d"], ["--torrents-db"]):
+        monkeypatch.setattr("sys.argv", argv + unsupported)
+        assert main() == 1
+    with pytest.raises(SystemExit):
+        parse_args(["--watch", "--debounce", "0"])
+
+
+def test_main_webui(monkeypatch):
+    def no_bt_backup(*_):
+        raise AssertionError("BT_backup is not used with --webui")
+
+    monkeypatch.setattr("qbt_migrate.cli.QBTBatchMove", no_bt_backup)
+    # Not a regex
+    monkeypatch.setattr("builtins.input", lambda _: "n")
+    monkeypatch.setenv("QBT_WEBUI_PASSWORD", "secret")
+    torrents = [
+        {"hash": "a" * 40, "save_path": "/some/test/path"},
+        {"hash": "b" * 40, "save_path": "/other/path"},
+    ]
+    with StubWebUI(torrents, "admin", "secret") as stub:
+        argv = ["qbt_migrate", "--webui", stub.url, "-e", "/some/test"]
+        argv += ["-n", "D:\\new", "-t", "Windows", "-j", "2"]
+        argv += ["--webui-username", "admin"]
+        monkeypatch.setattr("sys.argv", argv)
+        assert main() is None
+        assert stub.torrents["a" * 40]["save_path"] == "D:\\new\\path"
+        assert stub.torrents["b" * 40]["save_path"] == "/other/path"
+        assert stub.connections <= 2
+
+        for unsupported in (["-d"], ["--journal"], ["--verify", "report"]):
+            monkeypatch.setattr("sys.argv", argv + unsupported)
+            assert main() == 1
+        monkeypatch.setattr("sys.argv", argv + ["--webui-password", "wrong"])
+        assert main() == 1
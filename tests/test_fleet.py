@@ -0,0 +1,296 @@
+import glob
+import json
+import shutil
+
+import pytest
+
+from qbt_migrate.classes import FastResume
+from qbt_migrate.enums import (
+    BackupMode,
+    Durability,
+    TargetOS,
+    Verification,
+)
+from qbt_migrate.fleet import (
+    FleetJob,
+    Instance,
+    _folder_name,
+    run_fleet,
+    tomllib,
+)
+
+
+def bt_backup(path):
+    path.mkdir()
+    for file in glob.glob("./tests/test_files/good*.fastresume"):
+        shutil.copy(file, path)
+    return path
+
+
+def test_instance_from_dict(tmp_path):
+    map_file = tmp_path / "map.txt"
+    map_file.write_text("/b\tD:\\b\n")
+    instance = Instance.from_dict(
+        {
+            "bt_backup_path": "/one/BT_backup",
+            "existing_path": "/a",
+            "new_path": "D:\\a",
+            "map_file": str(map_file),
+            "backup_mode": "snapshot",
+            "durability": "file",
+            "verify": "refuse",
+            "cache": True,
+            "journal": "/tmp/one.journal",
+        }
+    )
+    assert instance.name == "/one/BT_backup"
+    assert instance.rules == [("/a", "D:\\a"), ("/b", "D:\\b")]
+    # Detected from the new paths
+    assert instance.target_os is TargetOS.WINDOWS
+    assert instance.backup_mode is BackupMode.SNAPSHOT
+    assert instance.durability is Durability.FILE
+    assert instance.verification is Verification.REFUSE
+    assert instance.cache_path.name == "qbt_migrate_cache.sqlite"
+    assert str(instance.journal_path) == "/tmp/one.journal"
+    assert instance.torrents_db is None
+
+    instance = Instance.from_dict(
+        {
+            "bt_backup_path": "/two/BT_backup",
+            "name": "two",
+            "mappings": [["/a", "/b"]],
+            "target_os": "Mac",
+            "torrents_db": True,
+        }
+    )
+    assert instance.target_os is TargetOS.POSIX
+    assert instance.torrents_db.name == "torrents.db"
+
+
+@pytest.mark.parametrize(
+    "data, match",
+    [
+        ({"existing_path": "/a", "new_path": "/b"}, "bt_backup_path"),
+        ({"bt_backup_path": "/a"}, "existing_path"),
+        ({"bt_backup_path": "/a", "mappings": [["/a"]]}, "existing_path"),
+        ({"bt_backup_path": "/a", "mappings": [], "jobs": 1}, "jobs"),
+        (
+            {
+                "bt_backup_path": "/a",
+                "mappings": [["/a", "/b"]],
+                "target_os": "BeOS",
+            },
+            "BeOS",
+        ),
+        (
+            {
+                "bt_backup_path": "/a",
+                "mappings": [["/a", "/b"]],
+                "torrents_db": True,
+                "journal": True,
+            },
+            "journals",
+        ),
+        (
+            {
+                "bt_backup_path": "/a",
+                "mappings": [["/a", "/b"]],
+                "torrents_db": True,
+                "verify": "report",
+            },
+            "verified",
+        ),
+        (
+            {
+                "bt_backup_path": "/a",
+                "mappings": [["/a", "/b"]],
+                "backup_path": True,
+            },
+            "backup_path",
+        ),
+    ],
+)
+def test_instance_from_dict_errors(data, match):
+    with pytest.raises(ValueError, match=match):
+        Instance.from_dict(data)
+
+
+def test_fleet_job_from_dict():
+    job = FleetJob.from_dict(
+        {
+            "max_workers": 8,
+            "defaults": {"existing_path": "/a", "new_path": "/b"},
+            "instances": [
+                {"bt_backup_path": "/one"},
+                {"bt_backup_path": "/two", "new_path": "/c"},
+            ],
+        }
+    )
+    assert [instance.rules for instance in job.instances] == [
+        [("/a", "/b")],
+        [("/a", "/c")],
+    ]
+    assert job.budget() == (2, 4)
+    job.max_instances = 3
+    assert job.budget() == (2, 4)
+    job.max_instances = 1
+    assert job.budget() == (1, 8)
+    job.max_workers = 1
+    job.max_instances = None
+    assert job.budget() == (1, 1)
+
+    with pytest.raises(ValueError, match="at least one"):
+        FleetJob.from_dict({"instances": []})
+    with pytest.raises(ValueError, match="more than once"):
+        FleetJob.from_dict(
+            {
+                "defaults": {"mappings": [["/a", "/b"]]},
+                "instances": [{"bt_backup_path": "/one"}] * 2,
+            }
+        )
+    with pytest.raises(ValueError, match="Instance 2"):
+        FleetJob.from_dict(
+            {
+                "defaults": {"mappings": [["/a", "/b"]]},
+                "instances": [{"bt_backup_path": "/one"}, {}],
+            }
+        )
+    with pytest.raises(ValueError, match="defaults"):
+        FleetJob.from_dict({"defaults": {"bt_backup_path": "/one"}})
+    for key, value in [
+        ("max_workers", 0),
+        ("max_workers", "8"),
+        ("max_instances", -1),
+        ("max_instances", True),
+    ]:
+        with pytest.raises(ValueError, match=key):
+            FleetJob.from_dict(
+                {
+                    key: value,
+                    "instances": [
+                        {"bt_backup_path": "/one", "mappings": [["/a", "/b"]]}
+                    ],
+                }
+            )
+
+
+def test_fleet_job_load(tmp_path):
+    data = {
+        "max_instances": 2,
+        "instances": [{"bt_backup_path": "/one", "mappings": [["/a", "/b"]]}],
+    }
+    json_path = tmp_path / "job.json"
+    json_path.write_text(json.dumps(data))
+    assert FleetJob.load(json_path).max_instances == 2
+
+    if tomllib is None:  # pragma: no cover
+        pytest.skip("TOML job files require the tomli package")
+    toml_path = tmp_path / "job.toml"
+    toml_path.write_text(
+        "max_instances = 2\n"
+        "[[instances]]\n"
+        'bt_backup_path = "/one"\n'
+        'mappings = [["/a", "/b"]]\n'
+    )
+    job = FleetJob.load(toml_path)
+    assert job.max_instances == 2
+    assert job.instances[0].rules == [("/a", "/b")]
+
+
+def test_run_fleet(tmp_path):
+    job = FleetJob.from_dict(
+        {
+            "max_workers": 4,
+            "defaults": {
+                "existing_path": "/some/test",
+                "new_path": "/a/new/test",
+                "create_backup": False,
+            },
+            "instances": [
+                {"name": "one", "bt_backup_path": str(tmp_path / "one")},
+                {"name": "two", "bt_backup_path": str(tmp_path / "two")},
+                # Doesn't exist, fails without stopping the others
+                {"name": "gone", "bt_backup_path": str(tmp_path / "gone")},
+            ],
+        }
+    )
+    bt_backup(tmp_path / "one")
+    bt_backup(tmp_path / "two")
+    report = run_fleet(job)
+    assert [result.name for result in report.instances] == [
+        "one",
+        "two",
+        "gone",
+    ]
+    assert [result.name for result in report.failed] == ["gone"]
+    for name in ("one", "two"):
+        fast_resume = FastResume(tmp_path / name / "good.fastresume")
+        assert fast_resume.save_path.startswith("/a/new/test")
+
+    data = report.to_dict()
+    assert (data["instances"], data["succeeded"], data["failed"]) == (3, 2, 1)
+    assert data["totals"]["files_written"] == 6
+    assert data["totals"]["files_written"] == sum(
+        result["stats"]["files_written"] for result in data["results"][:2]
+    )
+    assert data["results"][0]["processed"] == 3
+    assert data["results"][2]["error"]
+    assert "stats" not in data["results"][2]
+    # The report is written as JSON
+    json.dumps(data)
+
+
+@pytest.mark.parametrize("backup_mode", ["zip", "snapshot"])
+def test_run_fleet_shared_backup_path(tmp_path, backup_mode):
+    names = ["one", "two", "three", "four"]
+    job = FleetJob.from_dict(
+        {
+            "defaults": {
+                "existing_path": "/some/test",
+                "new_path": "/a/new/test",
+                "backup_mode": backup_mode,
+                "backup_path": str(tmp_path / "backups"),
+            },
+            "instances": [
+                {
+                    "name": name,
+                    "bt_backup_path": str(bt_backup(tmp_path / name)),
+                }
+                for name in names
+            ]
+            # Named by its path, backed up in a folder of its own too
+            + [{"bt_backup_path": str(bt_backup(tmp_path / "five"))}],
+        }
+    )
+    names.append(_folder_name(str(tmp_path / "five")))
+    assert [instance.backup_path for instance in job.instances] == [
+        tmp_path / "backups" / name for name in names
+    ]
+    report = run_fleet(job)
+    assert not report.failed
+    # Every instance has a backup of its own files
+    for name in names:
+        (backup,) = (tmp_path / "backups" / name).iterdir()
+        assert backup.name.startswith("fastresume_backup")
+
+    with pytest.raises(ValueError, match="backup_path"):
+        FleetJob.from_dict(
+            {
+                "defaults": {"mappings": [["/a", "/b"]]},
+                "instances": [
+                    {"bt_backup_path": "/one", "backup_path": "/backups"},
+                    {"bt_backup_path": "/two", "backup_path": "/backups"},
+                ],
+            }
+        )
+    with pytest.raises(ValueError, match="journal"):
+        FleetJob.from_dict(
+            {
+                "defaults": {"mappings": [["/a", "/b"]], "journal": True},
+                # Both journals default to /data/qbt_migrate.journal
+                "instances": [
+                    {"bt_backup_path": "/data/one"},
+                    {"bt_backup_path": "/data/two"},
+                ],
+            }
+        )
@@ -0,0 +1,133 @@
+import hashlib
+import json
+
+import pytest
+
+from qbt_migrate.enums import TargetOS
+from qbt_migrate.journal import (
+    Journal,
+    JournalError,
+    JournalMismatchError,
+    default_journal_path,
+    read_run,
+    run_arguments,
+)
+from qbt_migrate.mapping import PathMapping
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture
+def bt_backup(tmp_path):
+    bt_backup = tmp_path / "BT_backup"
+    bt_backup.mkdir()
+    for name in ("a", "b", "c", "d"):
+        (bt_backup / f"{name}.fastresume").write_bytes(name.encode())
+    return bt_backup
+
+
+def test_default_journal_path():
+    assert default_journal_path("/config/BT_backup").name == (
+        "qbt_migrate.journal"
+    )
+
+
+def test_run_arguments(bt_backup):
+    run = run_arguments(
+        bt_backup, PathMapping.from_paths("/a", "/b"), TargetOS.WINDOWS
+    )
+    assert run == {
+        "bt_backup_path": str(bt_backup),
+        "rules": [["/a", "/b"]],
+        "regex": False,
+        "target_os": "WINDOWS",
+    }
+    # Survives the round trip through the journal header
+    journal_path = bt_backup.parent / "journal"
+    Journal(journal_path, run).close()
+    assert read_run(journal_path) == run
+
+
+def test_journal_resume(bt_backup):
+    run = run_arguments(bt_backup, PathMapping.from_paths("/a", "/b"), None)
+    journal_path = bt_backup.parent / "journal"
+    with Journal(journal_path, run) as journal:
+        journal.intent("a.fastresume", sha256(b"a"))
+        journal.done("a.fastresume")
+        # Replaced, but interrupted before it was recorded as done
+        journal.intent("b.fastresume", sha256(b"b"))
+        (bt_backup / "b.fastresume").write_bytes(b"new b")
+        # Interrupted before it was replaced
+        journal.intent("c.fastresume", sha256(b"c"))
+    # A record torn by the interruption
+    with open(journal_path, "a") as f:
+        f.write('{"intent":"d.fast')
+
+    with Journal(journal_path, run, resume=True) as journal:
+        assert journal.completed == {"a.fastresume", "b.fastresume"}
+        journal.intent("c.fastresume", sha256(b"c"))
+        journal.done("c.fastresume")
+    # The torn record is dropped rather than continued
+    with open(journal_path) as f:
+        records = [json.loads(line) for line in f]
+    assert records[-3:] == [
+        {"done": "b.fastresume"},
+        {"intent": "c.fastresume", "sha256": sha256(b"c")},
+        {"done": "c.fastresume"},
+    ]
+    with Journal(journal_path, run, resume=True) as journal:
+        assert journal.completed == {
+            "a.fastresume",
+            "b.fastresume",
+            "c.fastresume",
+        }
+
+    # A new journal starts from scratch
+    with Journal(journal_path, run) as journal:
+        assert journal.completed == set()
+    with Journal(journal_path, run, resume=True) as journal:
+        assert journal.completed == set()
+
+
+def test_journal_keeps_interrupted_run(bt_backup):
+    run = run_arguments(bt_backup, PathMapping.from_paths("/a", "/b"), None)
+    journal_path = bt_backup.parent / "journal"
+    with Journal(journal_path, run) as journal:
+        journal.intent("a.fastresume", sha256(b"a"))
+    # Still the only record of whether a.fastresume was replaced
+    content = journal_path.read_bytes()
+    with pytest.raises(JournalError, match="interrupted run"):
+        Journal(journal_path, run)
+    assert journal_path.read_bytes() == content
+
+    with Journal(journal_path, run, resume=True) as journal:
+        journal.done("a.fastresume")
+    # Finished, a new run may start over it, as over an empty file
+    Journal(journal_path, run).close()
+    journal_path.write_bytes(b"")
+    Journal(journal_path, run).close()
+    assert read_run(journal_path) == run
+
+
+def test_journal_resume_errors(bt_backup):
+    run = run_arguments(bt_backup, PathMapping.from_paths("/a", "/b"), None)
+    journal_path = bt_backup.parent / "journal"
+    with pytest.raises(FileNotFoundError):
+        Journal(journal_path, run, resume=True)
+
+    Journal(journal_path, run).close()
+    other = run_arguments(bt_backup, PathMapping.from_paths("/a", "/c"), None)
+    with pytest.raises(JournalMismatchError):
+        Journal(journal_path, other, resume=True)
+
+    with open(journal_path, "a") as f:
+        f.write("not json\n")
+    with pytest.raises(ValueError, match="line 2"):
+        Journal(journal_path, run, resume=True)
+
+    with open(journal_path, "w") as f:
+        f.write('{"version": 0, "run": {}}\n')
+    with pytest.raises(ValueError, match="version"):
+        read_run(journal_path)
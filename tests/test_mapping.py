@@ -0,0 +1,117 @@
+import pytest
+
+from qbt_migrate.enums import TargetOS
+from qbt_migrate.mapping import (
+    PathMapping,
+    as_mapping,
+    read_rules,
+    transform_paths,
+)
+from qbt_migrate.methods import convert_slashes
+
+
+def test_path_mapping_sub():
+    mapping = PathMapping(
+        [
+            ("/data", "/srv"),
+            ("/data/movies", "/media/movies"),
+            ("/srv", "/old"),
+            ("D:\\Torrents", "/torrents"),
+        ]
+    )
+    # The longest existing path wins, replaced text isn't matched again
+    assert mapping.sub("/data/movies/a") == "/media/movies/a"
+    assert mapping.sub("/data/tv/a") == "/srv/tv/a"
+    assert mapping.sub("/srv/a") == "/old/a"
+    assert mapping.sub("/data/a:/data/movies/b") == "/srv/a:/media/movies/b"
+    assert mapping.sub("/other/a") == "/other/a"
+    assert mapping.sub("D:\\Torrents\\a") == "/torrents\\a"
+    # qBt-savePath and qBt-downloadPath use forward slashes
+    assert mapping.sub("D:/Torrents/a", posix=True) == "/torrents/a"
+    assert mapping.sub("D:/Torrents/a") == "D:/Torrents/a"
+
+
+def test_path_mapping_single_rule_matches_str_replace():
+    mapping = PathMapping.from_paths("/a", "/b/a")
+    for path in ("/a/a/x", "/x/a", "", "/aaa"):
+        assert mapping.sub(path) == path.replace("/a", "/b/a")
+
+
+def test_path_mapping_regex():
+    mapping = PathMapping(
+        [(r"^/data/(\w+)", r"/srv/\1"), (r"^/data", "/never"), ("/x", "/y")],
+        regex=True,
+    )
+    # Only the first matching rule is applied
+    assert mapping.sub("/data/tv/a") == "/srv/tv/a"
+    assert mapping.sub("/x/data") == "/y/data"
+    assert mapping.sub("/other") == "/other"
+    assert mapping.matches("/x/a")
+    assert not mapping.matches("/other")
+
+
+def test_path_mapping_matches_needles():
+    mapping = PathMapping([("/data", "/srv"), ("/mnt", "/srv")])
+    assert mapping.matches("/mnt/a")
+    assert not mapping.matches("/srv/a")
+    assert set(mapping.needles()) == {b"/data", b"/mnt"}
+    assert PathMapping([(".*", "/srv")], regex=True).needles() is None
+    assert as_mapping(mapping) is mapping
+    assert as_mapping("/a", "/b").rules == [("/a", "/b")]
+
+
+def test_path_mapping_invalid():
+    with pytest.raises(ValueError):
+        PathMapping([])
+    with pytest.raises(ValueError):
+        PathMapping([("/data", "/a"), ("/data", "/b")])
+    with pytest.raises(ValueError):
+        # The same path once slashes are converted
+        PathMapping([("C:\\data", "/a"), ("C:/data", "/b")])
+
+
+@pytest.mark.parametrize("regex", [False, True])
+@pytest.mark.parametrize("target_os", [None, TargetOS.WINDOWS, TargetOS.POSIX])
+def test_transform_paths(regex, target_os):
+    mapping = PathMapping(
+        [("/data", "D:/srv"), ("/data/movies", "/media"), ("/a", "/b")],
+        regex=regex,
+    )
+    paths = ["/data/movies/a", "/data/tv/b", "/other\\c", "", "/a/data"]
+    expected = [mapping.sub(path) for path in paths]
+    if target_os is not None:
+        expected = [convert_slashes(path, target_os) for path in expected]
+    assert transform_paths(paths, mapping, target_os) == expected
+
+
+def test_transform_paths_unchanged():
+    mapping = PathMapping.from_paths("/data", "/srv")
+    # Nothing to change, `None` rather than a copy
+    assert transform_paths(["/other/a", "/other/b"], mapping) is None
+    assert transform_paths(["/a"], target_os=TargetOS.POSIX) is None
+    assert transform_paths(["/a"]) is None
+    assert transform_paths([], mapping, TargetOS.WINDOWS) is None
+    assert transform_paths(["/data/a"], target_os=TargetOS.WINDOWS) == [
+        "\\data\\a"
+    ]
+    regex = PathMapping.from_paths(r"^/data", "/srv", regex_path=True)
+    assert transform_paths(["/other/data"], regex) is None
+    assert transform_paths(["/data/a", "/b"], regex) == ["/srv/a", "/b"]
+    with pytest.raises(TypeError):
+        transform_paths([b"/data/a"], mapping)
+
+
+def test_read_rules(tmp_path):
+    map_file = tmp_path / "map.tsv"
+    map_file.write_text(
+        "# Existing\tNew\n/data\t/srv\n\nD:\\Torrents\t/torrents\n",
+        encoding="utf-8",
+    )
+    assert read_rules(map_file) == [
+        ("/data", "/srv"),
+        ("D:\\Torrents", "/torrents"),
+    ]
+    assert len(PathMapping.load(map_file)) == 2
+    map_file.write_text("/data /srv\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        read_rules(map_file)
@@ -1,17 +1,29 @@
+import os
 import re
 import sys
 import tempfile
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import pytest
 
+from qbt_migrate import methods
 from qbt_migrate.enums import TargetOS
 from qbt_migrate.methods import Path as methods_Path
 from qbt_migrate.methods import (
+    atomic_write,
     backup_folder,
+    clone_file,
+    contains_any,
     convert_slashes,
     discover_bt_backup_path,
+    prefilter_needles,
+    regex_literal,
+    scan_bt_backup,
+    snapshot_folder,
+    submit_bounded,
+    sync_directory,
 )
 
 
@@ -77,6 +89,33 @@ def test_backup_folder():
             )  # Integrity Check
 
 
+def test_backup_folder_entries(tmp_path):
+    for name in ("a.fastresume", "a.torrent", "b.fastresume"):
+        (tmp_path / name).write_text(name)
+    entries = [
+        entry
+        for entry in scan_bt_backup(tmp_path)
+        if entry.name != "b.fastresume"
+    ]
+    archive_path = tmp_path / "test.zip"
+    backup_folder(tmp_path, archive_path, entries=entries)
+    with zipfile.ZipFile(archive_path, "r") as archive:
+        names = sorted(Path(name).name for name in archive.namelist())
+    assert names == ["a.fastresume", "a.torrent"]
+
+
+def test_scan_bt_backup(tmp_path):
+    for name in ("a.fastresume", "a.torrent", "a.fastresume.bkup", "b.zip"):
+        (tmp_path / name).write_text(name)
+    (tmp_path / "dir.fastresume").mkdir()
+    entries = scan_bt_backup(tmp_path)
+    assert sorted(entry.name for entry in entries) == [
+        "a.fastresume",
+        "a.torrent",
+    ]
+    assert all(entry.path.startswith(str(tmp_path)) for entry in entries)
+
+
 @pytest.mark.parametrize(
     "path, target_os, expected_path",
     [
@@ -127,3 +166,213 @@ def test_discover_bt_backup_path(
 
     monkeypatch.setattr(sys, "platform", system)
     assert discover_bt_backup_path() == expected_path
+
+
+def test_submit_bounded():
+    in_flight = []
+    peak = []
+
+    def work(x):
+        in_flight.append(x)
+        peak.append(len(in_flight))
+        in_flight.remove(x)
+        return x * 2
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = {
+            args: future.result()
+            for args, future in submit_bounded(
+                executor, work, ((x,) for x in range(50)), 4
+            )
+        }
+    assert results == {(x,): x * 2 for x in range(50)}
+    assert max(peak) <= 4
+
+
+@pytest.mark.parametrize(
+    "pattern, expected_literal",
+    [
+        (r"/some/(\w+)/.*$", "/some/"),
+        (r"^/mnt/disk\d+/data", "/mnt/disk"),
+        (r"abc?de", "ab"),
+        (r"ab{2}c", "a"),
+        (r"x[ab]yz", "yz"),
+        (r"[]a]bc", "bc"),
+        (r"(foo)bar", "bar"),
+        (r"/data/\.hidden", "/data/.hidden"),
+        (r"C:\\Torrents\\(.*)", "C:\\Torrents\\"),
+        (r"/mnt/(a|b)", ""),
+        (r"(?i)/mnt/data", ""),
+        (r".*", ""),
+        (r"^/so\w{1,200}", "/so"),
+        (r"/a{1,200}bc", "bc"),
+        (r"/a{,3}b{2}", "/"),
+        (r"\x41bc", "bc"),
+        (r"/mnt/\u00e9t\N{LATIN SMALL LETTER E}x", "/mnt/"),
+        (r"/a\0123/bcd", "3/bcd"),
+        (r"(a)\1/bcd", "/bcd"),
+    ],
+)
+def test_regex_literal(pattern: str, expected_literal: str):
+    literal = regex_literal(pattern)
+    assert literal == expected_literal
+    if literal:
+        # Anything the pattern matches must contain the literal
+        match = re.search(pattern, f"/some/test{literal}")
+        assert match is None or literal in match.string
+
+
+@pytest.mark.parametrize(
+    "pattern, string",
+    [
+        (r"^/so\w{1,200}", "/some/test/path"),
+        (r"/some/te{1,2}st", "/some/teest"),
+        (r"\x2fsome/test", "/some/test"),
+        (r"/some\u002ftest", "/some/test"),
+        (r"/some\N{SOLIDUS}test", "/some/test"),
+        (r"/some\057test", "/some/test"),
+        (r"/so\0me", "/so\0me"),
+    ],
+)
+def test_regex_literal_in_match(pattern: str, string: str):
+    assert re.search(pattern, string)
+    assert regex_literal(pattern) in string
+
+
+def test_prefilter_needles():
+    assert prefilter_needles("") is None
+    assert prefilter_needles("/some/path") == (b"/some/path",)
+    assert prefilter_needles("/(a|b)", True) is None
+    assert set(prefilter_needles(r"/some/\w+", True)) == {
+        rb"/some/\w+",
+        b"/some/",
+    }
+
+
+def test_contains_any(tmp_path):
+    file = tmp_path / "test.fastresume"
+    file.write_bytes(b"d9:save_path10:/some/pathe")
+    assert contains_any(file, [b"/some/path"]) is True
+    assert contains_any(file, [b"/other", b"save_path"]) is True
+    assert contains_any(file, [b"/other"]) is False
+    file.write_bytes(b"")
+    assert contains_any(file, [b"/some/path"]) is False
+
+
+def test_atomic_write(tmp_path, monkeypatch):
+    file_path = tmp_path / "a.fastresume"
+    file_path.write_bytes(b"old")
+    file_path.chmod(0o640)
+    fsyncs = []
+    monkeypatch.setattr(os, "fsync", fsyncs.append)
+
+    atomic_write(file_path, [b"ne", memoryview(b"w")])
+    assert file_path.read_bytes() == b"new"
+    assert file_path.stat().st_mode & 0o777 == 0o640
+    assert fsyncs == []
+    atomic_write(file_path, [b"newer"], fsync=True)
+    assert file_path.read_bytes() == b"newer"
+    assert len(fsyncs) == 1
+
+    # A failed write leaves the old file and no temp file behind
+    with pytest.raises(TypeError):
+        atomic_write(file_path, [b"partial", None])
+    assert file_path.read_bytes() == b"newer"
+    assert [file.name for file in tmp_path.iterdir()] == ["a.fastresume"]
+
+
+@pytest.mark.skipif(not hasattr(os, "chown"), reason="POSIX only")
+def test_atomic_write_keeps_owner(tmp_path, monkeypatch):
+    file_path = tmp_path / "a.fastresume"
+    file_path.write_bytes(b"old")
+    owner = file_path.stat()
+    chowns = []
+    monkeypatch.setattr(os, "chown", lambda *args: chowns.append(args[1:]))
+    # Same owner as the process, nothing to change
+    atomic_write(file_path, [b"new"])
+    assert chowns == []
+
+    # Owned by someone else, such as qBittorrent's user
+    uid, gid = owner.st_uid + 1, owner.st_gid + 1
+    stat = os.stat
+    monkeypatch.setattr(
+        os,
+        "stat",
+        lambda path, *args, **kwargs: (
+            os.stat_result((owner.st_mode, 0, 0, 1, uid, gid, 3, 0, 0, 0))
+            if Path(path) == file_path
+            else stat(path, *args, **kwargs)
+        ),
+    )
+    atomic_write(file_path, [b"newer"])
+    assert chowns == [(uid, gid)]
+
+    def refuse(*_):
+        raise PermissionError
+
+    monkeypatch.setattr(os, "chown", refuse)
+    atomic_write(file_path, [b"newest"])
+    assert file_path.read_bytes() == b"newest"
+
+
+def test_sync_directory(tmp_path, monkeypatch):
+    files = [tmp_path / "a.fastresume", tmp_path / "b.fastresume"]
+    for file in files:
+        file.write_bytes(b"data")
+    synced = []
+    monkeypatch.setattr(os, "sync", lambda: synced.append("sync"))
+    monkeypatch.setattr(os, "fsync", lambda fd: synced.append(os.fstat(fd)))
+    sync_directory(tmp_path, files)
+    # Each file, then the directory, but not every filesystem
+    expected = files + ([] if os.name == "nt" else [tmp_path])
+    assert [status.st_ino for status in synced] == [
+        path.stat().st_ino for path in expected
+    ]
+
+
+def test_clone_file(tmp_path, monkeypatch):
+    src = tmp_path / "src"
+    src.write_bytes(b"data" * 1000)
+    assert clone_file(src, tmp_path / "a") in (
+        "reflink",
+        "copy_file_range",
+        "copy",
+    )
+    assert (tmp_path / "a").read_bytes() == src.read_bytes()
+
+    # Falls back to a regular copy when the kernel can't copy
+    def unsupported(*_):
+        raise OSError("not supported")
+
+    monkeypatch.setattr(methods, "fcntl", None)
+    monkeypatch.setattr(os, "copy_file_range", unsupported, raising=False)
+    (tmp_path / "b").write_bytes(b"longer old content" * 1000)
+    assert clone_file(src, tmp_path / "b") == "copy"
+    assert (tmp_path / "b").read_bytes() == src.read_bytes()
+
+
+def test_snapshot_folder(tmp_path, monkeypatch):
+    bt_backup = tmp_path / "BT_backup"
+    bt_backup.mkdir()
+    for name in ("a.fastresume", "a.torrent", "other.txt"):
+        (bt_backup / name).write_bytes(name.encode())
+
+    snapshot_folder(bt_backup, tmp_path / "linked")
+    assert sorted(p.name for p in (tmp_path / "linked").iterdir()) == [
+        "a.fastresume",
+        "a.torrent",
+    ]
+    assert (tmp_path / "linked" / "a.fastresume").samefile(
+        bt_backup / "a.fastresume"
+    )
+
+    def no_links(*_):
+        raise OSError("cross-device link")
+
+    monkeypatch.setattr(os, "link", no_links)
+    snapshot_folder(bt_backup, tmp_path / "cloned", include_torrents=False)
+    (cloned,) = (tmp_path / "cloned").iterdir()
+    assert cloned.read_bytes() == b"a.fastresume"
+    assert not cloned.samefile(bt_backup / "a.fastresume")
+    with pytest.raises(FileExistsError):
+        snapshot_folder(bt_backup, tmp_path / "cloned")
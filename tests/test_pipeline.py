@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from qbt_migrate.pipeline import Stage, staged
+
+
+def collect(items, stages, **kwargs):
+    async def run():
+        return [item async for item in staged(items, stages, **kwargs)]
+
+    return asyncio.run(run())
+
+
+def test_staged():
+    loop_thread = threading.get_ident()
+    threads = set()
+
+    def inline(item):
+        assert threading.get_ident() == loop_thread
+        return item if item % 2 else None
+
+    def square(item):
+        threads.add(threading.get_ident())
+        return item * item
+
+    results = collect(
+        range(20),
+        [
+            Stage("square", square, workers=4),
+            Stage("odd", inline, inline=True),
+            Stage("str", str),
+        ],
+    )
+    assert sorted(results, key=int) == [str(x * x) for x in range(20) if x % 2]
+    assert loop_thread not in threads
+    assert collect([], [Stage("noop", str)]) == []
+
+
+def test_staged_backpressure():
+    produced = []
+
+    def produce(item):
+        produced.append(item)
+        return item
+
+    async def run():
+        results = staged(range(100), [Stage("produce", produce)], queue_size=2)
+        first = await results.__anext__()
+        await asyncio.sleep(0.1)
+        # The pipeline stalls once the queues are full
+        assert len(produced) < 10
+        rest = [item async for item in results]
+        return [first] + rest
+
+    assert asyncio.run(run()) == list(range(100))
+
+
+def test_staged_error():
+    started = []
+
+    def fail(item):
+        started.append(item)
+        if item == 3:
+            raise ValueError(item)
+        time.sleep(0.01)
+        return item
+
+    with pytest.raises(ValueError):
+        collect(range(100), [Stage("fail", fail, workers=2)], queue_size=1)
+    # Nothing is started once a stage fails
+    time.sleep(0.05)
+    assert len(started) < 10
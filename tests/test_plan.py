@@ -0,0 +1,35 @@
+import pytest
+
+from qbt_migrate.plan import MigrationPlan, PlanEntry
+
+
+def test_migration_plan_dump_load(tmp_path):
+    plan = MigrationPlan(
+        "/config/BT_backup",
+        [
+            PlanEntry(
+                "a.fastresume",
+                "0" * 64,
+                {"save_path": "/old/path", "qBt-downloadPath": None},
+                {"save_path": "/new/path", "qBt-downloadPath": b"\xff/new"},
+            ),
+            PlanEntry(
+                "b.fastresume",
+                "1" * 64,
+                {"mapped_files": [b"\xfe/old", "/old/b"]},
+                {"mapped_files": [b"\xfe/new", "/new/b"]},
+            ),
+        ],
+    )
+    plan_path = tmp_path / "plan.json"
+    plan.dump(plan_path)
+    assert b"\n" not in plan_path.read_bytes()
+    assert MigrationPlan.load(plan_path) == plan
+    assert len(plan) == 2
+
+
+def test_migration_plan_version():
+    data = MigrationPlan("/config/BT_backup").to_dict()
+    data["version"] = 0
+    with pytest.raises(ValueError):
+        MigrationPlan.from_dict(data)
@@ -0,0 +1,218 @@
+import sqlite3
+from pathlib import Path
+
+import pytest
+from bencodepy.exceptions import BencodeDecodeError
+
+from qbt_migrate.bencoding import bencode
+from qbt_migrate.enums import TargetOS
+from qbt_migrate.mapping import PathMapping
+from qbt_migrate.torrents_db import (
+    ResumeRow,
+    TorrentsDB,
+    default_torrents_db_path,
+)
+
+
+SCHEMA = (
+    "CREATE TABLE torrents (id INTEGER PRIMARY KEY, "
+    "torrent_id BLOB NOT NULL UNIQUE, "
+    "queue_position INTEGER NOT NULL DEFAULT -1, name TEXT, category TEXT, "
+    "tags TEXT, target_save_path TEXT, {download_path}content_layout TEXT, "
+    "ratio_limit INTEGER, seeding_time_limit INTEGER, "
+    "has_outer_pieces_priority INTEGER, has_seed_status INTEGER, "
+    "operating_mode TEXT, stopped INTEGER, stop_condition TEXT, "
+    "resume_data BLOB NOT NULL, metadata BLOB)"
+)
+
+
+def resume_data(save_path, mapped_files=None):
+    data = {
+        "file-format": "libtorrent resume file",
+        "pieces": b"\x01" * 16,
+        "save_path": save_path,
+    }
+    if mapped_files is not None:
+        data["mapped_files"] = mapped_files
+    return bencode.encode(data)
+
+
+def make_db(path, rows, download_path=True):
+    connection = sqlite3.connect(str(path))
+    connection.execute(
+        SCHEMA.format(download_path="download_path TEXT, " * download_path)
+    )
+    for index, (blob, target_save_path, download) in enumerate(rows):
+        values = {
+            "torrent_id": f"{index:040x}".encode(),
+            "target_save_path": target_save_path,
+            "resume_data": blob,
+        }
+        if download_path:
+            values["download_path"] = download
+        connection.execute(
+            f"INSERT INTO torrents ({', '.join(values)}) "
+            f"VALUES ({', '.join('?' * len(values))})",
+            tuple(values.values()),
+        )
+    connection.commit()
+    connection.close()
+    return path
+
+
+def read_db(path):
+    connection = sqlite3.connect(str(path))
+    rows = connection.execute(
+        "SELECT resume_data, target_save_path FROM torrents ORDER BY id"
+    ).fetchall()
+    connection.close()
+    return rows
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return make_db(
+        tmp_path / "torrents.db",
+        [
+            (
+                resume_data("/data/a", ["/data/a/1", "/data/a/2"]),
+                "/data/a",
+                "/data/incomplete",
+            ),
+            (resume_data("/other/b"), "/other/b", None),
+            (resume_data("C:\\data\\c"), "C:/data/c", None),
+            (resume_data("/data/d"), "", None),
+        ],
+    )
+
+
+def test_default_torrents_db_path():
+    assert default_torrents_db_path("/config/qBittorrent/BT_backup") == Path(
+        "/config/qBittorrent/torrents.db"
+    )
+
+
+def test_torrents_db_rows(db_path):
+    db = TorrentsDB(db_path)
+    rows = list(db.rows())
+    assert len(rows) == 4
+    assert all(isinstance(row, ResumeRow) for row in rows)
+    assert rows[0].save_path == "/data/a"
+    assert rows[0].qbt_save_path == "/data/a"
+    assert rows[0].qbt_download_path == "/data/incomplete"
+    assert rows[0].file_path == db_path / f"{0:040x}"
+    assert rows[1].qbt_download_path is None
+    # C:/data/c contains /data too
+    assert [row.row_id for row in db.rows("/data", page_size=1)] == [1, 3, 4]
+    # Rows are rewritten in memory, and only written by TorrentsDB
+    assert not hasattr(rows[0], "save")
+    rows[0].map_paths(PathMapping([("/data", "/srv")]), TargetOS.WINDOWS)
+    assert rows[0].column_values() == {
+        "qBt-savePath": "\\srv\\a",
+        "qBt-downloadPath": "\\srv\\incomplete",
+    }
+    assert bencode.decode(rows[0].encode())["mapped_files"] == [
+        "\\srv\\a\\1",
+        "\\srv\\a\\2",
+    ]
+
+
+def test_torrents_db_migrate(db_path):
+    before = read_db(db_path)
+    summary = TorrentsDB(db_path).migrate(
+        PathMapping([("/data", "/srv"), ("C:\\data", "/mnt/c")]),
+        None,
+        page_size=2,
+    )
+    assert summary.processed == 3
+    assert summary.failed == 0
+    assert summary.stats.files_scanned == 4
+    assert summary.stats.files_matched == 3
+    after = read_db(db_path)
+    data = bencode.decode(after[0][0])
+    assert data["save_path"] == "/srv/a"
+    assert data["mapped_files"] == ["/srv/a/1", "/srv/a/2"]
+    # qBt-* keys live in the columns, not in the blob
+    assert "qBt-savePath" not in data
+    assert after[0][1] == "/srv/a"
+    assert after[1] == before[1]
+    assert bencode.decode(after[2][0])["save_path"] == "/mnt/c\\c"
+    assert after[2][1] == "/mnt/c/c"
+    assert bencode.decode(after[3][0])["save_path"] == "/srv/d"
+    assert after[3][1] == ""
+    connection = sqlite3.connect(str(db_path))
+    assert connection.execute(
+        "SELECT download_path FROM torrents WHERE id = 1"
+    ).fetchone() == ("/srv/incomplete",)
+    connection.close()
+    (backup,) = db_path.parent.glob("torrents.db.*.bkup")
+    assert read_db(backup) == before
+
+
+def test_torrents_db_migrate_target_os(db_path):
+    TorrentsDB(db_path).migrate(
+        "/data", "D:\\data", target_os=TargetOS.WINDOWS, create_backup=False
+    )
+    after = read_db(db_path)
+    assert bencode.decode(after[0][0])["save_path"] == "D:\\data\\a"
+    assert after[0][1] == "D:\\data\\a"
+
+
+def test_torrents_db_migrate_is_atomic(tmp_path):
+    db_path = make_db(
+        tmp_path / "torrents.db",
+        [
+            (resume_data("/data/a"), "/data/a", None),
+            (b"d9:save_path7:/data/b", "/data/b", None),
+            (resume_data("/data/c"), "/data/c", None),
+        ],
+    )
+    before = read_db(db_path)[::2]
+    with pytest.raises(BencodeDecodeError):
+        TorrentsDB(db_path).migrate(
+            "/data", "/srv", create_backup=False, page_size=1
+        )
+    assert read_db(db_path)[::2] == before
+
+    summary = TorrentsDB(db_path).migrate(
+        "/data", "/srv", create_backup=False, skip_bad_files=True
+    )
+    assert summary.processed == 2
+    assert summary.stats.files_skipped_bad == 1
+    assert [row[1] for row in read_db(db_path)[::2]] == ["/srv/a", "/srv/c"]
+
+
+def test_torrents_db_locked(db_path):
+    before = read_db(db_path)
+    connection = sqlite3.connect(str(db_path))
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            TorrentsDB(db_path, timeout=0.1).migrate(
+                "/data", "/srv", create_backup=False
+            )
+    finally:
+        connection.rollback()
+        connection.close()
+    assert read_db(db_path) == before
+
+
+def test_torrents_db_without_download_path(tmp_path):
+    db_path = make_db(
+        tmp_path / "torrents.db",
+        [(resume_data("/data/a"), "/data/a", None)],
+        download_path=False,
+    )
+    summary = TorrentsDB(db_path).migrate("/data", "/srv", create_backup=False)
+    assert summary.processed == 1
+    assert read_db(db_path)[0][1] == "/srv/a"
+
+
+def test_torrents_db_missing(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        list(TorrentsDB(tmp_path / "torrents.db").rows())
+    sqlite3.connect(str(tmp_path / "other.db")).execute(
+        "CREATE TABLE torrents (id INTEGER PRIMARY KEY)"
+    ).connection.close()
+    with pytest.raises(ValueError):
+        list(TorrentsDB(tmp_path / "other.db").rows())
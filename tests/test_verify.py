@@ -0,0 +1,87 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from qbt_migrate.verify import MissingTargetsError, TargetVerifier
+
+
+def torrent(
+    save_path=None, qbt_save_path=None, download_path=None, mapped=None
+):
+    return SimpleNamespace(
+        save_path=save_path,
+        qbt_save_path=qbt_save_path,
+        qbt_download_path=download_path,
+        mapped_files=mapped,
+    )
+
+
+def test_target_verifier_exists(tmp_path):
+    (tmp_path / "dir").mkdir()
+    (tmp_path / "dir" / "file").touch()
+    verifier = TargetVerifier()
+    assert verifier.exists(str(tmp_path / "dir"))
+    assert verifier.exists(str(tmp_path / "dir" / "file"))
+    assert verifier.exists(str(tmp_path / "dir" / "file") + os.sep)
+    assert not verifier.exists(str(tmp_path / "dir" / "other"))
+    assert not verifier.exists(str(tmp_path / "gone" / "file"))
+    assert verifier.exists(os.path.abspath(os.sep))
+    assert verifier.names(str(tmp_path / "dir")) == {"file"}
+    # tmp_path, dir, gone and the root, each listed once
+    assert verifier.listed == 4
+
+
+def test_target_verifier_missing(tmp_path):
+    save = tmp_path / "save"
+    download = tmp_path / "download"
+    (save / "folder").mkdir(parents=True)
+    (save / "folder" / "a").touch()
+    download.mkdir()
+    (download / "b").touch()
+    verifier = TargetVerifier()
+
+    assert verifier.missing(torrent(str(save), str(save))) == []
+    # Falls back to qBt-savePath, mapped files may be in the download path
+    assert (
+        verifier.missing(
+            torrent(
+                qbt_save_path=str(save),
+                download_path=str(download),
+                mapped=["folder/a", "b", str(save / "folder" / "a")],
+            )
+        )
+        == []
+    )
+    assert verifier.missing(
+        torrent(str(save), mapped=["folder/a", "folder/c", "/gone/d"])
+    ) == [str(save / "folder" / "c"), "/gone/d"]
+    assert verifier.missing(
+        torrent(str(tmp_path / "gone"), download_path=str(download))
+    ) == [str(tmp_path / "gone")]
+    # Nothing to check
+    assert verifier.missing(torrent(mapped=["folder/a"])) == []
+
+    error = MissingTargetsError(["/a", "/b"])
+    assert isinstance(error, FileNotFoundError)
+    assert error.missing == ["/a", "/b"]
+    assert str(error) == "Missing /a, /b"
+
+
+def test_target_verifier_lists_directories_once(tmp_path):
+    directories = [tmp_path / str(index) for index in range(10)]
+    for directory in directories:
+        directory.mkdir()
+        (directory / "file").touch()
+    torrents = [
+        torrent(str(directory), mapped=["file", "missing"])
+        for directory in directories
+        for _ in range(50)
+    ]
+    verifier = TargetVerifier()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(verifier.missing, torrents))
+    assert results == [
+        [os.path.join(result.save_path, "missing")] for result in torrents
+    ]
+    # 500 torrents, tmp_path and the 10 save paths
+    assert verifier.listed == 11
@@ -0,0 +1,159 @@
+import shutil
+import sys
+import threading
+import time
+
+import pytest
+
+import qbt_migrate.watch
+from qbt_migrate.classes import FastResume, QBTBatchMove
+from qbt_migrate.enums import Durability
+from qbt_migrate.watch import Watcher, _Inotify, _Poller
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def bt_backup(tmp_path):
+    bt_backup = tmp_path / "BT_backup"
+    bt_backup.mkdir()
+    return bt_backup
+
+
+@pytest.fixture
+def watching(bt_backup):
+    """Watch BT_backup in a thread, stopping it at the end of the test."""
+    stop = threading.Event()
+    threads = []
+
+    def watch(**kwargs):
+        watcher = Watcher(
+            bt_backup, "/some/test", "/a/new/test", debounce=0.05, **kwargs
+        )
+        watcher.start()
+        thread = threading.Thread(target=watcher.watch, args=(stop,))
+        thread.start()
+        threads.append(thread)
+        return watcher
+
+    yield watch
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+
+@pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="inotify is Linux only"
+)
+def test_watcher_inotify(monkeypatch, bt_backup, watching):
+    backups = []
+    backup = FastResume.backup
+
+    def count_backup(fast_resume, *args):
+        backups.append(fast_resume.file_path.name)
+        return backup(fast_resume, *args)
+
+    monkeypatch.setattr(FastResume, "backup", count_backup)
+    watcher = watching()
+    assert isinstance(watcher._source, _Inotify)
+    # A burst of writes is migrated once
+    for _ in range(3):
+        shutil.copy("./tests/test_files/good.fastresume", bt_backup)
+    shutil.copy("./tests/test_files/good_not_relevant.fastresume", bt_backup)
+    shutil.copy("./tests/test_files/bad.fastresume", bt_backup)
+    assert wait_for(lambda: watcher.summary.processed == 1)
+    fast_resume = FastResume(bt_backup / "good.fastresume")
+    assert fast_resume.save_path == "/a/new/test/path"
+    assert len(list(bt_backup.glob("good.fastresume.*.bkup"))) == 1
+    assert wait_for(lambda: watcher.summary.stats.files_skipped_bad == 1)
+
+    # The watcher's own write is not migrated again, a new write is
+    time.sleep(0.2)
+    assert watcher.summary.processed == 1
+    shutil.copy("./tests/test_files/good.fastresume", bt_backup)
+    assert wait_for(lambda: watcher.summary.processed == 2)
+    assert watcher.summary.failed == 0
+    assert watcher.summary.stats.files_matched == 2
+    # Backed up once per watch, not every time the old paths come back
+    assert backups == ["good.fastresume"]
+
+
+def test_watcher_poll(bt_backup, watching):
+    shutil.copy("./tests/test_files/good.fastresume", bt_backup)
+    watcher = watching(poll_interval=0.05, create_backup=False)
+    assert isinstance(watcher._source, _Poller)
+    # Files already there when the watch starts are left to the run
+    time.sleep(0.2)
+    assert watcher.summary.processed == 0
+
+    shutil.copy(
+        "./tests/test_files/good_no_save_path.fastresume",
+        bt_backup / "new.fastresume",
+    )
+    assert wait_for(lambda: watcher.summary.processed == 1)
+    assert FastResume(bt_backup / "new.fastresume").qbt_save_path == (
+        "/a/new/test/path"
+    )
+    assert list(bt_backup.glob("*.bkup")) == []
+    time.sleep(0.2)
+    assert watcher.summary.processed == 1
+
+
+def test_watcher_durability(monkeypatch, bt_backup, watching):
+    synced = []
+    monkeypatch.setattr(
+        qbt_migrate.watch,
+        "sync_directory",
+        lambda path, file_paths: synced.append((path, list(file_paths))),
+    )
+    watcher = watching(
+        poll_interval=0.05, create_backup=False, durability=Durability.BATCH
+    )
+    shutil.copy("./tests/test_files/good.fastresume", bt_backup)
+    shutil.copy("./tests/test_files/good_not_relevant.fastresume", bt_backup)
+    assert wait_for(lambda: synced)
+    # Each batch written is synced, files left as they were aren't
+    assert synced == [(bt_backup, [bt_backup / "good.fastresume"])]
+    assert watcher.summary.processed == 1
+
+
+def test_watcher_fallback(monkeypatch, bt_backup):
+    monkeypatch.setattr(sys, "platform", "win32")
+    with Watcher(bt_backup, "/some/test", "/a/new/test") as watcher:
+        assert isinstance(watcher._source, _Poller)
+    assert watcher._source is None
+
+
+def test_watcher_ignores_run(bt_backup, watching):
+    for file in ("good.fastresume", "good_no_qbt_save_path.fastresume"):
+        shutil.copy(f"./tests/test_files/{file}", bt_backup)
+    watcher = Watcher(bt_backup, "/some/test", "/a/new/test", debounce=0.05)
+    watcher.start()
+    summary = QBTBatchMove(bt_backup).run(
+        "/some/test", "/a/new/test", create_backup=False
+    )
+    assert summary.processed == 2
+    watcher.written(summary)
+
+    stop = threading.Event()
+    thread = threading.Thread(target=watcher.watch, args=(stop,))
+    thread.start()
+    time.sleep(0.3)
+    # Written by the run, events seen but nothing to do
+    assert watcher.summary.processed == 0
+    assert watcher.summary.stats.files_scanned == 0
+
+    # Written again with the old paths, the run's backup has the original
+    shutil.copy("./tests/test_files/good.fastresume", bt_backup)
+    assert wait_for(lambda: watcher.summary.processed == 1)
+    stop.set()
+    thread.join()
+    assert list(bt_backup.glob("*.bkup")) == []
+    assert watcher._source is None
@@ -0,0 +1,151 @@
+from pathlib import Path
+
+import pytest
+
+from qbt_migrate.enums import TargetOS
+from qbt_migrate.mapping import PathMapping
+from qbt_migrate.webui import WebUI, WebUIClient, WebUIError, _renamed_files
+from qbt_migrate.webui_stub import StubWebUI
+
+
+def torrents(count, save_path="/some/test/path", **kwargs):
+    return [
+        {"hash": f"{index:040x}", "save_path": save_path, **kwargs}
+        for index in range(count)
+    ]
+
+
+@pytest.fixture
+def stub():
+    with StubWebUI(
+        torrents(250)
+        + torrents(
+            1,
+            "/some/test/folder",
+            hash="f" * 40,
+            download_path="/some/test/incomplete",
+            files=["test/a.mkv", "test/b.mkv"],
+        )
+        + torrents(1, "/other/path", hash="e" * 40)
+    ) as stub:
+        yield stub
+
+
+def test_webui_migrate(stub):
+    with WebUI(
+        stub.url, "admin", "adminadmin", max_workers=4, batch_size=100
+    ) as webui:
+        summary = webui.migrate("/some/test", "/a/new/test")
+    assert summary.processed == 251
+    assert summary.failed == 0
+    assert summary.stats.files_scanned == 252
+    assert summary.stats.files_written == 251
+    assert stub.torrents["0" * 40]["save_path"] == "/a/new/test/path"
+    assert stub.torrents["f" * 40]["save_path"] == "/a/new/test/folder"
+    assert stub.torrents["f" * 40]["download_path"] == (
+        "/a/new/test/incomplete"
+    )
+    assert stub.torrents["e" * 40]["save_path"] == "/other/path"
+
+    # A single session, torrents moved to the same location together
+    assert len(stub.calls("auth/login")) == 1
+    batches = [
+        len(params["hashes"].split("|"))
+        for params in stub.calls("torrents/setLocation")
+    ]
+    assert sorted(batches) == [1, 50, 100, 100]
+    assert stub.calls("torrents/setDownloadPath") == [
+        {"hashes": "f" * 40, "path": "/a/new/test/incomplete"}
+    ]
+    # Files are only listed when a rule can reach inside the save path
+    assert stub.calls("torrents/files") == []
+    # Requests share a few kept-alive connections
+    assert 1 <= stub.connections <= 4
+    assert webui.client.requests == len(stub.requests)
+
+
+def test_webui_migrate_renames(stub):
+    with WebUI(stub.url, "admin", "adminadmin") as webui:
+        summary = webui.migrate(
+            PathMapping(
+                [
+                    ("/some/test/folder/test", "/some/test/folder/renamed"),
+                    ("/other", "D:\\other"),
+                ]
+            ),
+            None,
+            target_os=TargetOS.WINDOWS,
+        )
+    assert summary.processed == 2
+    assert summary.failed == 0
+    assert [params["hash"] for params in stub.calls("torrents/files")] == [
+        "f" * 40
+    ]
+    assert stub.torrents["f" * 40]["files"] == [
+        "renamed/a.mkv",
+        "renamed/b.mkv",
+    ]
+    assert stub.torrents["f" * 40]["save_path"] == "/some/test/folder"
+    assert stub.torrents["e" * 40]["save_path"] == "D:\\other\\path"
+
+
+def test_webui_migrate_errors(stub):
+    stub.failing_locations.add("/a/new/test/folder")
+    with WebUI(stub.url, "admin", "adminadmin", batch_size=1000) as webui:
+        summary = webui.migrate("/some/test", "/a/new/test")
+    # Only the torrent moved to the failing location fails
+    assert summary.processed == 251
+    assert summary.failed == 1
+    error = summary.errors[Path("f" * 40)]
+    assert isinstance(error, WebUIError)
+    assert error.status == 409
+    assert stub.torrents["0" * 40]["save_path"] == "/a/new/test/path"
+
+    with pytest.raises(WebUIError, match="log in"):
+        with WebUI(stub.url, "admin", "wrong") as webui:
+            webui.migrate("/some/test", "/a/new")
+
+
+def test_webui_client_session(stub):
+    with WebUIClient(stub.url, "admin", "adminadmin", 2) as client:
+        assert len(client.get_json("torrents/info")) == 252
+        # An expired session is started again
+        stub.sessions.clear()
+        assert len(client.get_json("torrents/info")) == 252
+        assert len(stub.calls("auth/login")) == 2
+        with pytest.raises(WebUIError) as e:
+            client.request("GET", "torrents/unknown")
+        assert e.value.status == 404
+        # Closed connections are opened again
+        client.close()
+        assert client.get_json("torrents/files", {"hash": "f" * 40}) == [
+            {"index": 0, "name": "test/a.mkv"},
+            {"index": 1, "name": "test/b.mkv"},
+        ]
+    assert stub.connections <= 3
+
+    # With a single connection, held by the request that found the
+    # session expired
+    with WebUIClient(stub.url, "admin", "adminadmin", 1) as client:
+        assert len(client.get_json("torrents/info")) == 252
+        stub.sessions.clear()
+        assert len(client.get_json("torrents/info")) == 252
+        assert len(stub.calls("auth/login")) == 4
+
+    with WebUIClient(stub.url) as client:
+        with pytest.raises(WebUIError) as e:
+            client.get_json("torrents/info")
+        assert e.value.status == 403
+    with pytest.raises(ValueError):
+        WebUIClient("ftp://localhost")
+
+
+def test_renamed_files():
+    mapping = PathMapping(
+        [(r"C:\data\old", r"C:\data\new"), (r"C:\data\out", r"D:\out")]
+    )
+    assert _renamed_files(
+        "C:\\data\\", ["old/a", "keep/b", "old", "out/c"], mapping
+    ) == [("old/a", "new/a"), ("old", "new")]
+    # Moving the save path itself renames nothing
+    assert _renamed_files("C:\\data\\old", ["a/b"], mapping) == []